@@ -0,0 +1,96 @@
+import os
+import sys
+import logging
+import shutil
+import tempfile
+import time
+
+
+def patch_path(path):
+    return os.path.join(os.path.dirname(__file__), path)
+
+
+def create_synthetic_data(data_dir_path, image_count, caption_count, batch_size):
+    import numpy as np
+    import mxnet as mx
+    from mxnet import nd
+    from mxnet_text_to_image.data.image_store import save_image_store
+
+    def iter_images(image_ids):
+        yield 0, np.random.randint(0, 256, size=(len(image_ids), 3, 64, 64)).astype(np.uint8)
+
+    image_store = save_image_store(os.path.join(data_dir_path, 'images'), range(1, image_count + 1), iter_images)
+    image_ids = np.random.randint(1, image_count + 1, size=(caption_count, ))
+    text_feats = np.random.normal(0, 1, size=(caption_count, 300)).astype(np.float32)
+    train_data = mx.io.NDArrayIter(data=[nd.array(image_ids, ctx=mx.cpu()), text_feats], batch_size=batch_size,
+                                   shuffle=True)
+    return train_data, image_store
+
+
+def samples_per_second(ctx, train_data, image_store, model_dir_path, batch_size, gan_options, fit_options):
+    from mxnet import nd
+    from mxnet_text_to_image.library.dcgan2 import DCGan
+
+    gan = DCGan(model_ctx=ctx)
+    gan.random_input_size = 20
+    for name, value in gan_options.items():
+        setattr(gan, name, value)
+
+    # the first epoch builds (and for hybridized nets, caches) the graphs, only the second one is timed
+    gan.fit(train_data=train_data, image_dict=image_store, model_dir_path=model_dir_path, epochs=1,
+            batch_size=batch_size, print_every=1000, **fit_options)
+    nd.waitall()
+    start_time = time.time()
+    gan.fit(train_data=train_data, image_dict=image_store, model_dir_path=model_dir_path, epochs=1,
+            batch_size=batch_size, print_every=1000, **fit_options)
+    nd.waitall()
+    return train_data.num_data / (time.time() - start_time)
+
+
+def main():
+    sys.path.append(patch_path('..'))
+
+    logging.basicConfig(level=logging.INFO)
+
+    import mxnet as mx
+
+    ctx = mx.gpu(0) if len(sys.argv) > 1 and sys.argv[1] == 'gpu' else mx.cpu()
+    batch_size = 64
+    data_dir_path = tempfile.mkdtemp()
+    try:
+        train_data, image_store = create_synthetic_data(data_dir_path, image_count=256, caption_count=batch_size * 8,
+                                                        batch_size=batch_size)
+        if len(sys.argv) > 2 and sys.argv[1] == 'cpus':
+            # data parallel scaling over 1, 2, 4, ... cpu contexts (set OMP_NUM_THREADS to the cores per context)
+            count = 1
+            while count <= int(sys.argv[2]):
+                ctx_list = [mx.cpu(i) for i in range(count)]
+                speed = samples_per_second(ctx_list, train_data, image_store, data_dir_path, batch_size,
+                                           {'hybridize': True}, {})
+                logging.info('dcgan-v2 on %d cpu contexts: %.1f samples/s', count, speed)
+                count *= 2
+            return
+
+        if len(sys.argv) > 1 and sys.argv[1] == 'profile':
+            # per phase timings of the hybridized training (every phase waits for the previous one)
+            from mxnet_text_to_image.library.profiling import summarize_timings
+            profile_path = os.path.join(data_dir_path, 'timings.jsonl')
+            samples_per_second(ctx, train_data, image_store, data_dir_path, batch_size, {'hybridize': True},
+                               {'profile_path': profile_path})
+            for name, value in summarize_timings([profile_path]).items():
+                logging.info('%s: %s', name, value)
+            return
+
+        configs = [({'hybridize': False}, {}),
+                   ({'hybridize': True}, {}),
+                   ({'hybridize': True}, {'single_generator_forward': True})]
+        for gan_options, fit_options in configs:
+            speed = samples_per_second(ctx, train_data, image_store, data_dir_path, batch_size, gan_options,
+                                       fit_options)
+            logging.info('dcgan-v2 %s %s: %.1f samples/s', gan_options, fit_options, speed)
+    finally:
+        shutil.rmtree(data_dir_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+import os
+import sys
+import json
+import math
+import shutil
+import logging
+import argparse
+import resource
+import subprocess
+import tempfile
+import time
+
+
+def patch_path(path):
+    return os.path.join(os.path.dirname(__file__), path)
+
+
+LOADERS = ['get_image_paths', 'load_text_files', 'load_texts', 'get_text_features', 'get_transformed_images']
+# below these, the measures are mostly noise and their growth is not reported
+NOISE_FLOORS = {'seconds': 0.01, 'max_rss_delta_kb': 1024}
+
+
+def load_once(loader, data_dir_path):
+    sys.path.append(patch_path('..'))
+    from mxnet_text_to_image.data.flowers_images import get_image_paths, get_transformed_images
+    from mxnet_text_to_image.data.flowers_texts import load_text_files, load_texts, get_text_features
+
+    jpg_dir_path = os.path.join(data_dir_path, 'jpg')
+    text_dir_path = os.path.join(data_dir_path, 'text_c10')
+    loaders = {
+        'get_image_paths': lambda: get_image_paths(jpg_dir_path),
+        'load_text_files': lambda: load_text_files(text_dir_path),
+        'load_texts': lambda: load_texts(text_dir_path),
+        'get_text_features': lambda: get_text_features(text_dir_path)[0],
+        'get_transformed_images': lambda: get_transformed_images(jpg_dir_path, num_threads=os.cpu_count() or 1),
+    }
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start_time = time.time()
+    result = loaders[loader]()
+    duration = time.time() - start_time
+    return {'seconds': duration, 'count': len(result),
+            'max_rss_delta_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before,
+            # the tokenizer processes of get_text_features
+            'children_max_rss_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss}
+
+
+def run_loader(loader, data_dir_path):
+    """
+    Run one loader in a fresh process on a cold cache: the files it writes next to the corpus are deleted afterwards
+    """
+    before = set(os.listdir(data_dir_path))
+    try:
+        output = subprocess.check_output([sys.executable, __file__, '--child', loader, data_dir_path])
+    finally:
+        for name in set(os.listdir(data_dir_path)) - before:
+            path = os.path.join(data_dir_path, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+    return json.loads(output.decode('utf8').strip().splitlines()[-1])
+
+
+def get_growth(results, loader, key):
+    """
+    :return: log-log slope of key between consecutive sizes, about 1 when linear and 2 when quadratic
+    """
+    sizes = sorted(size for size in results if key in results[size].get(loader, dict()))
+    growth = dict()
+    for small, large in zip(sizes, sizes[1:]):
+        small_value = results[small][loader][key]
+        large_value = results[large][loader][key]
+        if small_value < NOISE_FLOORS[key]:
+            continue
+        growth['%d->%d' % (small, large)] = math.log(large_value / small_value) / math.log(large / small)
+    return growth
+
+
+def main():
+    sys.path.append(patch_path('..'))
+
+    logging.basicConfig(level=logging.INFO)
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        print(json.dumps(load_once(sys.argv[2], sys.argv[3])))
+        return
+
+    parser = argparse.ArgumentParser(description='time and peak memory of the flowers loaders on synthetic corpora '
+                                                 'of growing size')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000],
+                        help='numbers of captions')
+    parser.add_argument('--loaders', nargs='+', default=LOADERS, choices=LOADERS)
+    parser.add_argument('--output', help='JSON file to write the results to')
+    parser.add_argument('--threshold', type=float, default=1.3, help='log-log slope reported as superlinear')
+    args = parser.parse_args()
+
+    from mxnet_text_to_image.data.synthetic_flowers import create_synthetic_flowers
+    from mxnet_text_to_image.utils.glove_loader import load_glove
+
+    results = dict()
+    work_dir_path = tempfile.mkdtemp()
+    try:
+        for size in sorted(args.sizes):
+            size_dir_path = os.path.join(work_dir_path, str(size))
+            data_dir_path = os.path.join(size_dir_path, 'flowers')
+            start_time = time.time()
+            create_synthetic_flowers(data_dir_path, size)
+            # the glove store is built once, outside of the timed loaders
+            load_glove(os.path.join(size_dir_path, 'glove'), 300)
+            logging.info('%d captions generated in %.1f seconds', size, time.time() - start_time)
+
+            results[size] = dict()
+            for loader in args.loaders:
+                results[size][loader] = run_loader(loader, data_dir_path)
+                logging.info('%d captions, %s: %s', size, loader, results[size][loader])
+            shutil.rmtree(size_dir_path)
+    finally:
+        shutil.rmtree(work_dir_path)
+
+    report = {'results': results, 'growth': dict()}
+    for loader in args.loaders:
+        report['growth'][loader] = {'seconds': get_growth(results, loader, 'seconds'),
+                                    'max_rss_delta_kb': get_growth(results, loader, 'max_rss_delta_kb')}
+        for key, growth in report['growth'][loader].items():
+            for sizes, slope in growth.items():
+                level = logging.WARNING if slope > args.threshold else logging.INFO
+                logging.log(level, '%-24s %-18s %-16s slope %.2f', loader, key, sizes, slope)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
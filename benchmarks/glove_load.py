@@ -0,0 +1,69 @@
+import os
+import sys
+import json
+import logging
+import resource
+import subprocess
+import time
+
+
+def patch_path(path):
+    return os.path.join(os.path.dirname(__file__), path)
+
+
+def load_once(mode, glove_dir_path, embedding_dim):
+    sys.path.append(patch_path('..'))
+    from mxnet_text_to_image.utils.glove_loader import load_glove_pickle, load_glove_store
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start_time = time.time()
+    if mode == 'pickle':
+        emb = load_glove_pickle(glove_dir_path, embedding_dim)
+    else:
+        emb = load_glove_store(glove_dir_path, embedding_dim)
+    len(emb)
+    duration = time.time() - start_time
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {'mode': mode, 'seconds': duration, 'max_rss_delta_kb': rss_after - rss_before}
+
+
+def ensure_pickle(glove_dir_path, embedding_dim):
+    import pickle
+    from mxnet_text_to_image.utils.glove_loader import load_glove
+    glove_pickle_path = glove_dir_path + '/glove.6B.' + str(embedding_dim) + 'd.pickle'
+    if os.path.exists(glove_pickle_path):
+        return
+    emb = load_glove(glove_dir_path, embedding_dim)
+    word2em = dict((str(word), emb.matrix[i].copy()) for i, word in enumerate(emb.vocab))
+    with open(glove_pickle_path, 'wb') as handle:
+        pickle.dump(word2em, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def main():
+    sys.path.append(patch_path('..'))
+
+    logging.basicConfig(level=logging.INFO)
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        print(json.dumps(load_once(sys.argv[2], sys.argv[3], int(sys.argv[4]))))
+        return
+
+    glove_dir_path = sys.argv[1] if len(sys.argv) > 1 else patch_path('../demo/data/glove')
+    embedding_dim = 300
+    repeats = 3
+
+    from mxnet_text_to_image.utils.glove_loader import load_glove
+    load_glove(glove_dir_path, embedding_dim)  # builds the memory-mapped store if missing
+    ensure_pickle(glove_dir_path, embedding_dim)
+
+    # every trial runs in a fresh process, which is what each DCGan / worker process pays
+    for mode in ['pickle', 'memmap']:
+        for _ in range(repeats):
+            output = subprocess.check_output([sys.executable, __file__, '--child', mode, glove_dir_path,
+                                              str(embedding_dim)])
+            result = json.loads(output.decode('utf8').strip().splitlines()[-1])
+            logging.info('%s: %.3f seconds, max rss +%d KB', mode, result['seconds'], result['max_rss_delta_kb'])
+
+
+if __name__ == '__main__':
+    main()
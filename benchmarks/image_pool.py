@@ -0,0 +1,87 @@
+import os
+import sys
+import logging
+import time
+
+
+def patch_path(path):
+    return os.path.join(os.path.dirname(__file__), path)
+
+
+class PerSampleImagePool():
+    """
+    The previous ImagePool, which handles one sample at a time, kept for comparison
+    """
+
+    def __init__(self, pool_size):
+        self.pool_size = pool_size
+        self.num_imgs = 0
+        self.images = []
+        self.text_feats = []
+
+    def query(self, image_text_pairs):
+        from mxnet import nd
+        ret_images = []
+        ret_text_feats = []
+        images, text_feats = image_text_pairs
+        for i in range(images.shape[0]):
+            image = nd.expand_dims(images[i], axis=0)
+            text_feat = nd.expand_dims(text_feats[i], axis=0)
+            if self.num_imgs < self.pool_size:
+                self.num_imgs = self.num_imgs + 1
+                self.images.append(image)
+                self.text_feats.append(text_feat)
+                ret_images.append(image)
+                ret_text_feats.append(text_feat)
+            else:
+                p = nd.random_normal(0, 1, shape=(1, )).asscalar()
+                if p < 0.5:
+                    random_index = int(nd.random_uniform(0, self.pool_size - 1, shape=(1, )).asscalar())
+                    tmp_img = self.images[random_index].copy()
+                    tmp_text_feat = self.text_feats[random_index].copy()
+                    self.images[random_index] = image
+                    self.text_feats[random_index] = text_feat
+                    ret_images.append(tmp_img)
+                    ret_text_feats.append(tmp_text_feat)
+                else:
+                    ret_images.append(image)
+                    ret_text_feats.append(text_feat)
+        return [nd.concat(*ret_images, dim=0), nd.concat(*ret_text_feats, dim=0)]
+
+
+def time_pool(pool, ctx, batch_size, image_shape, batches):
+    from mxnet import nd
+    images = nd.random_normal(0, 1, shape=(batch_size, ) + image_shape, ctx=ctx)
+    text_feats = nd.random_normal(0, 1, shape=(batch_size, 300), ctx=ctx)
+    # fill the pool first, only the queries of a full pool are timed
+    while pool.num_imgs < pool.pool_size:
+        pool.query([images, text_feats])
+    nd.waitall()
+    start_time = time.time()
+    for _ in range(batches):
+        ret_images, ret_text_feats = pool.query([images, text_feats])
+    nd.waitall()
+    return (time.time() - start_time) / batches
+
+
+def main():
+    sys.path.append(patch_path('..'))
+
+    logging.basicConfig(level=logging.INFO)
+
+    import mxnet as mx
+    from mxnet_text_to_image.library.pool import ImagePool
+
+    ctx = mx.gpu(0) if len(sys.argv) > 1 and sys.argv[1] == 'gpu' else mx.cpu()
+    batch_size = 64
+    image_shape = (3, 64, 64)
+    batches = 20
+
+    for pool_size in [50, 500, 5000]:
+        for name, pool in [('per-sample', PerSampleImagePool(pool_size)), ('vectorized', ImagePool(pool_size))]:
+            seconds = time_pool(pool, ctx, batch_size, image_shape, batches)
+            logging.info('pool size %d, %s: %.2f ms per batch of %d', pool_size, name, seconds * 1000, batch_size)
+
+
+if __name__ == '__main__':
+    main()
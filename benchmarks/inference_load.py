@@ -0,0 +1,134 @@
+import os
+import sys
+import json
+import logging
+import shutil
+import tempfile
+import threading
+import asyncio
+import time
+
+
+def patch_path(path):
+    return os.path.join(os.path.dirname(__file__), path)
+
+
+async def request(reader, writer, method, path, body=b''):
+    writer.write(('%s %s HTTP/1.1\r\nHost: localhost\r\nContent-Length: %d\r\n\r\n' % (method, path, len(body)))
+                 .encode('latin-1') + body)
+    await writer.drain()
+    status = (await reader.readline()).decode('latin-1').split(' ')[1]
+    headers = dict()
+    while True:
+        line = await reader.readline()
+        if line == b'\r\n':
+            break
+        name, value = line.decode('latin-1').split(':', 1)
+        headers[name.strip().lower()] = value.strip()
+    content = await reader.readexactly(int(headers['content-length']))
+    return int(status), content
+
+
+async def client(host, port, prompts, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    for prompt in prompts:
+        start_time = time.time()
+        status, _ = await request(reader, writer, 'POST', '/generate', prompt.encode('utf8'))
+        assert status == 200
+        latencies.append(time.time() - start_time)
+    writer.close()
+
+
+async def run_load(host, port, concurrency, requests_per_client):
+    """
+    concurrency clients, each sending requests_per_client requests one after the other on a keep-alive connection
+    """
+    prompts = ['this flower has %d white petals and a yellow center' % i for i in range(requests_per_client)]
+    latencies = list()
+    start_time = time.time()
+    await asyncio.gather(*[client(host, port, prompts, latencies) for _ in range(concurrency)])
+    duration = time.time() - start_time
+    reader, writer = await asyncio.open_connection(host, port)
+    _, stats = await request(reader, writer, 'GET', '/stats')
+    writer.close()
+    return len(latencies) / duration, sorted(latencies)[len(latencies) // 2], json.loads(stats.decode('utf8'))
+
+
+def start_server(gan, max_batch_size, max_wait_ms):
+    from mxnet_text_to_image.library.inference_server import InferenceServer
+    loop = asyncio.new_event_loop()
+    server = InferenceServer(gan, port=0, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    started.wait()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(server.stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+    return server.port, stop
+
+
+def create_untrained_gan(glove_dir_path):
+    """
+    A dcgan2 with a randomly initialized generator and a small glove store, which cost the same to serve as the
+    trained ones
+    """
+    import numpy as np
+    import mxnet as mx
+    from mxnet_text_to_image.library.dcgan2 import DCGan
+    from mxnet_text_to_image.utils.glove_loader import save_glove_store
+    words = 'this flower has white petals and a yellow center'.split(' ') + [str(i) for i in range(100)]
+    save_glove_store(dict((word, np.random.normal(0, 1, size=(300, ))) for word in words), glove_dir_path, 300)
+    gan = DCGan(model_ctx=mx.cpu())
+    gan.random_input_size = 20
+    gan.load_glove(glove_dir_path)
+    gan.netG, gan.netD = DCGan.create_model()
+    gan.netG.initialize(mx.init.Normal(0.02), ctx=mx.cpu())
+    gan.netG.hybridize(static_alloc=True)
+    return gan
+
+
+def main():
+    sys.path.append(patch_path('..'))
+
+    logging.basicConfig(level=logging.INFO)
+
+    concurrency = 32
+    requests_per_client = 8
+
+    # python inference_load.py 127.0.0.1 8080 loads a running server (demo/dcgan2_serve.py), otherwise the
+    # micro-batching is compared against batch-1 serving on an untrained generator
+    if len(sys.argv) > 2:
+        speed, p50, stats = asyncio.get_event_loop().run_until_complete(
+            run_load(sys.argv[1], int(sys.argv[2]), concurrency, requests_per_client))
+        logging.info('%.1f requests/s, p50 latency %.1f ms, server stats: %s', speed, p50 * 1000, stats)
+        return
+
+    glove_dir_path = tempfile.mkdtemp()
+    try:
+        gan = create_untrained_gan(glove_dir_path)
+        gan.generate_batch(['flower'])
+        for max_batch_size, max_wait_ms in [(1, 0), (8, 5), (32, 10)]:
+            port, stop = start_server(gan, max_batch_size, max_wait_ms)
+            speed, p50, stats = asyncio.new_event_loop().run_until_complete(
+                run_load('127.0.0.1', port, concurrency, requests_per_client))
+            stop()
+            logging.info('max batch size %d, max wait %d ms: %.1f requests/s, p50 latency %.1f ms, '
+                         'mean batch size %.1f', max_batch_size, max_wait_ms, speed, p50 * 1000,
+                         stats['mean_batch_size'])
+    finally:
+        shutil.rmtree(glove_dir_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import logging
+import argparse
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+
+def patch_path(path):
+    return os.path.join(os.path.dirname(__file__), path)
+
+
+def measure(func, repeats, warmup=1):
+    """
+    Run func warmup + repeats times, every run waits for the queued MXNet operators
+    :return: dict of the mean, median and min milliseconds of the timed runs
+    """
+    import numpy as np
+    from mxnet import nd
+    for _ in range(warmup):
+        func()
+        nd.waitall()
+    times = []
+    for _ in range(repeats):
+        start_time = time.time()
+        func()
+        nd.waitall()
+        times.append((time.time() - start_time) * 1000)
+    return {'mean_ms': float(np.mean(times)), 'median_ms': float(np.median(times)), 'min_ms': float(np.min(times)),
+            'repeats': repeats}
+
+
+def create_captions(vocab, count, rng):
+    # a few words of every caption are not in the vocabulary
+    words = list(vocab) + ['unknownword%d' % i for i in range(len(vocab) // 20)]
+    return [' '.join(rng.choice(words, size=rng.randint(8, 25))) for _ in range(count)]
+
+
+def text_cases(work_dir_path, repeats):
+    import numpy as np
+    from mxnet_text_to_image.utils.glove_loader import GloveModel, save_glove_store
+    from mxnet_text_to_image.utils.text_utils import pad_sequences, word_tokenize, word_tokenize_docs
+
+    rng = np.random.RandomState(0)
+    vocab = ['word%d' % i for i in range(20000)]
+    glove_dir_path = os.path.join(work_dir_path, 'glove')
+    os.makedirs(glove_dir_path)
+    save_glove_store(dict((word, rng.normal(0, 1, size=(300, )).astype(np.float32)) for word in vocab),
+                     glove_dir_path, 300)
+    glove = GloveModel()
+    glove.load(glove_dir_path, embedding_dim=300)
+    captions = create_captions(vocab, 1000, rng)
+
+    yield 'glove.encode_doc', lambda: measure(lambda: glove.encode_doc(captions[0]), repeats * 10)
+    yield 'glove.encode_docs[1000]', lambda: measure(lambda: glove.encode_docs(captions), repeats)
+
+    sentences = [caption + '.' for caption in captions[:100]]
+    yield 'word_tokenize[100]', lambda: measure(lambda: [word_tokenize(sentence) for sentence in sentences], repeats)
+    yield 'word_tokenize_docs[1000]', lambda: measure(lambda: word_tokenize_docs(captions), repeats)
+
+    sequences = [rng.randint(0, 20000, size=(rng.randint(5, 40), )) for _ in range(1000)]
+    yield 'pad_sequences[1000]', lambda: measure(lambda: pad_sequences(sequences, max_sequence_length=40), repeats)
+
+
+def pool_cases(work_dir_path, repeats):
+    import mxnet as mx
+    from mxnet import nd
+    from mxnet_text_to_image.library.pool import ImagePool
+
+    images = nd.random_normal(0, 1, shape=(64, 3, 64, 64), ctx=mx.cpu())
+    text_feats = nd.random_normal(0, 1, shape=(64, 300), ctx=mx.cpu())
+
+    def query(pool_size):
+        pool = ImagePool(pool_size)
+        # only the queries of a full pool are timed
+        while pool.num_imgs < pool.pool_size:
+            pool.query([images, text_feats])
+        return measure(lambda: pool.query([images, text_feats]), repeats * 5)
+
+    for pool_size in [50, 500]:
+        yield 'ImagePool.query[pool=%d,batch=64]' % pool_size, lambda: query(pool_size)
+
+
+def create_image_store(work_dir_path, image_count):
+    import numpy as np
+    from mxnet_text_to_image.data.image_store import save_image_store
+
+    def iter_images(image_ids):
+        yield 0, np.random.RandomState(0).randint(0, 256, size=(len(image_ids), 3, 64, 64)).astype(np.uint8)
+
+    return save_image_store(os.path.join(work_dir_path, 'images'), range(image_count), iter_images)
+
+
+def gather_cases(work_dir_path, repeats):
+    import numpy as np
+    import mxnet as mx
+    from mxnet import nd
+
+    image_store = create_image_store(work_dir_path, 1024)
+    image_ids = np.random.RandomState(0).randint(0, 1024, size=(64, ))
+    # the two ways fit gathers the real images of a batch
+    yield 'gather.host[batch=64]', lambda: measure(
+        lambda: nd.array(image_store.get_batch(image_ids), ctx=mx.cpu()), repeats * 5)
+
+    def take():
+        device_table = image_store.to_device(mx.cpu())
+        device_ids = nd.array(image_ids, ctx=mx.cpu())
+        return measure(lambda: device_table.take(device_ids), repeats * 5)
+
+    yield 'gather.device[batch=64]', take
+
+
+def generator_cases(work_dir_path, repeats):
+    import mxnet as mx
+    from mxnet import nd
+    from mxnet_text_to_image.library import dcgan1, dcgan2
+
+    def forward(module, batch_size):
+        # create_model only, a dcgan1.DCGan would download the pretrained VGG16. One net per batch size: with
+        # mkldnn, the deconvolutions of the dcgan1 netG fail on a new batch size
+        netG, _ = module.DCGan.create_model()
+        netG.initialize(mx.init.Normal(0.02), ctx=mx.cpu())
+        netG.hybridize(static_alloc=True, static_shape=True)
+        z = nd.random_normal(0, 1, shape=(batch_size, 320, 1, 1), ctx=mx.cpu())
+        return measure(lambda: netG(z), repeats)
+
+    for module in [dcgan1, dcgan2]:
+        for batch_size in [1, 16, 64]:
+            yield '%s.netG.forward[batch=%d]' % (module.DCGan.model_name, batch_size), lambda: forward(module,
+                                                                                                       batch_size)
+
+
+def fit_cases(work_dir_path, repeats):
+    yield 'dcgan-v2.fit.iteration[batch=64]', lambda: fit_iteration(work_dir_path, repeats)
+
+
+def fit_iteration(work_dir_path, repeats):
+    import numpy as np
+    import mxnet as mx
+    from mxnet import nd
+    from mxnet_text_to_image.library.dcgan2 import DCGan
+    from mxnet_text_to_image.library.profiling import summarize_timings
+
+    image_store = create_image_store(work_dir_path, 256)
+    rng = np.random.RandomState(0)
+    batch_size = 64
+    count = batch_size * (repeats + 1)
+    train_data = mx.io.NDArrayIter(data=[nd.array(rng.randint(0, 256, size=(count, ))),
+                                         rng.normal(0, 1, size=(count, 300)).astype(np.float32)],
+                                   batch_size=batch_size)
+    gan = DCGan()
+    gan.random_input_size = 20
+    gan.hybridize = True
+    # one epoch of repeats + 1 iterations, the first one builds the graphs and is left out of the summary
+    profile_path = os.path.join(work_dir_path, 'timings.jsonl')
+    gan.fit(train_data=train_data, image_dict=image_store, model_dir_path=work_dir_path, epochs=1,
+            batch_size=batch_size, print_every=1000, device_dataset=True, profile_path=profile_path)
+    summary = summarize_timings([profile_path])
+    return {'mean_ms': summary['total'] * 1000, 'samples_per_second': summary['samples_per_second'],
+            'repeats': summary['iterations']}
+
+
+CASES = [text_cases, pool_cases, gather_cases, generator_cases, fit_cases]
+
+
+def get_environment():
+    import numpy as np
+    import mxnet as mx
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=patch_path('..'),
+                                         stderr=subprocess.DEVNULL).decode('utf8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+            'numpy': np.__version__, 'mxnet': mx.__version__, 'platform': platform.platform(),
+            'cpu_count': os.cpu_count()}
+
+
+def run(repeats, pattern=None):
+    results = dict()
+    work_dir_path = tempfile.mkdtemp()
+    try:
+        for cases in CASES:
+            case_dir_path = os.path.join(work_dir_path, cases.__name__)
+            os.makedirs(case_dir_path)
+            # every case is measured as soon as it is yielded, before the next one is set up
+            for name, measure_case in cases(case_dir_path, repeats):
+                if pattern is not None and pattern not in name:
+                    continue
+                results[name] = measure_case()
+                logging.info('%s: %s', name, results[name])
+    finally:
+        shutil.rmtree(work_dir_path)
+    return results
+
+
+def compare(baseline, results, threshold):
+    """
+    :return: names of the benchmarks whose mean time grew by more than threshold (a fraction) over the baseline
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline['results'].get(name)
+        if base is None or 'mean_ms' not in base or 'mean_ms' not in result:
+            continue
+        change = result['mean_ms'] / base['mean_ms'] - 1
+        logging.info('%-40s %10.3f ms -> %10.3f ms %+7.1f%%', name, base['mean_ms'], result['mean_ms'], change * 100)
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    sys.path.append(patch_path('..'))
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='CPU only micro benchmarks of the hot paths, on synthetic inputs')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    parser.add_argument('--compare', help='JSON file of an earlier run, regressions make the exit code 1')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed slow down in --compare, e.g. 0.1')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--filter', help='only run the benchmarks whose name contains this text')
+    args = parser.parse_args()
+
+    report = get_environment()
+    report['results'] = run(args.repeats, args.filter)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        logging.info('compared to %s', baseline.get('commit'))
+        regressions = compare(baseline, report['results'], args.threshold)
+        if len(regressions) > 0:
+            logging.error('slower by more than %d%%: %s', args.threshold * 100, ', '.join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
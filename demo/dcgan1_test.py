@@ -18,16 +18,17 @@ def main():
 
     from mxnet_text_to_image.library.dcgan1 import DCGan
     from mxnet_text_to_image.data.flowers_texts import load_texts
+    from mxnet_text_to_image.utils.image_utils import save_images
 
     gan = DCGan(model_ctx=ctx)
     gan.load_glove(glove_dir_path=patch_path('data/glove'))
     gan.load_model(model_dir_path=model_dir_path)
 
-    texts = load_texts(patch_path('data/flowers/text_c10'))
-    for i, (line, image_id) in enumerate(texts.items()):
-        if i > 100:
-            break
-        gan.generate(text_message=line, num_images=1, output_dir_path=patch_path('output'))
+    texts = load_texts(patch_path('data/flowers/text_c10'), 101)
+    prompts = [lines[0] for image_id, lines in texts.items()]
+    imgs = gan.generate_batch(prompts, samples_per_prompt=1)
+    save_images(imgs, [os.path.join(patch_path('output'), DCGan.model_name + '-generated-' + str(i) + '.png')
+                       for i in range(len(prompts))])
 
 
 if __name__ == '__main__':
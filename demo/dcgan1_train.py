@@ -15,7 +15,7 @@ def main():
 
     data_dir_path = patch_path('data/flowers')
     output_dir_path = patch_path('models')
-    batch_size = 8
+    batch_size = 16
     epochs = 100
     ctx = mx.cpu()  # gpu too expensive for my graphics card due to the (224, 224) size, has to switch to cpu
 
@@ -23,19 +23,23 @@ def main():
     from mxnet_text_to_image.data.flowers import get_data_iter
     from mxnet_text_to_image.data.flowers_images import get_image_features
 
-    train_data = get_data_iter(data_dir_path=data_dir_path,
-                               batch_size=batch_size,
-                               limit=1000,
-                               text_mode='add')
-
     image_feats_dict = get_image_features(data_dir_path=os.path.join(data_dir_path, 'jpg'), model_ctx=ctx,
                                           image_width=224, image_height=224)
 
     gan = DCGan(model_ctx=ctx)
     gan.random_input_size = 20  # random input is 20, text input is 300
 
+    # the image features and the random input of each batch are prefetched while the previous batch is trained on
+    train_data = get_data_iter(data_dir_path=data_dir_path,
+                               batch_size=batch_size,
+                               limit=1000,
+                               text_mode='add',
+                               image_store=image_feats_dict,
+                               random_input_size=gan.random_input_size,
+                               ctx=ctx)
+
     gan.fit(train_data=train_data, image_feats_dict=image_feats_dict, model_dir_path=output_dir_path,
-            epochs=epochs, batch_size=batch_size)
+            epochs=epochs, batch_size=batch_size, single_generator_forward=True)
 
 
 if __name__ == '__main__':
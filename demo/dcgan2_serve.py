@@ -0,0 +1,33 @@
+import os
+import sys
+import mxnet as mx
+import logging
+
+
+def patch_path(path):
+    return os.path.join(os.path.dirname(__file__), path)
+
+
+def main():
+    sys.path.append(patch_path('..'))
+
+    logging.basicConfig(level=logging.INFO)
+
+    model_dir_path = patch_path('models')
+    ctx = mx.cpu(0)
+
+    from mxnet_text_to_image.library.dcgan2 import DCGan
+    from mxnet_text_to_image.library.inference_server import serve
+
+    # the generator and glove are loaded once, concurrent requests are batched into a single forward pass
+    gan = DCGan(model_ctx=ctx)
+    gan.load_glove(glove_dir_path=patch_path('data/glove'))
+    gan.load_model(model_dir_path=model_dir_path)
+
+    # curl -d 'this flower has white petals' http://127.0.0.1:8080/generate > flower.png
+    # curl http://127.0.0.1:8080/stats
+    serve(gan, host='127.0.0.1', port=8080, max_batch_size=32, max_wait_ms=10)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,10 @@
 import os
 import sys
-#import mxnet as mx
+import mxnet as mx
 import logging
 import random
 
+from mxnet_text_to_image.utils.image_utils import save_images
 from mxnet_text_to_image.utils.plot_utils import show_images
 
 
@@ -17,7 +18,7 @@ def main():
     logging.basicConfig(level=logging.DEBUG)
 
     model_dir_path = patch_path('models')
-    ctx =cpu(0)
+    ctx = mx.cpu(0)
 
     from mxnet_text_to_image.library.dcgan2 import DCGan
     from mxnet_text_to_image.data.flowers_texts import load_texts
@@ -27,11 +28,17 @@ def main():
     gan.load_model(model_dir_path=model_dir_path)
 
     texts = load_texts(patch_path('data/flowers/text_c10'), 1000)
+    prompts = list()
+    file_paths = list()
     for i, (image_id, lines) in enumerate(texts.items()):
         j = random.randint(0, len(lines)-1)
         line = lines[j]
         print('class', i, '- instance', j, 'text:', line)
-        gan.generate(text_message=line, output_dir_path=patch_path('output'), filename=str(i) + '-' + str(j) + '.png')
+        prompts.append(line)
+        file_paths.append(os.path.join(patch_path('output'), str(i) + '-' + str(j) + '.png'))
+
+    imgs = gan.generate_batch(prompts, samples_per_prompt=1)
+    save_images(imgs, file_paths)
 
 
 if __name__ == '__main__':
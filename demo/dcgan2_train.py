@@ -4,6 +4,8 @@ import mxnet as mx
 import logging
 
 LOAD_EXISTING_MODEL = False
+# continue from the latest checkpoint of the models folder, if any (weights, optimizer, image pools, epoch and batch)
+RESUME = True
 
 def patch_path(path):
     return os.path.join(os.path.dirname(__file__), path)
@@ -18,29 +20,34 @@ def main():
     output_dir_path = patch_path('models')
     batch_size = 64
     epochs = 100
-    ctx = mx.gpu(0)
+    # all the gpus train data parallel, the first one also holds the dataset
+    ctx_list = [mx.gpu(i) for i in range(max(1, mx.context.num_gpus()))]
 
     from mxnet_text_to_image.library.dcgan2 import DCGan
     from mxnet_text_to_image.data.flowers import get_data_iter
     from mxnet_text_to_image.data.flowers_images import get_transformed_images
 
-    train_data = get_data_iter(data_dir_path=data_dir_path,
-                               batch_size=batch_size,
-                               limit=10000,
-                               text_mode='add')
-
     image_dict = get_transformed_images(data_dir_path=os.path.join(data_dir_path, 'jpg'),
                                         image_width=64, image_height=64)
 
-    gan = DCGan(model_ctx=ctx)
+    gan = DCGan(model_ctx=ctx_list)
     gan.random_input_size = 20  # random input is 20, text input is 300
+
+    # the images are gathered on the gpu (device_dataset), the text features and random input are prefetched
+    train_data = get_data_iter(data_dir_path=data_dir_path,
+                               batch_size=batch_size,
+                               limit=10000,
+                               text_mode='add',
+                               random_input_size=gan.random_input_size,
+                               ctx=ctx_list[0])
+    gan.hybridize = True
     if LOAD_EXISTING_MODEL:
         gan.load_model(model_dir_path=output_dir_path)
 
     start_epoch = 0
     gan.fit(train_data=train_data, image_dict=image_dict, model_dir_path=output_dir_path,
             start_epoch=start_epoch,
-            epochs=epochs, batch_size=batch_size)
+            epochs=epochs, batch_size=batch_size, device_dataset=True, checkpoint_every=500, resume=RESUME)
 
 
 if __name__ == '__main__':
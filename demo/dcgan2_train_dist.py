@@ -0,0 +1,71 @@
+import os
+import sys
+import mxnet as mx
+import logging
+
+NUM_WORKERS = 2
+NUM_SERVERS = 1
+
+
+def patch_path(path):
+    return os.path.join(os.path.dirname(__file__), path)
+
+
+def main():
+    sys.path.append(patch_path('..'))
+
+    logging.basicConfig(level=logging.DEBUG)
+
+    from mxnet_text_to_image.library.distributed import launch_local
+
+    # started without a role, the script launches the scheduler, the servers and the workers on localhost, which all
+    # run this script again (the scheduler and the servers never get past `import mxnet`)
+    if 'DMLC_ROLE' not in os.environ:
+        sys.exit(launch_local([sys.executable, os.path.abspath(__file__)], num_workers=NUM_WORKERS,
+                              num_servers=NUM_SERVERS))
+
+    data_dir_path = patch_path('data/flowers')
+    output_dir_path = patch_path('models')
+    batch_size = 64
+    epochs = 100
+    ctx = mx.cpu()
+
+    from mxnet_text_to_image.library.dcgan2 import DCGan
+    from mxnet_text_to_image.data.flowers import get_data_iter
+    from mxnet_text_to_image.data.flowers_images import get_transformed_images
+
+    kvstore = mx.kv.create('dist_sync')
+
+    gan = DCGan(model_ctx=ctx)
+    gan.random_input_size = 20  # random input is 20, text input is 300
+
+    def load_data():
+        image_dict = get_transformed_images(data_dir_path=os.path.join(data_dir_path, 'jpg'),
+                                            image_width=64, image_height=64)
+
+        # every worker trains on its own part of the captions, only worker 0 saves the models
+        train_data = get_data_iter(data_dir_path=data_dir_path,
+                                   batch_size=batch_size,
+                                   limit=10000,
+                                   text_mode='add',
+                                   random_input_size=gan.random_input_size,
+                                   ctx=ctx,
+                                   num_parts=kvstore.num_workers,
+                                   part_index=kvstore.rank)
+        return image_dict, train_data
+
+    # worker 0 builds the on-disk caches (image store, manifests, text shards) alone, the other workers wait for them
+    # and only read them
+    if kvstore.rank == 0:
+        image_dict, train_data = load_data()
+    kvstore._barrier()
+    if kvstore.rank != 0:
+        image_dict, train_data = load_data()
+    gan.hybridize = True
+
+    gan.fit(train_data=train_data, image_dict=image_dict, model_dir_path=output_dir_path,
+            epochs=epochs, batch_size=batch_size, device_dataset=True, kvstore=kvstore)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+import os
+import sys
+import logging
+
+
+def patch_path(path):
+    return os.path.join(os.path.dirname(__file__), path)
+
+
+def main():
+    sys.path.append(patch_path('..'))
+
+    logging.basicConfig(level=logging.DEBUG)
+
+    from mxnet_text_to_image.data.flowers_images import pack_images
+    # written next to the jpg directory, where get_image_features and get_transformed_images look for them
+    records = pack_images(data_dir_path=patch_path('data/flowers/jpg'), images_per_shard=1000)
+    logging.info('total %d images packed into %d shards', len(records), len(records.shards))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+import os
+import json
+import logging
+import numpy as np
+
+from mxnet_text_to_image.data.image_store import ImageStore
+from mxnet_text_to_image.utils.store_utils import replace_on_success
+
+
+def get_file_signature(file_path):
+    """
+    :return: the signature of a source file, which changes when the file is rewritten
+    """
+    stat = os.stat(file_path)
+    return '%d-%d' % (stat.st_size, stat.st_mtime_ns)
+
+
+class FeatureCache(ImageStore):
+    """
+    Append-only image_id to array cache in the directory cache_dir_path: chunk files chunk-000000.npy, ... of up to
+    chunk_size rows and a manifest.jsonl with one line per chunk listing its image ids and the signatures of the
+    sources they were computed from. A chunk is written under a temporary name and renamed, then its manifest line is
+    appended, so a crash loses at most the chunk being written. The rows of an image id recomputed later (its source
+    changed) are appended to a new chunk, the latest one wins. Reads have the ImageStore interface over the image ids
+    of the last update (all of the cached ones when the cache is just opened)
+    """
+
+    def __init__(self, cache_dir_path, chunk_size=1024):
+        self.cache_dir_path = cache_dir_path
+        self.chunk_size = chunk_size
+        self.manifest_path = os.path.join(cache_dir_path, 'manifest.jsonl')
+        self.chunks = dict()
+        self.entries = dict()
+        self.next_chunk = 0
+        self.dtype = None
+        self.row_shape = None
+        self.load_manifest()
+        self.select(list(self.entries.keys()))
+
+    def __getstate__(self):
+        # only the paths and the selected image ids are pickled, worker processes re-open the chunks
+        return {'cache_dir_path': self.cache_dir_path, 'chunk_size': self.chunk_size,
+                'image_ids': self.image_ids.tolist()}
+
+    def __setstate__(self, state):
+        self.__init__(state['cache_dir_path'], state['chunk_size'])
+        self.select(state['image_ids'])
+
+    def get_chunk_path(self, chunk):
+        return os.path.join(self.cache_dir_path, 'chunk-%06d.npy' % chunk)
+
+    def load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path, 'rb') as f:
+            content = f.read()
+        complete = content.rfind(b'\n') + 1
+        if complete < len(content):
+            # the line of a chunk whose append was interrupted, the chunk is lost
+            logging.warning('dropping an incomplete line at the end of %s', self.manifest_path)
+            with open(self.manifest_path, 'r+b') as f:
+                f.truncate(complete)
+        for line in content[:complete].decode('utf8').splitlines():
+            chunk = json.loads(line)
+            self.dtype = np.dtype(chunk['dtype'])
+            self.row_shape = tuple(chunk['shape'])
+            for row, (image_id, signature) in enumerate(zip(chunk['image_ids'], chunk['signatures'])):
+                self.entries[image_id] = (chunk['chunk'], row, signature)
+            self.next_chunk = max(self.next_chunk, chunk['chunk'] + 1)
+
+    def select(self, image_ids):
+        """
+        Make the image ids (which must all be cached) the ones of the ImageStore interface
+        """
+        self.image_ids = np.unique(np.asarray(list(image_ids), dtype=np.int64))
+        self.chunk_ids = np.array([self.entries[image_id][0] for image_id in self.image_ids.tolist()], dtype=np.int64)
+        self.chunk_rows = np.array([self.entries[image_id][1] for image_id in self.image_ids.tolist()], dtype=np.int64)
+
+    def get_chunk(self, chunk):
+        if chunk not in self.chunks:
+            self.chunks[chunk] = np.load(self.get_chunk_path(chunk), mmap_mode='r')
+        return self.chunks[chunk]
+
+    def get_rows(self, image_ids):
+        positions = self.rows(image_ids)
+        chunk_ids = self.chunk_ids[positions]
+        chunk_rows = self.chunk_rows[positions]
+        result = np.empty(shape=(len(positions), ) + self.row_shape, dtype=self.dtype)
+        for chunk in np.unique(chunk_ids):
+            selected = chunk_ids == chunk
+            result[selected] = self.get_chunk(int(chunk))[chunk_rows[selected]]
+        return result
+
+    @property
+    def data(self):
+        """
+        The rows of all the selected image ids, gathered in memory from the chunks
+        """
+        return self.get_rows(self.image_ids)
+
+    def get_stale(self, signatures):
+        """
+        :param signatures: dict of image_id to the current signature of its source
+        :return: sorted int64 array of the image ids which are not cached or whose source changed
+        """
+        return np.array(sorted(image_id for image_id, signature in signatures.items()
+                               if image_id not in self.entries or self.entries[image_id][2] != signature),
+                        dtype=np.int64)
+
+    def append(self, image_ids, rows, signatures):
+        """
+        Write one chunk of rows and record it in the manifest
+        :param signatures: dict of image_id to the signature of its source
+        """
+        signatures = [signatures[int(image_id)] for image_id in image_ids]
+        chunk = self.next_chunk
+        chunk_path = self.get_chunk_path(chunk)
+        with replace_on_success(chunk_path) as (chunk_tmp_path, ):
+            np.save(chunk_tmp_path, rows)
+        line = json.dumps({'chunk': chunk, 'image_ids': [int(image_id) for image_id in image_ids],
+                           'signatures': signatures, 'dtype': rows.dtype.str, 'shape': rows.shape[1:]})
+        with open(self.manifest_path, 'a') as f:
+            f.write(line + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.dtype = rows.dtype
+        self.row_shape = tuple(rows.shape[1:])
+        for row, (image_id, signature) in enumerate(zip(image_ids, signatures)):
+            self.entries[int(image_id)] = (chunk, row, signature)
+        self.next_chunk = chunk + 1
+
+    def update(self, signatures, iter_rows):
+        """
+        Compute and append the rows of the stale image ids (see get_stale) with iter_rows(stale_image_ids), a generator
+        of (offset, rows) batches, then select the image ids of signatures
+        :return: self
+        """
+        if not os.path.exists(self.cache_dir_path):
+            os.makedirs(self.cache_dir_path)
+        stale = self.get_stale(signatures)
+        logging.debug('%d images out of %d are missing from the cache %s', len(stale), len(signatures),
+                      self.cache_dir_path)
+        if len(stale) > 0:
+            # the batches of iter_rows are regrouped into chunks of chunk_size rows
+            pending = []
+            written = 0
+            for _, rows in iter_rows(stale):
+                pending.append(rows)
+                while sum(len(rows) for rows in pending) >= self.chunk_size:
+                    rows = np.concatenate(pending)
+                    self.append(stale[written:written + self.chunk_size], rows[:self.chunk_size], signatures)
+                    written += self.chunk_size
+                    pending = [rows[self.chunk_size:]]
+            if sum(len(rows) for rows in pending) > 0:
+                rows = np.concatenate(pending)
+                self.append(stale[written:written + len(rows)], rows, signatures)
+        self.select(signatures.keys())
+        return self
@@ -1,14 +1,25 @@
 from mxnet_text_to_image.data.flowers_images import get_image_features, get_transformed_images
 from mxnet_text_to_image.data.flowers_texts import get_text_features
+from mxnet_text_to_image.data.prefetch import PrefetchingIter
 import mxnet as mx
-from mxnet import nd
 import os
 import numpy as np
 
 
 def get_data_iter(data_dir_path, glove_dir_path=None, max_sequence_length=-1,
                   limit = -1,
-                  text_mode='add', batch_size=64):
+                  text_mode='add', batch_size=64,
+                  image_store=None, random_input_size=None, ctx=mx.cpu(), num_workers=2, prefetch=4,
+                  num_parts=1, part_index=0):
+    """
+    :param image_store: if set, every batch also holds the real images (or image features) of its image ids
+    :param random_input_size: if set, every batch also holds the random input of the generator
+    :param ctx: the context on which the batches are assembled
+    :param num_parts: number of distributed workers, worker part_index only iterates over its part of the captions.
+    The parts are disjoint and of the same size (up to num_parts - 1 captions are left out), so that every worker
+    runs the same number of dist_sync steps per epoch
+    :return: a PrefetchingIter whose worker threads assemble the next batches while the current one is trained on
+    """
     if glove_dir_path is None:
         glove_dir_path = os.path.join(os.path.dirname(data_dir_path), 'glove')
 
@@ -21,4 +32,11 @@ def get_data_iter(data_dir_path, glove_dir_path=None, max_sequence_length=-1,
         text_feats = text_feats[0:min(limit, len(text_feats))]
         image_id_array = image_id_array[0:min(limit, len(text_feats))]
 
-    return mx.io.NDArrayIter(data=[nd.array(image_id_array, ctx=mx.cpu()), text_feats], batch_size=batch_size, shuffle=True)
+    if num_parts > 1:
+        # strided, so that every part holds captions of all the classes (the captions are ordered by class)
+        count = len(text_feats) // num_parts * num_parts
+        text_feats = text_feats[part_index:count:num_parts]
+        image_id_array = image_id_array[part_index:count:num_parts]
+
+    return PrefetchingIter(image_id_array, text_feats, batch_size=batch_size, image_store=image_store,
+                           random_input_size=random_input_size, ctx=ctx, num_workers=num_workers, prefetch=prefetch)
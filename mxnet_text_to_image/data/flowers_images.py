@@ -1,80 +1,121 @@
 import os
 import numpy as np
-from mxnet_text_to_image.utils.image_utils import Vgg16FeatureExtractor, transform_image
+from mxnet import image
+from mxnet_text_to_image.data.image_records import load_image_records, pack_image_records
+from mxnet_text_to_image.data.feature_cache import FeatureCache, get_file_signature
+from mxnet_text_to_image.data.image_store import load_image_store
+from mxnet_text_to_image.data.manifest import get_file_index
+from mxnet_text_to_image.utils.image_utils import Vgg16FeatureExtractor, iter_resized_images
 import logging
 import mxnet as mx
 
 def get_image_paths(data_dir_path):
-    result = dict()
-    for root_dir, _, files in os.walk(data_dir_path):
-        for fname in files:
-            if fname.endswith('.jpg'):
-                image_name = fname.replace('.jpg', '')
-                image_id = int(image_name.replace('image_', ''))
-                fpath = os.path.join(root_dir, fname)
-                result[image_id] = fpath
-
-    return result
-
-
-def get_image_features(data_dir_path, model_ctx=mx.cpu(), image_width=224, image_height=224):
-    features = dict()
-    features_path = os.path.join(os.path.dirname(data_dir_path), 'flower_image_feats.npy')
-    if os.path.exists(features_path):
-        logging.debug('loading image features from %s', features_path)
-        features = np.load(features_path).item()
-
-    image_paths_dict = get_image_paths(data_dir_path)
-
-    fe = Vgg16FeatureExtractor(model_ctx)
-
-    total_images = len(image_paths_dict)
-
-    changed = False
-    for i, (image_id, image_path) in enumerate(image_paths_dict.items()):
-        if image_id in features:
-            continue
-        feats = fe.extract_image_features(image_path, image_width=image_width, image_height=image_height).asnumpy()
-        features[image_id] = feats[0]
-        changed = True
-        if i % 500 == 0:
-            logging.debug('Has extracted features from %d images out of %d images (%.2f %%)', i+1, total_images, (i+1) * 100 / total_images)
-            if changed:
-                np.save(features_path, features)
-                changed = False
-
-    if changed:
-        np.save(features_path, features)
-    return features
-
-
-def get_transformed_images(data_dir_path, image_width=64, image_height=64):
-    features = dict()
-    features_path = os.path.join(os.path.dirname(data_dir_path), 'flower_transformed_images.npy')
-    if os.path.exists(features_path):
-        logging.debug('loading transformed images from %s', features_path)
-        features = np.load(features_path).item()
-
-    image_paths_dict = get_image_paths(data_dir_path)
-
-    total_images = len(image_paths_dict)
-
-    changed = False
-    for i, (image_id, image_path) in enumerate(image_paths_dict.items()):
-        if image_id in features:
-            continue
-        features[image_id] = transform_image(image_path, image_width=image_width, image_height=image_height).asnumpy()
-        changed = True
-        if i % 1000 == 0:
-            logging.debug('Has transformed %d images out of %d images (%.2f %%)', i+1, total_images, (i+1) * 100 / total_images)
-            if changed:
-                np.save(features_path, features)
-                changed = False
-
-    if changed:
-        np.save(features_path, features)
-    return features
-
-
-
-
+    """
+    :return: dict of image_id to the path of its jpg file, in sorted path order (see get_file_index)
+    """
+    return get_file_index(data_dir_path, '.jpg')
+
+
+def get_image_records_prefix(data_dir_path):
+    return os.path.join(os.path.dirname(data_dir_path), 'flower_images')
+
+
+def pack_images(data_dir_path, images_per_shard=1000):
+    """
+    Pack the jpg files of data_dir_path into RecordIO shards next to it, which get_image_features and
+    get_transformed_images then read instead of the individual files
+    :return: ImageRecords of the shards
+    """
+    return pack_image_records(get_image_paths(data_dir_path), get_image_records_prefix(data_dir_path),
+                              images_per_shard=images_per_shard)
+
+
+def get_image_sources(data_dir_path):
+    """
+    :return: (dict of image_id to what read_image decodes, read_image, get_signature), the image ids, RecordIO reader
+    and content hashes of the packed shards if there are some (see pack_images), otherwise the image file paths,
+    image.imread and the file sizes and modification times
+    """
+    records = load_image_records(get_image_records_prefix(data_dir_path))
+    if records is not None:
+        logging.debug('reading %d images from %s', len(records), records.records_prefix)
+        return dict((image_id, image_id) for image_id in records), records.read_image, records.get_signature
+    return get_image_paths(data_dir_path), image.imread, get_file_signature
+
+
+def open_feature_cache(store_prefix, signatures, legacy_features_path=None):
+    """
+    Open the feature cache of store_prefix. An empty cache is filled once from the store of store_prefix (or the
+    pickled dict of legacy_features_path, if given), whose rows are assumed to be those of the current sources
+    """
+    cache = FeatureCache(store_prefix + '.cache')
+    if len(cache.entries) > 0:
+        return cache
+    legacy_rows = None
+    legacy_store = load_image_store(store_prefix)
+    if legacy_store is not None:
+        legacy_image_ids = list(legacy_store.keys())
+        legacy_rows = legacy_store.get_rows
+    elif legacy_features_path is not None and os.path.exists(legacy_features_path):
+        legacy = np.load(legacy_features_path, allow_pickle=True).item()
+        legacy_image_ids = list(legacy.keys())
+
+        def legacy_rows(image_ids):
+            return np.stack([legacy[image_id] for image_id in image_ids])
+    if legacy_rows is not None:
+        logging.debug('converting the image store %s', store_prefix)
+        cache.update(dict((image_id, signatures[image_id]) for image_id in legacy_image_ids if image_id in signatures),
+                     lambda image_ids: ((offset, legacy_rows(image_ids[offset:offset + cache.chunk_size]))
+                                        for offset in range(0, len(image_ids), cache.chunk_size)))
+    return cache
+
+
+def get_image_features(data_dir_path, model_ctx=mx.cpu(), image_width=224, image_height=224, batch_size=32,
+                       num_threads=4):
+    """
+    Extract the vgg16 features of the images which are not in the cache yet or changed since, batch_size images per
+    forward pass while num_threads threads decode the next batch. The features are appended to the cache chunk by
+    chunk. The images are read from their packed shards if there are some
+    :return: FeatureCache of image_id to float32 features
+    """
+    image_paths_dict, read_image, get_signature = get_image_sources(data_dir_path)
+    signatures = dict((image_id, get_signature(source)) for image_id, source in image_paths_dict.items())
+    features_prefix = os.path.join(os.path.dirname(data_dir_path), 'flower_image_feats')
+    cache = open_feature_cache(features_prefix, signatures, legacy_features_path=features_prefix + '.npy')
+
+    def iter_features(image_ids):
+        fe = Vgg16FeatureExtractor(model_ctx)
+        total_images = len(image_ids)
+        for offset, batch_feats in fe.iter_images_features([image_paths_dict[image_id] for image_id in image_ids],
+                                                            image_width=image_width, image_height=image_height,
+                                                            batch_size=batch_size, num_threads=num_threads,
+                                                            read_image=read_image):
+            if (offset // batch_size) % max(1, 500 // batch_size) == 0:
+                logging.debug('Has extracted features from %d images out of %d images (%.2f %%)',
+                              offset + len(batch_feats), total_images, (offset + len(batch_feats)) * 100 / total_images)
+            yield offset, batch_feats
+
+    return cache.update(signatures, iter_features)
+
+
+def get_transformed_images(data_dir_path, image_width=64, image_height=64, num_threads=4):
+    """
+    Resize the images which are not in the cache yet or changed since, the images are read from their packed shards
+    if there are some
+    :return: FeatureCache of image_id to the resized images, stored as uint8 and normalized when they are read
+    """
+    image_paths_dict, read_image, get_signature = get_image_sources(data_dir_path)
+    signatures = dict((image_id, get_signature(source)) for image_id, source in image_paths_dict.items())
+    cache = open_feature_cache(os.path.join(os.path.dirname(data_dir_path), 'flower_transformed_images_'
+                                            + str(image_width) + 'x' + str(image_height)), signatures)
+
+    def iter_images(image_ids):
+        total_images = len(image_ids)
+        for offset, images in iter_resized_images([image_paths_dict[image_id] for image_id in image_ids],
+                                                  image_width=image_width, image_height=image_height,
+                                                  num_threads=num_threads, read_image=read_image):
+            logging.debug('Has transformed %d images out of %d images (%.2f %%)', offset + len(images), total_images,
+                          (offset + len(images)) * 100 / total_images)
+            yield offset, images
+
+    return cache.update(signatures, iter_images)
@@ -1,24 +1,22 @@
 import os
+import hashlib
 import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from mxnet_text_to_image.data.manifest import get_file_index
 from mxnet_text_to_image.utils.glove import glove_word2emb_300
-from mxnet_text_to_image.utils.text_utils import word_tokenize, pad_sequence
+from mxnet_text_to_image.utils.glove_loader import sum_embeddings
+from mxnet_text_to_image.utils.store_utils import get_temp_path
+from mxnet_text_to_image.utils.text_utils import word_tokenize_docs, get_tokenizer_mode
 import numpy as np
 
+TEXT_SHARD_CACHE_VERSION = 1
 
-def load_text_files(data_dir_path, files_to_load=-1):
-    result = dict()
-    for root_dir, sub_dirs, files in os.walk(data_dir_path):
-        for fname in files:
-            if fname.endswith('.txt'):
-                image_name = fname.replace('.txt', '')
-                image_id = int(image_name.replace('image_', ''))
-                result[image_id] = os.path.join(root_dir, fname)
-                if 0 < files_to_load <= len(result):
-                    break
-        if 0 < files_to_load <= len(result):
-            break
 
-    return result
+def load_text_files(data_dir_path, files_to_load=-1):
+    """
+    :return: dict of image_id to the path of its caption file, in sorted path order (see get_file_index)
+    """
+    return get_file_index(data_dir_path, '.txt', files_to_load=files_to_load)
 
 
 def load_texts(data_dir_path, files_to_load=-1):
@@ -36,63 +34,154 @@ def load_texts(data_dir_path, files_to_load=-1):
     return result
 
 
-def get_text_features(data_dir_path, glove_dir_path=None, max_seq_length=-1, mode='add'):
+def get_text_shard_paths(data_dir_path):
+    """
+    :return: the sorted class_* sub-directories of the caption directory, each of which is extracted and cached as
+    one shard (the caption directory itself is the only shard if it has no sub-directories)
+    """
+    shards = sorted(entry.path for entry in os.scandir(data_dir_path) if entry.is_dir())
+    if len(shards) == 0:
+        shards = [data_dir_path]
+    return shards
+
+
+def _text_shard_signature(shard_dir_path, vocab_signature, tokenizer_mode):
+    entries = sorted((entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+                     for entry in os.scandir(shard_dir_path) if entry.is_file() and entry.name.endswith('.txt'))
+    return hashlib.md5(repr((TEXT_SHARD_CACHE_VERSION, vocab_signature, tokenizer_mode, entries))
+                       .encode('utf8')).hexdigest()
+
+
+def _load_text_shard(cache_path, signature=None):
+    if not os.path.exists(cache_path):
+        return None
+    shard = np.load(cache_path)
+    if signature is not None and str(shard['signature']) != signature:
+        return None
+    return shard
+
+
+def _tokenize_text_shard(shard_dir_path, emb, cache_path, signature):
+    """
+    Tokenize every caption of one class directory and cache the glove rows of their words
+    (word_ids flat int32, -1 for unknown words) with the caption lengths and image ids
+    """
+    word_ids = list()
+    lengths = list()
+    image_ids = list()
+    fnames = sorted(fname for fname in os.listdir(shard_dir_path) if fname.endswith('.txt'))
+    for fname in fnames:
+        image_id = int(fname.replace('.txt', '').replace('image_', ''))
+        with open(os.path.join(shard_dir_path, fname), 'r') as f:
+            lines = [line.lower() for line in f]
+        for words in word_tokenize_docs(lines):
+            word_ids.extend(words)
+            lengths.append(len(words))
+        image_ids.extend([image_id] * len(lines))
+    word_ids = emb.lookup(word_ids).astype(np.int32)
+
+    tmp_path = get_temp_path(cache_path, '.npz')
+    np.savez(tmp_path, word_ids=word_ids, lengths=np.array(lengths, dtype=np.int32),
+             image_ids=np.array(image_ids, dtype=np.int64), signature=signature)
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+def get_text_features(data_dir_path, glove_dir_path=None, max_seq_length=-1, mode='add', num_workers=None):
+    """
+    Extract the glove features of every caption. The class_* directories are tokenized in parallel by a process pool
+    and each one is cached separately, so only the class directories that changed are tokenized again
+    :param mode: 'add' sums the word embeddings of a caption, 'concat' left-pads them to (max_seq_length, 300)
+    :param num_workers: number of worker processes, default to the number of cpus
+    :return: (float32 features, image id of each caption)
+    """
     if mode == 'concat':
         features_path = os.path.join(os.path.dirname(data_dir_path), 'flower_text_feats_' + mode + '_'
                                      + str(max_seq_length) + '.npy')
     else:
         features_path = os.path.join(os.path.dirname(data_dir_path), 'flower_text_feats_' + mode + '.npy')
-    if os.path.exists(features_path):
-        logging.debug('loading text features from %s', features_path)
-        return np.load(features_path), np.load(features_path[:len(features_path)-4] + '_mapping.npy')
+    mapping_path = features_path[:len(features_path)-4] + '_mapping.npy'
+    signature_path = features_path[:len(features_path)-4] + '_signature.txt'
+    shards_dir_path = os.path.join(os.path.dirname(data_dir_path), 'flower_text_feats_shards')
+    if not os.path.exists(shards_dir_path):
+        os.makedirs(shards_dir_path)
 
     if glove_dir_path is None:
         glove_dir_path = os.path.join(os.path.dirname(os.path.dirname(data_dir_path)), 'glove')
     emb = glove_word2emb_300(glove_dir_path)
-    texts = load_texts(data_dir_path)
-    result = list()
-    mapping = list()
-    total_images = len(texts)
-
-    if mode == 'concat' or mode == 'concat_int':
-        temp = max_seq_length
-        for i, (image_id, lines) in enumerate(texts.items()):
-            for line in lines:
-                words = word_tokenize(line.lower())
-                max_seq_length = max(len(words), max_seq_length)
-        if temp > 0:
-            max_seq_length = min(temp, max_seq_length)
-    elif mode == 'add':
-        max_seq_length = -1
-
-    logging.debug('max sequence length: %d', max_seq_length)
-
-    for i, (image_id, lines) in enumerate(texts.items()):
-        for k, line in enumerate(lines):
-            words = word_tokenize(line.lower())
-            if mode == 'concat':
-                temp = list()
-                for word in words:
-                    if word in emb:
-                        temp.append(emb[word])
-                    else:
-                        temp.append(np.zeros(shape=300))
-                result.append(pad_sequence(temp, max_seq_length))
-            else:
-                encoded = np.zeros(shape=(len(words), 300))
-                for j, word in enumerate(words):
-                    if word in emb:
-                        encoded[j, :] = emb[word]
-
-                encoded = np.sum(encoded, axis=0).reshape(300)
-                result.append(encoded)
-            mapping.append(image_id)
-        if i % 100 == 0:
-            logging.debug('Has extracted text features from %d images out of %d images (%.2f %%)', i + 1, total_images,
-                          (i + 1) * 100 / total_images)
-
-    result = np.array(result)
-    mapping = np.array(mapping)
+    vocab_stat = os.stat(emb.vocab_path)
+    vocab_signature = (len(emb), vocab_stat.st_size, vocab_stat.st_mtime_ns)
+    # the worker processes tokenize with the nltk data of this one
+    tokenizer_mode = get_tokenizer_mode()
+
+    shards = list()
+    stale_shards = list()
+    for shard_dir_path in get_text_shard_paths(data_dir_path):
+        cache_path = os.path.join(shards_dir_path, os.path.basename(shard_dir_path) + '.npz')
+        signature = _text_shard_signature(shard_dir_path, vocab_signature, tokenizer_mode)
+        shards.append((cache_path, signature))
+        if _load_text_shard(cache_path, signature) is None:
+            stale_shards.append((shard_dir_path, cache_path, signature))
+
+    features_signature = hashlib.md5(repr((mode, max_seq_length, shards)).encode('utf8')).hexdigest()
+    if len(stale_shards) == 0 and os.path.exists(features_path) and os.path.exists(signature_path):
+        with open(signature_path, 'r') as f:
+            if f.read() == features_signature:
+                logging.debug('loading text features from %s', features_path)
+                return np.load(features_path), np.load(mapping_path)
+
+    logging.debug('tokenizing %d out of %d caption shards', len(stale_shards), len(shards))
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    num_workers = min(num_workers, len(stale_shards))
+    if num_workers > 1:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            futures = [executor.submit(_tokenize_text_shard, shard_dir_path, emb, cache_path, signature)
+                       for shard_dir_path, cache_path, signature in stale_shards]
+            for i, future in enumerate(as_completed(futures)):
+                future.result()
+                logging.debug('Has tokenized %d caption shards out of %d', i + 1, len(stale_shards))
+    else:
+        for shard_dir_path, cache_path, signature in stale_shards:
+            _tokenize_text_shard(shard_dir_path, emb, cache_path, signature)
+
+    total_captions = 0
+    max_length = 0
+    for cache_path, _ in shards:
+        lengths = _load_text_shard(cache_path)['lengths']
+        total_captions += len(lengths)
+        if len(lengths) > 0:
+            max_length = max(max_length, int(lengths.max()))
+
+    if mode == 'concat':
+        if max_seq_length > 0:
+            max_length = min(max_seq_length, max_length)
+        logging.debug('max sequence length: %d', max_length)
+        result = np.zeros(shape=(total_captions, max_length, 300), dtype=np.float32)
+    else:
+        result = np.zeros(shape=(total_captions, 300), dtype=np.float32)
+    mapping = np.zeros(shape=(total_captions, ), dtype=np.int64)
+
+    # stream the shards one by one into the preallocated output
+    offset = 0
+    for cache_path, _ in shards:
+        shard = _load_text_shard(cache_path)
+        word_ids, lengths = shard['word_ids'], shard['lengths']
+        count = len(lengths)
+        caption_ids = np.repeat(np.arange(count), lengths)
+        if mode == 'concat':
+            starts = np.cumsum(lengths) - lengths
+            positions = np.arange(len(word_ids)) - starts[caption_ids]
+            kept = (positions < max_length) & (word_ids >= 0)
+            pad = max_length - np.minimum(lengths, max_length)
+            result[offset + caption_ids[kept], pad[caption_ids[kept]] + positions[kept]] = emb.matrix[word_ids[kept]]
+        else:
+            result[offset:offset + count] = sum_embeddings(emb.matrix, word_ids, caption_ids, count)
+        mapping[offset:offset + count] = shard['image_ids']
+        offset += count
+
     np.save(features_path, result)
-    np.save(features_path[:len(features_path)-4] + '_mapping.npy', mapping)
+    np.save(mapping_path, mapping)
+    with open(signature_path, 'w') as f:
+        f.write(features_signature)
     return result, mapping
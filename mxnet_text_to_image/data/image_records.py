@@ -0,0 +1,218 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+import numpy as np
+from mxnet import image, nd, recordio
+
+from mxnet_text_to_image.utils.store_utils import FileStore, sorted_lookup, get_temp_path
+
+
+# imdecode copies the bytes with nd.array first, which costs as much as the decoding of a small jpg. The operator
+# behind it is private, image.imdecode is used if a version of mxnet does not have it
+_cvimdecode = getattr(nd._internal, '_cvimdecode', None) if hasattr(nd, 'from_numpy') else None
+
+
+def get_image_record_paths(records_prefix, shard):
+    prefix = records_prefix + '-%05d' % shard
+    return prefix + '.rec', prefix + '.idx'
+
+
+def get_image_digests_path(records_prefix, shard):
+    return records_prefix + '-%05d.md5.json' % shard
+
+
+def get_record_file_signature(rec_path):
+    stat = os.stat(rec_path)
+    return '%d-%d' % (stat.st_size, stat.st_mtime_ns)
+
+
+def list_image_record_shards(records_prefix):
+    """
+    :return: the sorted shard numbers of records_prefix which have both their .rec and .idx files
+    """
+    dir_path = os.path.dirname(records_prefix) or '.'
+    if not os.path.isdir(dir_path):
+        return []
+    pattern = re.compile(re.escape(os.path.basename(records_prefix)) + r'-(\d{5})\.idx$')
+    shards = []
+    for name in os.listdir(dir_path):
+        match = pattern.match(name)
+        if match is not None and os.path.exists(get_image_record_paths(records_prefix, int(match.group(1)))[0]):
+            shards.append(int(match.group(1)))
+    return sorted(shards)
+
+
+class ImageRecords(FileStore):
+    """
+    Read-only image_id to encoded image mapping backed by RecordIO shards (records_prefix-00000.rec, ...) and their
+    .idx files of record offsets. The shards hold the original jpg bytes of the images in image id order, so reading
+    them in that order is sequential. Each shard has its own reader and lock, reads are short and only the decoding
+    (see read_image) is done outside of the lock, in parallel
+    """
+    path_names = ('records_prefix', )
+
+    def __init__(self, records_prefix):
+        self.records_prefix = records_prefix
+        self.shards = list_image_record_shards(records_prefix)
+        self.readers = []
+        self.locks = []
+        self.digests = [None] * len(self.shards)
+        image_ids = []
+        shard_ids = []
+        for i, shard in enumerate(self.shards):
+            rec_path, idx_path = get_image_record_paths(records_prefix, shard)
+            reader = recordio.MXIndexedRecordIO(idx_path, rec_path, 'r')
+            self.readers.append(reader)
+            self.locks.append(threading.Lock())
+            image_ids.extend(reader.keys)
+            shard_ids.extend([i] * len(reader.keys))
+        image_ids = np.asarray(image_ids, dtype=np.int64)
+        order = np.argsort(image_ids, kind='stable')
+        self.image_ids = image_ids[order]
+        self.shard_ids = np.asarray(shard_ids, dtype=np.int64)[order]
+
+    def __len__(self):
+        return len(self.image_ids)
+
+    def __iter__(self):
+        return iter(int(image_id) for image_id in self.image_ids)
+
+    def __contains__(self, image_id):
+        return sorted_lookup(self.image_ids, [image_id])[0] >= 0
+
+    def keys(self):
+        return iter(self)
+
+    def read(self, image_id):
+        """
+        :return: the encoded bytes of the image
+        """
+        i = int(sorted_lookup(self.image_ids, [image_id])[0])
+        if i < 0:
+            raise KeyError(image_id)
+        shard_id = self.shard_ids[i]
+        with self.locks[shard_id]:
+            record = self.readers[shard_id].read_idx(int(image_id))
+        _, payload = recordio.unpack(record)
+        return payload
+
+    def load_digests(self, shard_id):
+        """
+        :return: dict of image_id to the md5 recorded by pack_image_records for the shard, empty if the shard has no
+        digests or its .rec file changed since they were recorded
+        """
+        shard = self.shards[shard_id]
+        digests_path = get_image_digests_path(self.records_prefix, shard)
+        try:
+            with open(digests_path, 'r') as f:
+                content = json.loads(f.read())
+            rec_path = get_image_record_paths(self.records_prefix, shard)[0]
+            if content['rec_signature'] == get_record_file_signature(rec_path):
+                return dict((int(image_id), digest) for image_id, digest in content['digests'].items())
+        except (OSError, ValueError, KeyError):
+            pass
+        logging.info('no valid digests for %s, the images of the shard are hashed (pack them again to avoid it)',
+                     get_image_record_paths(self.records_prefix, shard)[0])
+        return dict()
+
+    def get_signature(self, image_id):
+        """
+        :return: md5 of the encoded image, which only changes with the image (unlike the record offsets). It is read
+        from the digests recorded at packing time, so that checking the signatures does not read the images
+        """
+        i = int(sorted_lookup(self.image_ids, [image_id])[0])
+        if i < 0:
+            raise KeyError(image_id)
+        shard_id = self.shard_ids[i]
+        with self.locks[shard_id]:
+            if self.digests[shard_id] is None:
+                self.digests[shard_id] = self.load_digests(shard_id)
+            digest = self.digests[shard_id].get(int(image_id))
+        if digest is None:
+            digest = hashlib.md5(self.read(image_id)).hexdigest()
+        return digest
+
+    def read_image(self, image_id):
+        """
+        Drop-in replacement of image.imread (see iter_resized_images) which reads the image from the shards
+        :return: the decoded (H, W, C) uint8 NDArray of the image
+        """
+        payload = self.read(image_id)
+        if _cvimdecode is None:
+            return image.imdecode(payload)
+        return _cvimdecode(nd.from_numpy(np.frombuffer(payload, dtype=np.uint8).copy(), zero_copy=True))
+
+    def iter_records(self):
+        """
+        Sequential scan of the shards, without the index
+        :return: generator of (image_id, encoded bytes)
+        """
+        for shard in self.shards:
+            reader = recordio.MXRecordIO(get_image_record_paths(self.records_prefix, shard)[0], 'r')
+            try:
+                while True:
+                    record = reader.read()
+                    if record is None:
+                        break
+                    header, payload = recordio.unpack(record)
+                    yield header.id, payload
+            finally:
+                reader.close()
+
+    def close(self):
+        for reader in self.readers:
+            reader.close()
+
+
+def load_image_records(records_prefix):
+    if len(list_image_record_shards(records_prefix)) == 0:
+        return None
+    return ImageRecords(records_prefix)
+
+
+def pack_image_records(image_paths, records_prefix, images_per_shard=1000):
+    """
+    Write the image files into RecordIO shards of images_per_shard images, in image id order, keyed by image id, with
+    the md5 of every image in records_prefix-00000.md5.json, ... (see ImageRecords.get_signature). Every shard is
+    written to temporary paths and renamed in place, and the shards of an earlier packing beyond the new ones are
+    deleted
+    :param image_paths: dict of image_id to image file path (see get_image_paths)
+    :return: the ImageRecords of the new shards
+    """
+    records_dir_path = os.path.dirname(records_prefix)
+    if records_dir_path and not os.path.exists(records_dir_path):
+        os.makedirs(records_dir_path)
+    image_ids = sorted(image_paths.keys())
+    shard_count = (len(image_ids) + images_per_shard - 1) // images_per_shard
+    for shard in range(shard_count):
+        rec_path, idx_path = get_image_record_paths(records_prefix, shard)
+        digests_path = get_image_digests_path(records_prefix, shard)
+        rec_tmp_path = get_temp_path(rec_path)
+        idx_tmp_path = get_temp_path(idx_path)
+        digests_tmp_path = get_temp_path(digests_path)
+        writer = recordio.MXIndexedRecordIO(idx_tmp_path, rec_tmp_path, 'w')
+        digests = dict()
+        for image_id in image_ids[shard * images_per_shard:(shard + 1) * images_per_shard]:
+            with open(image_paths[image_id], 'rb') as f:
+                payload = f.read()
+            writer.write_idx(image_id, recordio.pack(recordio.IRHeader(0, float(image_id), image_id, 0), payload))
+            digests[str(image_id)] = hashlib.md5(payload).hexdigest()
+        writer.close()
+        # the rename keeps the size and mtime of the .rec file, the digests are only trusted as long as they match
+        with open(digests_tmp_path, 'w') as f:
+            f.write(json.dumps({'rec_signature': get_record_file_signature(rec_tmp_path), 'digests': digests}))
+        os.replace(rec_tmp_path, rec_path)
+        os.replace(idx_tmp_path, idx_path)
+        os.replace(digests_tmp_path, digests_path)
+        logging.debug('Has packed %d image record shards out of %d', shard + 1, shard_count)
+
+    for shard in list_image_record_shards(records_prefix):
+        if shard >= shard_count:
+            for path in get_image_record_paths(records_prefix, shard):
+                os.remove(path)
+            if os.path.exists(get_image_digests_path(records_prefix, shard)):
+                os.remove(get_image_digests_path(records_prefix, shard))
+    return load_image_records(records_prefix)
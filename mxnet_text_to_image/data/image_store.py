@@ -0,0 +1,161 @@
+import os
+import logging
+import numpy as np
+from mxnet import nd
+
+from mxnet_text_to_image.utils.image_utils import normalize_images, rgb_mean, rgb_std
+from mxnet_text_to_image.utils.store_utils import FileStore, sorted_lookup, replace_on_success
+
+
+def get_image_store_paths(store_prefix):
+    return store_prefix + '.data.npy', store_prefix + '.ids.npy'
+
+
+class ImageStore(FileStore):
+    """
+    Read-only image_id to array mapping backed by one contiguous (N, ...) array and the sorted image ids of its rows,
+    both opened with np.memmap. A uint8 store holds raw (C, H, W) pixels which are normalized when they are read
+    """
+    path_names = ('data_path', 'ids_path')
+
+    def __init__(self, data_path, ids_path):
+        self.data_path = data_path
+        self.ids_path = ids_path
+        self.data = np.load(data_path, mmap_mode='r')
+        self.image_ids = np.load(ids_path, mmap_mode='r')
+
+    def __len__(self):
+        return len(self.image_ids)
+
+    def __iter__(self):
+        return iter(int(image_id) for image_id in self.image_ids)
+
+    def __contains__(self, image_id):
+        return sorted_lookup(self.image_ids, [image_id])[0] >= 0
+
+    def __getitem__(self, image_id):
+        return self.get_batch([image_id])[0]
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        for i, image_id in enumerate(self.image_ids):
+            yield int(image_id), self.normalize(self.get_rows(self.image_ids[i:i + 1]))[0]
+
+    def rows(self, image_ids):
+        """
+        :param image_ids: list or array of image ids
+        :return: int64 array of the rows of the image ids in data
+        """
+        image_ids = np.asarray(image_ids, dtype=np.int64).ravel()
+        rows = sorted_lookup(self.image_ids, image_ids)
+        if (rows < 0).any():
+            raise KeyError(int(image_ids[rows < 0][0]))
+        return rows
+
+    def normalize(self, batch):
+        if batch.dtype == np.uint8:
+            return normalize_images(batch)
+        return np.asarray(batch, dtype=np.float32)
+
+    def get_rows(self, image_ids):
+        """
+        :param image_ids: list or array of image ids
+        :return: the rows of the image ids as they are stored (e.g. uint8 pixels)
+        """
+        return self.data[self.rows(image_ids)]
+
+    def get_batch(self, image_ids):
+        """
+        :param image_ids: list or array of image ids
+        :return: float32 array of the (normalized) rows of the image ids
+        """
+        return self.normalize(self.get_rows(image_ids))
+
+    def to_device(self, ctx):
+        """
+        :return: a DeviceImageTable holding a copy of the whole store on the ctx
+        """
+        return DeviceImageTable(self, ctx)
+
+
+class DeviceImageTable(object):
+    """
+    Copy of an ImageStore (or FeatureCache) resident on a device context. Each batch is gathered on the device by one nd.take of the
+    rows of the image ids, so no per-sample host <-> device traffic is needed. Unlike ImageStore.get_batch, image ids
+    which are not in the store are not detected (they are mapped to row 0)
+    """
+
+    def __init__(self, store, ctx):
+        self.ctx = ctx
+        data = store.get_rows(store.image_ids)
+        self.data = nd.array(data, ctx=ctx, dtype=data.dtype)
+        id_to_row = np.zeros(shape=(int(store.image_ids[-1]) + 1 if len(store) > 0 else 1, ), dtype=np.int32)
+        id_to_row[store.image_ids] = np.arange(len(store), dtype=np.int32)
+        self.id_to_row = nd.array(id_to_row, ctx=ctx, dtype=np.int32)
+        self.mean = rgb_mean.reshape((1, 3, 1, 1)).as_in_context(ctx)
+        self.std = rgb_std.reshape((1, 3, 1, 1)).as_in_context(ctx)
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def take(self, image_ids):
+        """
+        :param image_ids: NDArray of image ids on the ctx of the table
+        :return: float32 NDArray of the (normalized) rows of the image ids
+        """
+        rows = nd.take(self.id_to_row, image_ids.astype(np.int32))
+        batch = nd.take(self.data, rows).astype(np.float32)
+        if self.data.dtype == np.uint8:
+            batch = (batch / 255 - self.mean) / self.std
+        return batch
+
+
+def load_image_store(store_prefix):
+    data_path, ids_path = get_image_store_paths(store_prefix)
+    if not os.path.exists(data_path) or not os.path.exists(ids_path):
+        return None
+    return ImageStore(data_path, ids_path)
+
+
+def save_image_store(store_prefix, image_ids, iter_rows, base=None):
+    """
+    Write a store holding every image id of image_ids. The rows which are already in the base store are copied from
+    it, the others are computed by iter_rows(missing_image_ids), a generator of (offset, rows) batches (see
+    replace_on_success for the file replacement)
+    :return: the new store, or base if it already holds exactly image_ids
+    """
+    image_ids = np.unique(np.asarray(list(image_ids), dtype=np.int64))
+    if base is not None:
+        if np.array_equal(base.image_ids, image_ids):
+            return base
+        cached = np.isin(image_ids, base.image_ids)
+    else:
+        cached = np.zeros(shape=image_ids.shape, dtype=bool)
+    missing_rows = np.flatnonzero(~cached)
+    logging.debug('%d images out of %d are missing from the store %s', len(missing_rows), len(image_ids),
+                  store_prefix)
+
+    data_path, ids_path = get_image_store_paths(store_prefix)
+    with replace_on_success(data_path, ids_path) as (data_tmp_path, ids_tmp_path):
+
+        def open_data(dtype, row_shape):
+            return np.lib.format.open_memmap(data_tmp_path, mode='w+', dtype=dtype,
+                                             shape=(len(image_ids), ) + tuple(row_shape))
+
+        data = None
+        if base is not None:
+            data = open_data(base.data.dtype, base.data.shape[1:])
+            data[cached] = base.data[base.rows(image_ids[cached])]
+        if len(missing_rows) > 0:
+            for offset, rows in iter_rows(image_ids[missing_rows]):
+                if data is None:
+                    data = open_data(rows.dtype, rows.shape[1:])
+                data[missing_rows[offset:offset + len(rows)]] = rows
+        if data is None:
+            return base
+        data.flush()
+        del data
+        np.save(ids_tmp_path, image_ids)
+    return load_image_store(store_prefix)
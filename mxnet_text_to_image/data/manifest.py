@@ -0,0 +1,132 @@
+import os
+import json
+import logging
+
+from mxnet_text_to_image.utils.store_utils import get_temp_path
+
+MANIFEST_VERSION = 1
+
+
+def get_manifest_path(data_dir_path):
+    """
+    :return: the manifest of a directory is written next to it, e.g. flowers/jpg -> flowers/jpg_manifest.json
+    """
+    data_dir_path = os.path.normpath(data_dir_path)
+    return os.path.join(os.path.dirname(data_dir_path), os.path.basename(data_dir_path) + '_manifest.json')
+
+
+def parse_image_id(fname, extension):
+    """
+    :return: the image id of a file name such as image_00042.jpg, None for the other files
+    """
+    if not fname.endswith(extension):
+        return None
+    try:
+        return int(fname[:-len(extension)].replace('image_', ''))
+    except ValueError:
+        return None
+
+
+def scan_files(data_dir_path, extension, files_to_load=-1):
+    """
+    Depth-first os.scandir of data_dir_path, directories and files in sorted order
+    :param files_to_load: if > 0, the scan stops as soon as that many image ids are found
+    :return: list of [path relative to data_dir_path, mtime_ns taken before it was listed, image ids, file names] of
+    every directory in scan order (the last one only partially scanned when files_to_load stopped the scan)
+    """
+    dirs = []
+    image_ids = set()
+    pending = ['']
+    while len(pending) > 0:
+        relative_dir_path = pending.pop()
+        dir_path = os.path.join(data_dir_path, relative_dir_path)
+        mtime = os.stat(dir_path).st_mtime_ns
+        with os.scandir(dir_path) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+        sub_dirs = []
+        dir_image_ids = []
+        names = []
+        dirs.append([relative_dir_path, mtime, dir_image_ids, names])
+        for entry in entries:
+            if entry.is_dir():
+                sub_dirs.append(os.path.join(relative_dir_path, entry.name))
+                continue
+            image_id = parse_image_id(entry.name, extension)
+            if image_id is None:
+                continue
+            dir_image_ids.append(image_id)
+            names.append(entry.name)
+            image_ids.add(image_id)
+            if 0 < files_to_load <= len(image_ids):
+                return dirs
+        pending.extend(reversed(sub_dirs))
+    return dirs
+
+
+def load_manifest(data_dir_path, extension):
+    """
+    :return: the directories of the manifest of data_dir_path (see scan_files), None if there is none or one of its
+    directories changed since (a file added, removed or renamed changes the mtime of its directory)
+    """
+    manifest_path = get_manifest_path(data_dir_path)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest = json.loads(f.read())
+    except ValueError:
+        return None
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('extension') != extension:
+        return None
+    for relative_dir_path, mtime, _, _ in manifest['dirs']:
+        try:
+            if os.stat(os.path.join(data_dir_path, relative_dir_path)).st_mtime_ns != mtime:
+                return None
+        except OSError:
+            return None
+    return manifest['dirs']
+
+
+def save_manifest(data_dir_path, extension, dirs):
+    manifest_path = get_manifest_path(data_dir_path)
+    temp_manifest_path = get_temp_path(manifest_path)
+    try:
+        with open(temp_manifest_path, 'w') as f:
+            # json.dumps encodes in C, json.dump does not
+            f.write(json.dumps({'version': MANIFEST_VERSION, 'extension': extension, 'dirs': dirs},
+                               separators=(',', ':')))
+        os.replace(temp_manifest_path, manifest_path)
+    except OSError as error:
+        # e.g. a read-only dataset, the next run scans again
+        logging.debug('cannot write the manifest %s: %s', manifest_path, error)
+
+
+def get_file_index(data_dir_path, extension, files_to_load=-1):
+    """
+    Index the image_*<extension> files under data_dir_path. The index is cached in a manifest next to the directory
+    and reused as long as none of its directories changed. Files are listed in sorted path order, so the order (and
+    the files selected by files_to_load) does not depend on the file system
+    :param files_to_load: if > 0, only the first files_to_load image ids. Without a valid manifest, the scan stops as
+    soon as they are found and no manifest is written
+    :return: dict of image_id to file path, empty if data_dir_path does not exist (as os.walk would)
+    """
+    if not os.path.isdir(data_dir_path):
+        return dict()
+    dirs = load_manifest(data_dir_path, extension)
+    if dirs is None:
+        dirs = scan_files(data_dir_path, extension, files_to_load)
+        if files_to_load <= 0:
+            save_manifest(data_dir_path, extension, dirs)
+        else:
+            logging.debug('scanned %d directories of %s', len(dirs), data_dir_path)
+    result = dict()
+    for relative_dir_path, _, image_ids, names in dirs:
+        prefix = os.path.join(data_dir_path, relative_dir_path, '')
+        if files_to_load <= 0:
+            result.update(zip(image_ids, [prefix + name for name in names]))
+            continue
+        for image_id, name in zip(image_ids, names):
+            if files_to_load <= len(result) and image_id not in result:
+                return result
+            result[image_id] = prefix + name
+    return result
@@ -0,0 +1,137 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Empty, Full
+import numpy as np
+import mxnet as mx
+from mxnet import nd
+
+
+class PrefetchingIter(mx.io.DataIter):
+    """
+    Iterator over (image id, text features) batches which are assembled by worker threads ahead of the training step,
+    with at most prefetch batches in flight. If image_store is given, every batch also holds the real images of its
+    image ids (batch.images), if random_input_size is given it holds the random input of the generator (batch.noise),
+    both already copied to ctx. The time spent waiting on the workers is kept in wait_seconds and logged at the end of
+    every epoch. As NDArrayIter does by default, the last batch is padded with samples from the start of the epoch.
+    The order and the random input of an epoch only depend on the numpy random state at reset(), so that an epoch can
+    be replayed (e.g. to resume a training)
+    """
+
+    def __init__(self, image_ids, text_feats, batch_size, image_store=None, random_input_size=None, ctx=mx.cpu(),
+                 shuffle=True, num_workers=2, prefetch=4):
+        super(PrefetchingIter, self).__init__(batch_size)
+        self.image_ids = np.asarray(image_ids)
+        self.text_feats = np.asarray(text_feats, dtype=np.float32)
+        self.num_data = len(self.image_ids)
+        self.image_store = image_store
+        self.random_input_size = random_input_size
+        self.ctx = ctx
+        self.shuffle = shuffle
+        self.prefetch = prefetch
+        self.executor = ThreadPoolExecutor(max_workers=num_workers)
+        self.queue = None
+        self.stop_event = None
+        self.producer = None
+        self.wait_seconds = 0.0
+        self.batch_count = 0
+        self.reset()
+
+    @property
+    def provide_data(self):
+        return [mx.io.DataDesc('image_id', (self.batch_size, )),
+                mx.io.DataDesc('text_feats', (self.batch_size, ) + self.text_feats.shape[1:])]
+
+    @property
+    def provide_label(self):
+        return []
+
+    def iter_batch_indices(self, order):
+        for start in range(0, self.num_data, self.batch_size):
+            indices = order[start:start + self.batch_size]
+            pad = self.batch_size - len(indices)
+            if pad > 0:
+                # wrapped around the epoch as many times as needed when there are fewer samples than pad
+                indices = np.concatenate([indices, np.resize(order, pad)])
+            yield indices, pad
+
+    def assemble_batch(self, indices, pad, seed):
+        image_ids = self.image_ids[indices]
+        batch = mx.io.DataBatch(data=[nd.array(image_ids, ctx=self.ctx),
+                                      nd.array(self.text_feats[indices], ctx=self.ctx)],
+                                pad=pad, index=indices, provide_data=self.provide_data)
+        batch.images = None
+        if self.image_store is not None:
+            batch.images = nd.array(self.image_store.get_batch(image_ids), ctx=self.ctx)
+        batch.noise = None
+        if self.random_input_size is not None:
+            # the workers run in any order, every batch has its own generator
+            noise = np.random.RandomState(seed).normal(0, 1, size=(self.batch_size, self.random_input_size, 1, 1))
+            noise = noise.astype(np.float32)
+            batch.noise = nd.array(noise, ctx=self.ctx)
+        return batch
+
+    def produce(self, queue, stop_event, order, seeds):
+        for (indices, pad), seed in zip(self.iter_batch_indices(order), seeds):
+            future = self.executor.submit(self.assemble_batch, indices, pad, seed)
+            while not stop_event.is_set():
+                try:
+                    queue.put(future, timeout=0.1)
+                    break
+                except Full:
+                    continue
+            if stop_event.is_set():
+                return
+        queue.put(None)
+
+    def stop(self):
+        if self.producer is None:
+            return
+        self.stop_event.set()
+        while self.producer.is_alive():
+            try:
+                self.queue.get(timeout=0.1)
+            except Empty:
+                pass
+        self.producer.join()
+        self.producer = None
+
+    def close(self):
+        """
+        Stop the producer and the worker threads, the iterator cannot be used afterwards
+        """
+        self.stop()
+        self.executor.shutdown(wait=True)
+
+    def __del__(self):
+        # the producer thread references the iterator, so this only runs once no epoch is in progress
+        if getattr(self, 'executor', None) is not None:
+            self.close()
+
+    def reset(self):
+        self.stop()
+        self.wait_seconds = 0.0
+        self.batch_count = 0
+        self.queue = Queue(maxsize=self.prefetch)
+        self.stop_event = threading.Event()
+        order = np.random.permutation(self.num_data) if self.shuffle else np.arange(self.num_data)
+        seeds = np.random.randint(0, 2 ** 31 - 1, size=(-(-self.num_data // self.batch_size), ))
+        self.producer = threading.Thread(target=self.produce, args=(self.queue, self.stop_event, order, seeds),
+                                         daemon=True)
+        self.producer.start()
+
+    def next(self):
+        if self.producer is None:
+            raise StopIteration
+        start_time = time.time()
+        future = self.queue.get()
+        if future is None:
+            self.producer.join()
+            self.producer = None
+            logging.info('waited %.3f seconds on data for %d batches', self.wait_seconds, self.batch_count)
+            raise StopIteration
+        batch = future.result()
+        self.wait_seconds += time.time() - start_time
+        self.batch_count += 1
+        return batch
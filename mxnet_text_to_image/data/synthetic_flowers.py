@@ -0,0 +1,114 @@
+import io
+import os
+import logging
+import numpy as np
+from PIL import Image
+
+# words of the real captions, the rest of the vocabulary is made of synthetic words
+COLORS = ['white', 'yellow', 'pink', 'purple', 'red', 'orange', 'blue', 'green', 'lavender', 'violet', 'dark',
+          'light', 'bright', 'pale']
+PARTS = ['petals', 'stamen', 'pistil', 'center', 'leaves', 'anther', 'filaments', 'sepals', 'stigma', 'edges',
+         'veins', 'ovary', 'pollen tube']
+SHAPES = ['oval', 'round', 'long', 'thin', 'pointed', 'ruffled', 'curved', 'wide', 'small', 'large', 'layered']
+TEMPLATES = ['this flower has {shape} {color} {part} and a {color} {part} .',
+             'the {part} on this flower are {color} with {shape} {part} .',
+             'this flower is {color} in color , and has {part} that are {shape} shaped with {word} .',
+             'a flower with {color} {part} and {shape} {color} {part} and a {word} {part} .',
+             'this {color} flower has {shape} {part} , {word} {part} and {word} {word} .']
+
+
+def get_synthetic_vocab(vocab_size):
+    words = ['this', 'flower', 'has', 'and', 'a', 'the', 'on', 'are', 'with', 'is', 'in', 'color', 'that', 'shaped',
+             '.', ',']
+    for group in (COLORS, PARTS, SHAPES):
+        for phrase in group:
+            for word in phrase.split(' '):
+                if word not in words:
+                    words.append(word)
+    return words + ['synword%d' % i for i in range(max(0, vocab_size - len(words)))]
+
+
+def create_synthetic_caption(rng, words):
+    """
+    :param words: the synthetic words to draw {word} from, every caption has a few of them
+    """
+    caption = rng.choice(TEMPLATES)
+    while '{' in caption:
+        caption = caption.replace('{color}', COLORS[rng.randint(len(COLORS))], 1) \
+            .replace('{part}', PARTS[rng.randint(len(PARTS))], 1) \
+            .replace('{shape}', SHAPES[rng.randint(len(SHAPES))], 1) \
+            .replace('{word}', words[rng.randint(len(words))], 1)
+    return caption
+
+
+def create_synthetic_jpegs(count, image_width, image_height, rng):
+    """
+    :return: count distinct encoded jpg images, colored noise over a random background
+    """
+    result = list()
+    for _ in range(count):
+        pixels = rng.randint(0, 256, size=(1, 1, 3)) + rng.randint(-40, 40, size=(image_height, image_width, 3))
+        buffer = io.BytesIO()
+        Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, format='JPEG')
+        result.append(buffer.getvalue())
+    return result
+
+
+def save_synthetic_glove(glove_dir_path, words, embedding_dim=300, rng=None):
+    """
+    Write a glove.6B.<embedding_dim>d.txt of the given words in the format of the original glove files, so that
+    load_glove builds its store from it instead of downloading glove
+    """
+    if rng is None:
+        rng = np.random.RandomState(0)
+    if not os.path.exists(glove_dir_path):
+        os.makedirs(glove_dir_path)
+    glove_file_path = os.path.join(glove_dir_path, 'glove.6B.' + str(embedding_dim) + 'd.txt')
+    with open(glove_file_path, 'wt', encoding='utf8') as f:
+        for word in words:
+            f.write(word + ' ' + ' '.join('%.5f' % value for value in rng.normal(0, 0.5, size=(embedding_dim, )))
+                    + '\n')
+    return glove_file_path
+
+
+def create_synthetic_flowers(data_dir_path, caption_count, captions_per_image=10, class_count=102,
+                             glove_dir_path=None, vocab_size=2000, oov_words=200, embedding_dim=300, image_width=64,
+                             image_height=64, distinct_images=64, seed=0):
+    """
+    Write a caption corpus laid out like the Oxford flowers one: data_dir_path/jpg/image_00001.jpg, ... and
+    data_dir_path/text_c10/class_00001/image_00001.txt, ... (captions_per_image captions per file, the images split
+    into class_count classes of consecutive ids), plus a synthetic glove file of vocab_size words. The captions follow
+    the templates of the real ones, oov_words of their synthetic words are not in the glove vocabulary
+    :param caption_count: total number of captions, the last text file holds the remainder
+    :param glove_dir_path: defaults to the glove directory next to data_dir_path, where get_data_iter looks for it
+    :param distinct_images: number of different jpg images, written over and over (only decoding them costs time)
+    :return: number of images
+    """
+    rng = np.random.RandomState(seed)
+    if glove_dir_path is None:
+        glove_dir_path = os.path.join(os.path.dirname(data_dir_path), 'glove')
+    vocab = get_synthetic_vocab(vocab_size)
+    save_synthetic_glove(glove_dir_path, vocab, embedding_dim, rng)
+    words = vocab[-max(1, vocab_size // 10):] + ['oovword%d' % i for i in range(oov_words)]
+
+    image_count = (caption_count + captions_per_image - 1) // captions_per_image
+    jpegs = create_synthetic_jpegs(distinct_images, image_width, image_height, rng)
+    jpg_dir_path = os.path.join(data_dir_path, 'jpg')
+    text_dir_path = os.path.join(data_dir_path, 'text_c10')
+    os.makedirs(jpg_dir_path, exist_ok=True)
+
+    images_per_class = (image_count + class_count - 1) // class_count
+    for i in range(image_count):
+        image_id = i + 1
+        with open(os.path.join(jpg_dir_path, 'image_%05d.jpg' % image_id), 'wb') as f:
+            f.write(jpegs[rng.randint(len(jpegs))])
+
+        class_dir_path = os.path.join(text_dir_path, 'class_%05d' % (i // images_per_class + 1))
+        if i % images_per_class == 0:
+            os.makedirs(class_dir_path, exist_ok=True)
+        with open(os.path.join(class_dir_path, 'image_%05d.txt' % image_id), 'wt') as f:
+            for _ in range(min(captions_per_image, caption_count - i * captions_per_image)):
+                f.write(create_synthetic_caption(rng, words) + '\n')
+        if (i + 1) % 10000 == 0:
+            logging.debug('Has written %d synthetic images out of %d', i + 1, image_count)
+    return image_count
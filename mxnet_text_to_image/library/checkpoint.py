@@ -0,0 +1,217 @@
+import logging
+import os
+import pickle
+import shutil
+import threading
+from queue import Queue
+
+import mxnet as mx
+import numpy as np
+from mxnet import nd
+
+
+def snapshot_params(net):
+    """
+    Copy the parameters of net to host memory, under the names of Block.save_params (without the prefix of net). The
+    copies are queued behind the pending updates and before the next ones, so the training can go on right away
+    """
+    return dict((name[len(net.prefix):], param.list_data()[0].copyto(mx.cpu()))
+                for name, param in net.collect_params().items())
+
+
+def snapshot_trainer_states(trainer):
+    """
+    Serialize the states of trainer (e.g. momentum) in host memory, as the bytes Trainer.save_states writes and
+    Trainer.load_states reads
+    """
+    if not trainer._kv_initialized:
+        trainer._init_kvstore()
+    if trainer._params_to_init:
+        trainer._init_params()
+    updater = trainer._kvstore._updater if trainer._update_on_kvstore else trainer._updaters[0]
+    return updater.get_states(dump_optimizer=True)
+
+
+def save_atomic(arrays, file_path):
+    """
+    Write arrays (or bytes written as is) to a temporary file renamed to file_path, a crash while writing leaves the
+    previous file intact
+    """
+    temp_file_path = file_path + '.tmp'
+    if isinstance(arrays, bytes):
+        with open(temp_file_path, 'wb') as f:
+            f.write(arrays)
+    else:
+        nd.save(temp_file_path, arrays)
+    os.replace(temp_file_path, file_path)
+
+
+def link_atomic(source_file_path, file_path):
+    temp_file_path = file_path + '.tmp'
+    if os.path.exists(temp_file_path):
+        os.remove(temp_file_path)
+    try:
+        os.link(source_file_path, temp_file_path)
+    except OSError:
+        # no hard links on this file system
+        shutil.copyfile(source_file_path, temp_file_path)
+    os.replace(temp_file_path, file_path)
+
+
+def snapshot_rng_state():
+    """
+    MXNet cannot return the state of its generators, so they are seeded again from numpy and the seed is kept instead
+    """
+    seed = np.random.randint(0, 2 ** 31 - 1)
+    mx.random.seed(seed)
+    return {'numpy': np.random.get_state(), 'mxnet_seed': seed}
+
+
+def restore_rng_state(rng_state):
+    np.random.set_state(rng_state['numpy'])
+    mx.random.seed(rng_state['mxnet_seed'])
+
+
+class AsyncCheckpointer(object):
+    """
+    Write the checkpoints of nets from a background thread. save() snapshots the parameters to host memory and returns,
+    the thread writes one file per net and checkpoint, e.g. dcgan-v2-netG-epoch-0003.params or
+    dcgan-v2-netG-epoch-0003-iter-000200.params, then points dcgan-v2-netG.params (the file load_model reads) to it.
+    The trainer states, serialized in host memory by save(), and a pickled state dict are saved the same way
+    (dcgan-v2-trainerG-epoch-0003.states, dcgan-v2-state-epoch-0003.pkl), the state last, so the latest state always
+    refers to complete files.
+    Every file is written under a temporary name and renamed.
+    Of the checkpoints written by this checkpointer, or listed in the state it resumed from, the last keep_last ones
+    (all of them if None) and the ones at the end of every keep_every epochs are kept, the others are deleted
+    """
+
+    def __init__(self, model_dir_path, model_name, keep_last=1, keep_every=None):
+        self.model_dir_path = model_dir_path
+        self.model_name = model_name
+        self.keep_last = keep_last
+        self.keep_every = keep_every
+        self.checkpoints = []
+        self.error = None
+        # at most one snapshot waits while another one is written, save() blocks beyond that
+        self.queue = Queue(maxsize=1)
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def get_file_path(self, name, epoch=None, iter=None, extension='.params'):
+        name = self.model_name + '-' + name
+        if epoch is not None:
+            name += '-epoch-%04d' % epoch
+        if iter is not None:
+            name += '-iter-%06d' % iter
+        return os.path.join(self.model_dir_path, name + extension)
+
+    def save(self, nets, epoch, iter=None, trainers=None, state=None):
+        """
+        :param nets: dict of net name -> gluon block
+        :param epoch: epoch of the checkpoint
+        :param iter: iteration within the epoch, None for the checkpoint at the end of the epoch
+        :param trainers: dict of trainer name -> gluon Trainer, their states are serialized in host memory
+        :param state: picklable dict, the NDArrays in it should already be copies on the host
+        """
+        self.raise_error()
+        snapshots = dict((net_name, snapshot_params(net)) for net_name, net in nets.items())
+        trainer_states = dict((trainer_name, snapshot_trainer_states(trainer))
+                              for trainer_name, trainer in (trainers or dict()).items())
+        self.queue.put((snapshots, trainer_states, state, epoch, iter))
+
+    def load_state(self):
+        """
+        :return: the state of the latest checkpoint, None if there is none
+        """
+        file_path = self.get_file_path('state', extension='.pkl')
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, 'rb') as f:
+            state = pickle.load(f)
+        self.checkpoints = [tuple(checkpoint) for checkpoint in state['checkpoints']]
+        return state
+
+    def restore_nets(self, state, nets, ctx=None):
+        """
+        Load the parameters of nets saved with state
+        """
+        for net_name, net in nets.items():
+            net.load_params(self.get_file_path(net_name, state['epoch'], state['iter']), ctx=ctx)
+
+    def restore_trainers(self, state, trainers):
+        for trainer_name, trainer in trainers.items():
+            trainer.load_states(self.get_file_path(trainer_name, state['epoch'], state['iter'], '.states'))
+
+    def wait(self):
+        """
+        Block until every checkpoint saved so far is on disk
+        """
+        self.queue.join()
+        self.raise_error()
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        self.raise_error()
+
+    def raise_error(self):
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                self.write(*item)
+            except Exception as error:
+                logging.exception('checkpoint failed')
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    def write(self, snapshots, trainer_states, state, epoch, iter):
+        file_names = []
+        for net_name, arrays in snapshots.items():
+            file_path = self.get_file_path(net_name, epoch, iter)
+            save_atomic(arrays, file_path)
+            link_atomic(file_path, self.get_file_path(net_name))
+            file_names.append((net_name, '.params'))
+        for trainer_name, states in trainer_states.items():
+            file_path = self.get_file_path(trainer_name, epoch, iter, '.states')
+            save_atomic(states, file_path)
+            link_atomic(file_path, self.get_file_path(trainer_name, extension='.states'))
+            file_names.append((trainer_name, '.states'))
+        if state is not None:
+            file_names.append(('state', '.pkl'))
+        self.checkpoints.append((epoch, iter, file_names))
+        self.apply_retention()
+        if state is not None:
+            state = dict(state, epoch=epoch, iter=iter, checkpoints=self.checkpoints)
+            file_path = self.get_file_path('state', epoch, iter, '.pkl')
+            temp_file_path = file_path + '.tmp'
+            with open(temp_file_path, 'wb') as f:
+                pickle.dump(state, f)
+            os.replace(temp_file_path, file_path)
+            link_atomic(file_path, self.get_file_path('state', extension='.pkl'))
+
+    def apply_retention(self):
+        # the latest checkpoint is always kept, the latest state refers to its files
+        keep_count = len(self.checkpoints) if self.keep_last is None else max(self.keep_last, 1)
+        kept = []
+        for i, (epoch, iter, file_names) in enumerate(self.checkpoints):
+            if i >= len(self.checkpoints) - keep_count or (
+                    self.keep_every is not None and iter is None and (epoch + 1) % self.keep_every == 0):
+                kept.append((epoch, iter, file_names))
+                continue
+            for name, extension in file_names:
+                file_path = self.get_file_path(name, epoch, iter, extension)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+        self.checkpoints = kept
@@ -1,24 +1,17 @@
-import logging
-
 import mxnet as mx
-from mxnet import gluon, nd, autograd
+from mxnet import nd, autograd
 from mxnet.gluon import nn
 import os
 import numpy as np
-import time
 
-from mxnet_text_to_image.library.pool import ImagePool
+from mxnet_text_to_image.library.checkpoint import save_atomic, snapshot_params
+from mxnet_text_to_image.library.parallel import as_ctx_list
+from mxnet_text_to_image.library.training import GanTrainingLoop
 from mxnet_text_to_image.utils.glove_loader import GloveModel
-from mxnet_text_to_image.utils.image_utils import save_image, inverted_transform, Vgg16FeatureExtractor
-
-
-def facc(label, pred):
-    pred = pred.ravel()
-    label = label.ravel()
-    return ((pred > 0.5) == label).mean()
+from mxnet_text_to_image.utils.image_utils import save_images, inverted_transform_batch, Vgg16FeatureExtractor
 
 
-class Discriminator(nn.Block):
+class Discriminator(nn.HybridBlock):
 
     def __init__(self, ndf):
         super(Discriminator, self).__init__()
@@ -29,10 +22,8 @@ class Discriminator(nn.Block):
             self.dropout = nn.Dropout(.3)
             self.fc2 = nn.Dense(1)
 
-    def forward(self, x, *args):
-        x1 = x[0]
-        x2 = x[1]
-        z = nd.concat(x1, x2, dim=1)
+    def hybrid_forward(self, F, x1, x2):
+        z = F.concat(x1, x2, dim=1)
         z = self.fc1(z)
         z = self.bn(z)
         z = self.dropout(z)
@@ -46,10 +37,14 @@ class DCGan(object):
     def __init__(self, model_ctx=mx.cpu(), data_ctx=mx.cpu()):
         self.netG = None
         self.netD = None
-        self.model_ctx = model_ctx
+        # a list of contexts trains data parallel, the first one also holds the dataset and runs the generation
+        self.ctx_list = as_ctx_list(model_ctx)
+        self.model_ctx = self.ctx_list[0]
         self.data_ctx = data_ctx
         self.random_input_size = 100
-        self.fe = Vgg16FeatureExtractor(model_ctx=model_ctx)
+        # run netG and netD as cached static graphs
+        self.hybridize = False
+        self.fe = Vgg16FeatureExtractor(model_ctx=self.ctx_list)
         self.glove = GloveModel()
 
     @staticmethod
@@ -65,7 +60,7 @@ class DCGan(object):
 
     @staticmethod
     def create_model(num_channels=3, ngf=64, ndf=64):
-        netG = nn.Sequential()
+        netG = nn.HybridSequential()
         with netG.name_scope():
             # input shape: (?, random_input_length + text_input_length, 1, 1)
 
@@ -115,121 +110,115 @@ class DCGan(object):
         return netG, netD
 
     def load_model(self, model_dir_path):
-        config = np.load(self.get_config_file_path(model_dir_path)).item()
+        config = np.load(self.get_config_file_path(model_dir_path), allow_pickle=True).item()
         self.random_input_size = config['random_input_size']
         self.netG, self.netD = self.create_model()
-        self.netG.load_params(self.get_params_file_path(model_dir_path, 'netG'), ctx=self.model_ctx)
-        self.netD.load_params(self.get_params_file_path(model_dir_path, 'netD'), ctx=self.model_ctx)
-
-    def checkpoint(self, model_dir_path):
-        self.netG.save_params(self.get_params_file_path(model_dir_path, 'netG'))
-        self.netD.save_params(self.get_params_file_path(model_dir_path, 'netD'))
-
-    def fit(self, train_data, image_feats_dict, model_dir_path, epochs=2, batch_size=64,
-            image_pool_size=50,
-            learning_rate=0.0002, beta1=0.5, print_every=2):
-
-        config = dict()
-        config['random_input_size'] = self.random_input_size
-        np.save(self.get_config_file_path(model_dir_path), config)
-
-        loss = gluon.loss.SigmoidBinaryCrossEntropyLoss()
-
-        if self.netG is None:
-            self.netG, self.netD = self.create_model()
-
-            self.netG.initialize(mx.init.Normal(0.02), ctx=self.model_ctx)
-            self.netD.initialize(mx.init.Normal(0.02), ctx=self.model_ctx)
+        self.netG.load_params(self.get_params_file_path(model_dir_path, 'netG'), ctx=self.ctx_list)
+        self.netD.load_params(self.get_params_file_path(model_dir_path, 'netD'), ctx=self.ctx_list)
+        self.hybridize_model()
 
-        trainerG = gluon.Trainer(self.netG.collect_params(), 'adam', {'learning_rate': learning_rate, 'beta1': beta1})
-        trainerD = gluon.Trainer(self.netD.collect_params(), 'adam', {'learning_rate': learning_rate, 'beta1': beta1})
+    def hybridize_model(self):
+        if self.hybridize:
+            self.netG.hybridize(static_alloc=True, static_shape=True)
+            self.netD.hybridize(static_alloc=True, static_shape=True)
+            self.fe.image_net.hybridize(static_alloc=True, static_shape=True)
 
-        real_label = nd.ones((batch_size,), ctx=self.model_ctx)
-        fake_label = nd.zeros((batch_size, ), ctx=self.model_ctx)
+    def extract_fake_features(self, fake):
+        # dropout stays off like for the features of the real images, which are extracted in predict mode
+        with autograd.predict_mode():
+            return self.fe.image_net(fake)
 
-        image_pool = ImagePool(image_pool_size)
-
-        metric = mx.metric.CustomMetric(facc)
-
-        logging.basicConfig(level=logging.DEBUG)
-
-        fake = []
-        for epoch in range(epochs):
-            tic = time.time()
-            btic = time.time()
-            train_data.reset()
-            iter = 0
-            for batch in train_data:
-
-                # Step 1: Update netD
-                real_image_ids = batch.data[0].as_in_context(self.model_ctx)
-                real_image_feats = list()
-                for image_id in real_image_ids:
-                    real_image_feats.append(image_feats_dict[image_id.asscalar().astype(np.uint)])
-                real_image_feats = nd.array(real_image_feats, ctx=self.model_ctx)
-                bsize = real_image_feats.shape[0]
-                text_feats = batch.data[1].as_in_context(self.model_ctx)
-                random_input = nd.random_normal(0, 1, shape=(real_image_feats.shape[0], self.random_input_size, 1, 1), ctx=self.model_ctx)
-
-                fake = self.netG(nd.concat(random_input, text_feats.reshape((bsize, 300, 1, 1)), dim=1))
-                fake_feat = self.fe.image_net(fake)
-                fake_concat = image_pool.query([real_image_feats, text_feats])
-
-                with autograd.record():
-                    # train with real image
-                    output = self.netD(fake_concat)
-                    errD_real = loss(output, real_label)
-                    metric.update([real_label, ], [output, ])
-
-                    # train with fake image
-                    output = self.netD([fake_feat, text_feats])
-                    errD_fake = loss(output, fake_label)
-                    errD = errD_real + errD_fake
-                    errD.backward()
-                    metric.update([fake_label, ], [output, ])
+    def checkpoint(self, model_dir_path):
+        save_atomic(snapshot_params(self.netG), self.get_params_file_path(model_dir_path, 'netG'))
+        save_atomic(snapshot_params(self.netD), self.get_params_file_path(model_dir_path, 'netD'))
 
-                trainerD.step(batch.data[0].shape[0])
+    def run_deferred_init(self):
+        self.netG(nd.zeros((1, self.random_input_size + 300, 1, 1), ctx=self.model_ctx))
+        self.netD(nd.zeros((1, 1000), ctx=self.model_ctx), nd.zeros((1, 300), ctx=self.model_ctx))
 
-                # Step 2: Update netG
+    def fit(self, train_data, image_feats_dict, model_dir_path, epochs=2, batch_size=64,
+            image_pool_size=50,
+            learning_rate=0.0002, beta1=0.5, print_every=2, device_dataset=False,
+            single_generator_forward=False, kvstore='device', profile_path=None,
+            checkpoint_every=None, keep_last=1, keep_every=None, start_epoch=0, resume=False):
+        """
+        Train on the VGG16 features of the images in image_feats_dict, see GanTrainingLoop for the contexts, kvstore,
+        the checkpoints, resume and profile_path. The pools keep the features of the real images
+        """
+        loop = GanTrainingLoop(self, model_dir_path, batch_size=batch_size, learning_rate=learning_rate, beta1=beta1,
+                               image_pool_size=image_pool_size, kvstore=kvstore, profile_path=profile_path,
+                               checkpoint_every=checkpoint_every, keep_last=keep_last, keep_every=keep_every,
+                               resume=resume)
+        loop.fit(train_data, image_feats_dict, lambda bsize, shards: self.train_step(loop, bsize, shards,
+                                                                                     single_generator_forward),
+                 epochs=epochs, start_epoch=start_epoch, print_every=print_every, device_dataset=device_dataset)
+
+    def train_step(self, loop, bsize, shards, single_generator_forward=False):
+        timer = loop.timer
+        loss = loop.loss
+
+        # Step 1: Update netD
+        with timer.phase('generator_forward'):
+            if single_generator_forward:
+                # recorded once, detached for the netD update and reused by the netG update
                 with autograd.record():
-                    fake = self.netG(nd.concat(random_input, text_feats.reshape((bsize, 300, 1, 1)), dim=1))
-                    fake_feat = self.fe.image_net(fake)
-                    output = self.netD([fake_feat, text_feats])
-                    errG = loss(output, real_label)
-                    errG.backward()
-
-                trainerG.step(batch.data[0].shape[0])
-
-                # Print log infomation every ten batches
-                if iter % print_every == 0:
-                    name, acc = metric.get()
-                    logging.info('speed: {} samples/s'.format(batch_size / (time.time() - btic)))
-                    logging.info(
-                        'discriminator loss = %f, generator loss = %f, binary training acc = %f at iter %d epoch %d'
-                        % (nd.mean(errD).asscalar(),
-                           nd.mean(errG).asscalar(), acc, iter, epoch))
-                iter = iter + 1
-                btic = time.time()
-
-            name, acc = metric.get()
-            metric.reset()
-            logging.info('\nbinary training acc at epoch %d: %s=%f' % (epoch, name, acc))
-            logging.info('time: %f' % (time.time() - tic))
-
-            self.checkpoint(model_dir_path)
-
-            # Visualize one generated image for each epoch
-            fake_img = inverted_transform(fake[0]).asnumpy().astype(np.uint8)
-            # fake_img = ((fake_img.asnumpy().transpose(1, 2, 0) + 1.0) * 127.5).astype(np.uint8)
-
-            save_image(fake_img, os.path.join(model_dir_path, DCGan.model_name + '-training-') + str(epoch) + '.png')
+                    fake = [self.netG(nd.concat(z, t.reshape((0, 300, 1, 1)), dim=1)) for _, t, z in shards]
+                    fake_feat = [self.extract_fake_features(f) for f in fake]
+            else:
+                fake = [self.netG(nd.concat(z, t.reshape((0, 300, 1, 1)), dim=1)) for _, t, z in shards]
+                fake_feat = [self.extract_fake_features(f) for f in fake]
+        with timer.phase('pool_query'):
+            fake_concats = [pool.query([real, t]) for pool, (real, t, _) in zip(loop.image_pools, shards)]
+
+        with timer.phase('netD_forward'), autograd.record():
+            errD = []
+            outputs = []
+            for (_, t, _), fake_concat, f, real_label, fake_label in zip(shards, fake_concats, fake_feat,
+                                                                         loop.real_labels, loop.fake_labels):
+                # train with real image
+                output = self.netD(*fake_concat)
+                errD_real = loss(output, real_label)
+                outputs.append((real_label, output))
+
+                # train with fake image
+                output = self.netD(f.detach(), t)
+                errD_fake = loss(output, fake_label)
+                errD.append(errD_real + errD_fake)
+                outputs.append((fake_label, output))
+        loop.update('netD', errD, bsize)
+
+        # Step 2: Update netG
+        with timer.phase('netG_forward'), autograd.record():
+            if not single_generator_forward:
+                fake = [self.netG(nd.concat(z, t.reshape((0, 300, 1, 1)), dim=1)) for _, t, z in shards]
+                fake_feat = [self.extract_fake_features(f) for f in fake]
+            errG = [loss(self.netD(f, t), real_label) for f, (_, t, _), real_label in
+                    zip(fake_feat, shards, loop.real_labels)]
+        loop.update('netG', errG, bsize)
+
+        return outputs, errD, errG, fake
+
+    def generate_batch(self, prompts, samples_per_prompt=1, batch_size=64):
+        """
+        Generate samples_per_prompt images for every prompt. All the prompts are encoded at once and netG runs on
+        batch_size images at a time
+        :return: uint8 array of shape (len(prompts) * samples_per_prompt, H, W, 3), the images of prompts[i] are the
+        rows i * samples_per_prompt to (i + 1) * samples_per_prompt - 1
+        """
+        text_feats = np.repeat(self.glove.encode_docs(prompts).astype(np.float32), samples_per_prompt, axis=0)
+        result = None
+        for start in range(0, len(text_feats), batch_size):
+            batch_feats = nd.array(text_feats[start:start + batch_size], ctx=self.model_ctx)
+            count = batch_feats.shape[0]
+            latent_z = nd.random_normal(loc=0, scale=1, shape=(count, self.random_input_size, 1, 1), ctx=self.model_ctx)
+            imgs = self.netG(nd.concat(latent_z, batch_feats.reshape((count, 300, 1, 1)), dim=1))
+            imgs = inverted_transform_batch(imgs)
+            if result is None:
+                result = np.zeros(shape=(len(text_feats), ) + imgs.shape[1:], dtype=np.uint8)
+            result[start:start + count] = imgs
+        return result
 
     def generate(self, text_message, num_images, output_dir_path):
-        text_feats = self.glove.encode_doc(text_message)
-        text_feats = nd.array(text_feats, ctx=self.model_ctx).reshape((1, 300, 1, 1))
-        for i in range(num_images):
-            latent_z = nd.random_normal(loc=0, scale=1, shape=(1, self.random_input_size, 1, 1), ctx=self.model_ctx)
-            img = self.netG(nd.concat(latent_z, text_feats, dim=1))[0]
-            img = inverted_transform(img).asnumpy().astype(np.uint8)
-            # img = ((img.asnumpy().transpose(1, 2, 0) + 1.0) * 127.5).astype(np.uint8)
-            save_image(img, os.path.join(output_dir_path, DCGan.model_name+'-generated-'+str(i) + '.png'))
+        imgs = self.generate_batch([text_message], samples_per_prompt=num_images)
+        save_images(imgs, [os.path.join(output_dir_path, DCGan.model_name + '-generated-' + str(i) + '.png')
+                           for i in range(num_images)])
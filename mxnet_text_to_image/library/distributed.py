@@ -0,0 +1,117 @@
+import logging
+import os
+import socket
+import subprocess
+import sys
+
+import mxnet as mx
+from mxnet import nd
+
+
+class ParameterSync(object):
+    """
+    Sum the gradients of parameters over the contexts of this worker and over all the workers through a (dist)
+    kvstore. Gluon trainers key their parameters by position, so the trainers of netG and netD cannot share one
+    kvstore, and a process can only create one dist kvstore. Every parameter gets its own key here instead, the
+    gradients are reduced before the step and the trainers update their parameters locally
+    """
+
+    def __init__(self, kvstore):
+        if isinstance(kvstore, str):
+            kvstore = mx.kv.create(kvstore)
+        self.kvstore = kvstore
+        self.keys = dict()
+
+    @property
+    def rank(self):
+        return self.kvstore.rank
+
+    @property
+    def num_workers(self):
+        return self.kvstore.num_workers
+
+    def init(self, params):
+        """
+        Assign a key to every new parameter and start all the workers from its values on worker 0. Like the trainers
+        do for their kvstore, this happens on the first reduce, once the deferred initialization is done
+        """
+        new_params = [(name, param) for name, param in params.items() if name not in self.keys]
+        if len(new_params) == 0:
+            return
+        for name, param in new_params:
+            self.keys[name] = len(self.keys)
+            # the kvstore keeps the pushed cpu array as its buffer, the pulls below would overwrite it while worker 0
+            # still pushes it, so worker 0 pushes a copy
+            self.kvstore.init(self.keys[name], param.list_data()[0].copy())
+        # the init push of worker 0 is asynchronous, no worker pulls before the servers hold every value
+        nd.waitall()
+        self.kvstore._barrier()
+        for name, param in new_params:
+            self.kvstore.pull(self.keys[name], out=param.list_data(), priority=-self.keys[name])
+
+    def allreduce_grads(self, params):
+        self.init(params)
+        for name, param in params.items():
+            if param.grad_req != 'null':
+                key = self.keys[name]
+                self.kvstore.push(key, param.list_grad(), priority=-key)
+                self.kvstore.pull(key, out=param.list_grad(), priority=-key)
+
+    def average_data(self, params):
+        """
+        Average the values of params (e.g. the BatchNorm running statistics) over the contexts and the workers
+        """
+        self.init(params)
+        for name, param in params.items():
+            key = self.keys[name]
+            data = param.list_data()
+            self.kvstore.push(key, data, priority=-key)
+            self.kvstore.pull(key, out=data, priority=-key)
+            for d in data:
+                d /= self.num_workers * len(data)
+
+
+def get_free_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def launch_local(command, num_workers=2, num_servers=1):
+    """
+    Run a dist_sync training on localhost: one scheduler, num_servers servers and num_workers workers, each one a
+    process running command with its DMLC_ROLE. The servers and the scheduler run within `import mxnet` and exit once
+    the workers are done
+    :param command: argv of the training script, e.g. [sys.executable, 'dcgan2_train_dist.py']
+    :return: 0 if every process succeeded, else the first non zero exit code
+    """
+    env = dict(os.environ)
+    env.update({'DMLC_PS_ROOT_URI': '127.0.0.1',
+                'DMLC_PS_ROOT_PORT': str(get_free_port()),
+                'DMLC_NUM_SERVER': str(num_servers),
+                'DMLC_NUM_WORKER': str(num_workers)})
+    roles = ['scheduler'] + ['server'] * num_servers + ['worker'] * num_workers
+    processes = []
+    try:
+        for role in roles:
+            role_env = dict(env)
+            role_env['DMLC_ROLE'] = role
+            processes.append(subprocess.Popen(command, env=role_env))
+        exit_codes = [process.wait() for process in processes]
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+    for role, exit_code in zip(roles, exit_codes):
+        if exit_code != 0:
+            logging.error('%s exited with code %d', role, exit_code)
+            return exit_code
+    return 0
+
+
+if __name__ == '__main__':
+    # python -m mxnet_text_to_image.library.distributed <num_workers> <num_servers> <command...>
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(launch_local(sys.argv[3:], num_workers=int(sys.argv[1]), num_servers=int(sys.argv[2])))
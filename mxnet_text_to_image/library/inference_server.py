@@ -0,0 +1,226 @@
+import asyncio
+import io
+import json
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+from PIL import Image
+
+
+def encode_png(img_data):
+    buffer = io.BytesIO()
+    Image.fromarray(img_data).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class InferenceStats(object):
+    """
+    Latency and throughput of the requests served, the latencies of the last max_latencies requests are kept
+    """
+
+    def __init__(self, max_latencies=10000):
+        self.start_time = time.time()
+        self.request_count = 0
+        self.error_count = 0
+        self.batch_count = 0
+        self.batch_sizes = 0
+        self.latencies = deque(maxlen=max_latencies)
+
+    def add_batch(self, batch_size):
+        self.batch_count += 1
+        self.batch_sizes += batch_size
+
+    def add_request(self, latency, error=False):
+        self.request_count += 1
+        if error:
+            self.error_count += 1
+        else:
+            self.latencies.append(latency)
+
+    def to_dict(self):
+        uptime = time.time() - self.start_time
+        result = {'uptime_seconds': uptime,
+                  'requests': self.request_count,
+                  'errors': self.error_count,
+                  'batches': self.batch_count,
+                  'mean_batch_size': self.batch_sizes / self.batch_count if self.batch_count > 0 else 0.0,
+                  'images_per_second': self.batch_sizes / uptime if uptime > 0 else 0.0}
+        if len(self.latencies) > 0:
+            latencies = np.array(self.latencies) * 1000
+            result['latency_ms'] = {'mean': float(latencies.mean()),
+                                    'p50': float(np.percentile(latencies, 50)),
+                                    'p95': float(np.percentile(latencies, 95)),
+                                    'p99': float(np.percentile(latencies, 99)),
+                                    'max': float(latencies.max())}
+        return result
+
+
+class MicroBatcher(object):
+    """
+    Coalesce the prompts of concurrent requests into batches of at most max_batch_size prompts. A batch is run as soon
+    as it is full or max_wait_ms after its first prompt arrived. The batches run one at a time in a worker thread,
+    so the event loop keeps accepting requests meanwhile
+    """
+
+    def __init__(self, gan, max_batch_size=32, max_wait_ms=10, stats=None):
+        self.gan = gan
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.stats = stats if stats is not None else InferenceStats()
+        self.queue = None
+        self.task = None
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.executor.shutdown(wait=True)
+
+    async def generate(self, prompt):
+        """
+        :return: the PNG bytes of one image generated from the prompt
+        """
+        future = asyncio.get_event_loop().create_future()
+        await self.queue.put((prompt, future))
+        return await future
+
+    def generate_pngs(self, prompts):
+        imgs = self.gan.generate_batch(prompts, samples_per_prompt=1, batch_size=self.max_batch_size)
+        return [encode_png(img) for img in imgs]
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait_ms / 1000
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            prompts = [prompt for prompt, _ in batch]
+            try:
+                pngs = await loop.run_in_executor(self.executor, self.generate_pngs, prompts)
+            except Exception as e:
+                logging.exception('failed to generate a batch of %d images', len(batch))
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.stats.add_batch(len(batch))
+            for (_, future), png in zip(batch, pngs):
+                if not future.done():
+                    future.set_result(png)
+
+
+class InferenceServer(object):
+    """
+    Minimal HTTP/1.1 server for a trained DCGan (any object with generate_batch and a loaded glove model):
+    * POST /generate with the prompt as the (utf-8) body, or GET /generate?prompt=..., returns an image/png
+    * GET /stats returns the InferenceStats as json
+    """
+
+    def __init__(self, gan, host='127.0.0.1', port=8080, max_batch_size=32, max_wait_ms=10):
+        self.host = host
+        self.port = port
+        self.stats = InferenceStats()
+        self.batcher = MicroBatcher(gan, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, stats=self.stats)
+        self.server = None
+
+    async def start(self):
+        self.batcher.start()
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logging.info('serving on http://%s:%d', self.host, self.port)
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+        await self.batcher.stop()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+                headers = dict()
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, value = line.decode('latin-1').split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                status, content_type, content = await self.respond(method, target, body)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                writer.write(('HTTP/1.1 %s\r\nContent-Type: %s\r\nContent-Length: %d\r\nConnection: %s\r\n\r\n'
+                              % (status, content_type, len(content), 'keep-alive' if keep_alive else 'close'))
+                             .encode('latin-1') + content)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, target, body):
+        url = urlparse(target)
+        if url.path == '/stats' and method == 'GET':
+            return '200 OK', 'application/json', json.dumps(self.stats.to_dict()).encode('utf8')
+        if url.path != '/generate' or method not in ('GET', 'POST'):
+            return '404 Not Found', 'text/plain', b'not found'
+
+        if method == 'POST':
+            try:
+                prompt = body.decode('utf8')
+            except UnicodeDecodeError:
+                return '400 Bad Request', 'text/plain', b'the prompt is not valid utf-8'
+        else:
+            prompt = parse_qs(url.query).get('prompt', [''])[0]
+        if len(prompt.strip()) == 0:
+            return '400 Bad Request', 'text/plain', b'missing prompt'
+
+        start_time = time.time()
+        try:
+            png = await self.batcher.generate(prompt)
+        except Exception:
+            self.stats.add_request(time.time() - start_time, error=True)
+            return '500 Internal Server Error', 'text/plain', b'generation failed'
+        self.stats.add_request(time.time() - start_time)
+        return '200 OK', 'image/png', png
+
+
+def serve(gan, host='127.0.0.1', port=8080, max_batch_size=32, max_wait_ms=10):
+    """
+    Run an InferenceServer for the gan until interrupted
+    """
+    server = InferenceServer(gan, host=host, port=port, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(server.start())
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(server.stop())
+        loop.close()
@@ -0,0 +1,52 @@
+from mxnet import nd
+
+from mxnet_text_to_image.library.parallel import as_ctx_list
+
+
+class GanMetrics(object):
+    """
+    Running binary accuracy of netD (an output above 0.5 predicts a real image) and mean losses of netD and netG. The
+    sums stay on the context of every slice and only get() copies them to the host, so the updates do not stop the
+    engine from queueing the next iterations (unlike mx.metric.CustomMetric, which converts every update to numpy)
+    """
+
+    def __init__(self, ctx_list):
+        self.ctx_list = as_ctx_list(ctx_list)
+        self.ctx_index = dict((ctx, i) for i, ctx in enumerate(self.ctx_list))
+        self.correct = None
+        self.errD = None
+        self.errG = None
+        self.num_labels = 0
+        self.num_samples = 0
+        self.reset()
+
+    def reset(self):
+        self.correct = [nd.zeros((1, ), ctx=ctx) for ctx in self.ctx_list]
+        self.errD = [nd.zeros((1, ), ctx=ctx) for ctx in self.ctx_list]
+        self.errG = [nd.zeros((1, ), ctx=ctx) for ctx in self.ctx_list]
+        self.num_labels = 0
+        self.num_samples = 0
+
+    def update_accuracy(self, label, output):
+        i = self.ctx_index[output.context]
+        self.correct[i] += nd.sum((output.reshape((-1, )) > 0.5) == label.reshape((-1, )))
+        self.num_labels += label.size
+
+    def update_losses(self, errD, errG):
+        """
+        :param errD, errG: per sample losses of one slice
+        """
+        i = self.ctx_index[errD.context]
+        self.errD[i] += nd.sum(errD)
+        self.errG[i] += nd.sum(errG)
+        self.num_samples += errD.shape[0]
+
+    def get(self):
+        """
+        Wait for the updates and copy the sums to the host, once for every context
+        :return: accuracy, mean netD loss and mean netG loss since the last reset
+        """
+        sums = nd.add_n(*[nd.concat(correct, errD, errG, dim=0).as_in_context(self.ctx_list[0])
+                          for correct, errD, errG in zip(self.correct, self.errD, self.errG)]).asnumpy()
+        return (float(sums[0]) / max(self.num_labels, 1), float(sums[1]) / max(self.num_samples, 1),
+                float(sums[2]) / max(self.num_samples, 1))
@@ -0,0 +1,26 @@
+from mxnet import gluon, nd
+
+
+def as_ctx_list(ctx):
+    return list(ctx) if isinstance(ctx, (list, tuple)) else [ctx]
+
+
+def split_batch(arrays, ctx_list):
+    """
+    Split every array along the batch axis into one slice per context (the first slices are one sample larger when the
+    batch size is not a multiple of the number of contexts)
+    :return: list of one tuple of slices per context
+    """
+    return list(zip(*[gluon.utils.split_and_load(data, ctx_list, even_split=False) for data in arrays]))
+
+
+def sync_running_stats(net):
+    """
+    Average the BatchNorm running mean and variance over the contexts of net. The trainers aggregate the gradients so
+    the weights stay identical on every context, but each context updates its running statistics from its own slices
+    only
+    """
+    for param in net.collect_params('.*running_mean|.*running_var').values():
+        data = param.list_data()
+        if len(data) > 1:
+            param.set_data(nd.add_n(*[d.as_in_context(data[0].context) for d in data]) / len(data))
@@ -1,46 +1,101 @@
+import mxnet as mx
 from mxnet import nd
 import numpy as np
 
 
 class ImagePool():
+    """
+    History of (image, text_feat) pairs kept in preallocated NDArrays on the context of the queried batches. Once the
+    pool is full, every pair of a batch is swapped with a random pool entry with probability P(N(0, 1) < 0.5). The
+    whole batch is processed at once by one random mask and one gather / scatter, so no per-sample host sync occurs.
+    The result is the one of swapping the pairs one after the other, in batch order
+    """
 
     def __init__(self, pool_size):
         self.pool_size = pool_size
         if self.pool_size > 0:
             self.num_imgs = 0
-            self.images = []
-            self.text_feats = []
+            self.images = None
+            self.text_feats = None
 
+    def _allocate(self, images, text_feats):
+        # the extra last row receives the pairs which are not swapped
+        self.images = nd.zeros((self.pool_size + 1, ) + images.shape[1:], ctx=images.context, dtype=images.dtype)
+        self.text_feats = nd.zeros((self.pool_size + 1, ) + text_feats.shape[1:], ctx=text_feats.context,
+                                   dtype=text_feats.dtype)
+
+    def get_state(self):
+        """
+        :return: dict of the filled count and host copies of the buffers (None before the first query)
+        """
+        if self.pool_size == 0 or self.images is None:
+            return {'num_imgs': 0, 'images': None, 'text_feats': None}
+        return {'num_imgs': self.num_imgs, 'images': self.images.copyto(mx.cpu()),
+                'text_feats': self.text_feats.copyto(mx.cpu())}
+
+    def set_state(self, state, ctx):
+        if self.pool_size == 0:
+            return
+        self.num_imgs = state['num_imgs']
+        self.images = None if state['images'] is None else state['images'].as_in_context(ctx)
+        self.text_feats = None if state['text_feats'] is None else state['text_feats'].as_in_context(ctx)
+
+    def _draw(self, count, ctx):
+        """
+        :return: (swap, random_index) float NDArrays of shape (count, ): whether each pair is swapped with the pool
+        entry at its random index
+        """
+        swap = nd.random_normal(0, 1, shape=(count, ), ctx=ctx) < 0.5
+        random_index = nd.floor(nd.random_uniform(0, self.pool_size, shape=(count, ), ctx=ctx))
+        return swap, nd.minimum(random_index, self.pool_size - 1)
 
     def query(self, image_text_pairs):
         if self.pool_size == 0:
             return image_text_pairs
-        ret_images = []
-        ret_text_feats = []
         images, text_feats = image_text_pairs
+        if self.images is None:
+            self._allocate(images, text_feats)
+
+        batch_size = images.shape[0]
+        num_fill = min(self.pool_size - self.num_imgs, batch_size)
+        if num_fill > 0:
+            # the pool is not full yet, the pairs are stored and returned as is
+            self.images[self.num_imgs:self.num_imgs + num_fill] = images[:num_fill]
+            self.text_feats[self.num_imgs:self.num_imgs + num_fill] = text_feats[:num_fill]
+            self.num_imgs = self.num_imgs + num_fill
+            if num_fill == batch_size:
+                return [images, text_feats]
+
+        ret_images = images[num_fill:]
+        ret_text_feats = text_feats[num_fill:]
+        count = batch_size - num_fill
+        swap, random_index = self._draw(count, images.context)
+        pooled_images = nd.take(self.images, random_index)
+        pooled_text_feats = nd.take(self.text_feats, random_index)
+
+        # as if the pairs were swapped one after the other: a pair swapped with the same index as earlier pairs of the
+        # batch gets the last of them back, and only the last pair swapped with an index is left in the pool
+        positions = nd.arange(count, ctx=images.context)
+        same_index = nd.broadcast_equal(random_index.reshape((-1, 1)), random_index.reshape((1, -1))) \
+            * swap.reshape((-1, 1)) * swap.reshape((1, -1))
+        earlier = nd.broadcast_lesser(positions.reshape((1, -1)), positions.reshape((-1, 1)))
+        previous = nd.max(nd.where(same_index * earlier, nd.broadcast_like(positions.reshape((1, -1)), same_index),
+                                   -nd.ones_like(same_index)), axis=1)
+        later = nd.broadcast_greater(positions.reshape((1, -1)), positions.reshape((-1, 1)))
+        last = swap * (1 - nd.max(same_index * later, axis=1))
+        pooled_images = nd.where(previous >= 0, nd.take(ret_images, nd.maximum(previous, 0)), pooled_images)
+        pooled_text_feats = nd.where(previous >= 0, nd.take(ret_text_feats, nd.maximum(previous, 0)),
+                                     pooled_text_feats)
+
+        # the last swapped pairs are written to their random index, the others to the extra last row
+        write_index = nd.where(last, random_index, nd.full((count, ), self.pool_size, ctx=images.context))
+        write_index = write_index.astype(np.int32)
+        self.images[write_index] = ret_images
+        self.text_feats[write_index] = ret_text_feats
 
-        for i in range(images.shape[0]):
-            image = nd.expand_dims(images[i], axis=0)
-            text_feat = nd.expand_dims(text_feats[i], axis=0)
-            if self.num_imgs < self.pool_size:
-                self.num_imgs = self.num_imgs + 1
-                self.images.append(image)
-                self.text_feats.append(text_feat)
-                ret_images.append(image)
-                ret_text_feats.append(text_feat)
-            else:
-                p = nd.random_normal(0, 1, shape=(1, )).asscalar()
-                if p < 0.5:
-                    random_index = nd.random_uniform(0, self.pool_size-1, shape=(1, )).astype(np.uint8).asscalar()
-                    tmp_img = self.images[random_index].copy()
-                    tmp_text_feat = self.text_feats[random_index].copy()
-                    self.images[random_index] = image
-                    self.text_feats[random_index] = text_feat
-                    ret_images.append(tmp_img)
-                    ret_text_feats.append(tmp_text_feat)
-                else:
-                    ret_images.append(image)
-                    ret_text_feats.append(text_feat)
-        ret_images = nd.concat(*ret_images, dim=0)
-        ret_text_feats = nd.concat(*ret_text_feats, dim=0)
-        return [ret_images, ret_text_feats]
\ No newline at end of file
+        ret_images = nd.where(swap, pooled_images, ret_images)
+        ret_text_feats = nd.where(swap, pooled_text_feats, ret_text_feats)
+        if num_fill > 0:
+            ret_images = nd.concat(images[:num_fill], ret_images, dim=0)
+            ret_text_feats = nd.concat(text_feats[:num_fill], ret_text_feats, dim=0)
+        return [ret_images, ret_text_feats]
@@ -0,0 +1,112 @@
+import csv
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from mxnet import nd
+
+# the phases of a training iteration, in the order of the columns of the csv files
+PHASES = ('data', 'generator_forward', 'pool_query', 'netD_forward', 'netD_backward', 'netD_step', 'netG_forward',
+          'netG_backward', 'netG_step', 'checkpoint')
+FIELDS = ('epoch', 'iter', 'rank', 'batch_size', 'total') + PHASES
+
+
+class PhaseTimer(object):
+    """
+    Time the phases of the training iterations and write one record per iteration (and one per checkpoint) to a .csv
+    file, or to a JSON lines file for any other extension. MXNet runs the operators asynchronously, so every phase
+    starts and ends with nd.waitall(): this serializes the data loading, the nets and the trainers and slows down the
+    training, which is why nothing is measured (and nothing waits) when file_path is None
+    """
+
+    def __init__(self, file_path=None, rank=0):
+        self.file_path = file_path
+        self.rank = rank
+        self.timings = dict()
+        self.file = None
+        self.writer = None
+        if file_path is not None:
+            self.file = open(file_path, 'a')
+            if file_path.endswith('.csv'):
+                self.writer = csv.DictWriter(self.file, fieldnames=FIELDS, restval='')
+                if self.file.tell() == 0:
+                    self.writer.writeheader()
+
+    @property
+    def enabled(self):
+        return self.file is not None
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        nd.waitall()
+        start_time = time.time()
+        yield
+        nd.waitall()
+        self.timings[name] = self.timings.get(name, 0.0) + time.time() - start_time
+
+    def end_iteration(self, epoch, iter, batch_size=None):
+        """
+        Write the timings of the phases since the previous record, under epoch and iter
+        """
+        if not self.enabled:
+            return
+        record = {'epoch': epoch, 'iter': iter, 'rank': self.rank, 'batch_size': batch_size,
+                  'total': sum(self.timings.values())}
+        record.update(self.timings)
+        if self.writer is not None:
+            self.writer.writerow(record)
+        else:
+            self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        self.timings = dict()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.writer = None
+
+
+def load_timings(file_path):
+    if file_path.endswith('.csv'):
+        with open(file_path) as f:
+            return [{name: float(value) for name, value in record.items() if value != ''}
+                    for record in csv.DictReader(f)]
+    with open(file_path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize_timings(file_paths, skip_iterations=1):
+    """
+    Aggregate the records of one or more timing files (e.g. several runs or several workers). The first
+    skip_iterations iterations of every epoch build the graphs and allocate the memory and are left out
+    :return: dict of phase -> mean seconds per iteration (per checkpoint for the checkpoint), plus the iteration count
+    and the samples per second
+    """
+    records = [record for file_path in file_paths for record in load_timings(file_path)]
+    checkpoints = [record['checkpoint'] for record in records if 'checkpoint' in record]
+    # the records of the checkpoints at the end of the epochs have no batch size
+    records = [record for record in records
+               if record.get('batch_size') is not None and record['iter'] >= skip_iterations]
+    summary = {'iterations': len(records)}
+    for name in ('total', ) + PHASES[:-1]:
+        values = [record[name] for record in records if name in record]
+        if len(values) > 0:
+            summary[name] = float(np.mean(values))
+    if len(checkpoints) > 0:
+        summary['checkpoint'] = float(np.mean(checkpoints))
+    seconds = sum(record['total'] for record in records)
+    if seconds > 0:
+        summary['samples_per_second'] = sum(record['batch_size'] for record in records) / seconds
+    return summary
+
+
+if __name__ == '__main__':
+    # python -m mxnet_text_to_image.library.profiling <timings file>...
+    for name, value in summarize_timings(sys.argv[1:]).items():
+        print('%s: %s' % (name, value))
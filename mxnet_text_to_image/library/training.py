@@ -0,0 +1,255 @@
+import logging
+import os
+import time
+
+import mxnet as mx
+import numpy as np
+from mxnet import gluon, nd, autograd
+
+from mxnet_text_to_image.library.checkpoint import AsyncCheckpointer, snapshot_rng_state, restore_rng_state
+from mxnet_text_to_image.library.distributed import ParameterSync
+from mxnet_text_to_image.library.metrics import GanMetrics
+from mxnet_text_to_image.library.parallel import split_batch, sync_running_stats
+from mxnet_text_to_image.library.pool import ImagePool
+from mxnet_text_to_image.library.profiling import PhaseTimer
+from mxnet_text_to_image.utils.image_utils import save_image, inverted_transform
+
+
+class GanTrainingLoop(object):
+    """
+    The training loop shared by the DCGan models, which only provide the forward and backward passes of an iteration.
+    gan is the model (netG, netD, ctx_list, model_ctx, random_input_size, model_name, create_model, hybridize_model,
+    get_config_file_path and run_deferred_init, a forward pass on one dummy sample).
+
+    With several contexts, every batch is split into one slice per context, the gradients of the slices are summed
+    by the kvstore of the trainers and each context keeps an image pool of 1 / len(ctx_list) of image_pool_size.
+    BatchNorm normalizes every slice with its own statistics, the running statistics are averaged over the
+    contexts at the end of every epoch.
+    kvstore may also be 'dist_sync' or a KVStore already created by the worker script: the gradients are then also
+    summed over the workers, each worker should train on its own part of the data (see get_data_iter) and only
+    worker 0 saves the config, the checkpoints and the training images.
+    The accuracy of netD and the mean losses since the start of the epoch are summed on the devices and only read
+    back every print_every iterations and at the end of the epoch.
+    The checkpoints are written by a background thread (see AsyncCheckpointer) at the end of every epoch and, with
+    checkpoint_every, every checkpoint_every iterations. The last keep_last ones and the ones of every keep_every
+    epochs are kept.
+    With resume, the training continues from the latest checkpoint of model_dir_path if there is one: the nets,
+    the trainer states, the image pools, the random generators and the epoch and iteration. The batches of an
+    interrupted epoch come in the same order if the order of train_data only depends on the numpy state at reset
+    (as for PrefetchingIter), the ones before the checkpoint are skipped. The contexts should be the same as the
+    ones of the interrupted training.
+    With profile_path, the time of every phase of every iteration is written to that .csv or JSON lines file (see
+    PhaseTimer, the phases then wait for each other so the training is slower)
+    """
+
+    def __init__(self, gan, model_dir_path, batch_size=64, learning_rate=0.0002, beta1=0.5, image_pool_size=50,
+                 kvstore='device', profile_path=None, checkpoint_every=None, keep_last=1, keep_every=None,
+                 resume=False):
+        self.gan = gan
+        self.model_dir_path = model_dir_path
+        self.checkpoint_every = checkpoint_every
+
+        self.image_pools = [ImagePool(-(-image_pool_size // len(gan.ctx_list))) for _ in gan.ctx_list]
+
+        self.loss = gluon.loss.SigmoidBinaryCrossEntropyLoss()
+
+        self.checkpointer = AsyncCheckpointer(model_dir_path, gan.model_name, keep_last=keep_last,
+                                              keep_every=keep_every)
+        self.state = self.checkpointer.load_state() if resume else None
+        if self.state is not None:
+            gan.random_input_size = self.state['random_input_size']
+            gan.netG, gan.netD = gan.create_model()
+            self.checkpointer.restore_nets(self.state, {'netG': gan.netG, 'netD': gan.netD}, ctx=gan.ctx_list)
+            gan.hybridize_model()
+        elif gan.netG is None:
+            gan.netG, gan.netD = gan.create_model()
+
+            gan.netG.initialize(mx.init.Normal(0.02), ctx=gan.ctx_list)
+            gan.netD.initialize(mx.init.Normal(0.02), ctx=gan.ctx_list)
+            gan.hybridize_model()
+
+        # a KVStore reduces the gradients of both nets under its own keys, the trainers then update locally
+        self.param_sync = None
+        if isinstance(kvstore, mx.kv.KVStore) or (isinstance(kvstore, str) and kvstore.startswith('dist')):
+            self.param_sync = ParameterSync(kvstore)
+            # a first forward pass ends the deferred initialization, so that all the keys are synced before training
+            gan.run_deferred_init()
+            self.param_sync.init(gan.netG.collect_params())
+            self.param_sync.init(gan.netD.collect_params())
+            kvstore = None
+        self.rank = self.param_sync.rank if self.param_sync is not None else 0
+        self.num_workers = self.param_sync.num_workers if self.param_sync is not None else 1
+
+        if self.rank == 0:
+            config = dict()
+            config['random_input_size'] = gan.random_input_size
+            np.save(gan.get_config_file_path(model_dir_path), config)
+
+        paramsG = gan.netG.collect_params()
+        paramsD = gan.netD.collect_params()
+        trainerG = gluon.Trainer(paramsG, 'adam', {'learning_rate': learning_rate, 'beta1': beta1},
+                                 kvstore=kvstore)
+        trainerD = gluon.Trainer(paramsD, 'adam', {'learning_rate': learning_rate, 'beta1': beta1},
+                                 kvstore=kvstore)
+        self.trainers = {'trainerG': trainerG, 'trainerD': trainerD}
+        # the parameters and the trainer that update() steps for each net
+        self.updates = {'netG': (paramsG, trainerG), 'netD': (paramsD, trainerD)}
+
+        self.real_labels = gluon.utils.split_and_load(nd.ones((batch_size,)), gan.ctx_list, even_split=False)
+        self.fake_labels = gluon.utils.split_and_load(nd.zeros((batch_size,)), gan.ctx_list, even_split=False)
+
+        self.metrics = GanMetrics(gan.ctx_list)
+
+        if self.state is not None:
+            self.checkpointer.restore_trainers(self.state, self.trainers)
+            for pool, pool_state, ctx in zip(self.image_pools, self.state['image_pools'], gan.ctx_list):
+                pool.set_state(pool_state, ctx)
+
+        self.timer = PhaseTimer(profile_path, rank=self.rank)
+        self.epoch_rng_state = None
+
+    def update(self, net_name, errors, batch_size):
+        """
+        Backward pass of the recorded errors, then one step of the trainer of net_name ('netD' or 'netG')
+        """
+        with self.timer.phase(net_name + '_backward'):
+            autograd.backward(errors)
+
+        params, trainer = self.updates[net_name]
+        with self.timer.phase(net_name + '_step'):
+            if self.param_sync is not None:
+                self.param_sync.allreduce_grads(params)
+            trainer.step(batch_size * self.num_workers)
+
+    def training_state(self):
+        return {'random_input_size': self.gan.random_input_size, 'epoch_rng_state': self.epoch_rng_state,
+                'rng_state': snapshot_rng_state(), 'image_pools': [pool.get_state() for pool in self.image_pools]}
+
+    def get_shards(self, batch, image_dict, device_table):
+        gan = self.gan
+        # batches of a PrefetchingIter may already hold the images and the random input
+        if getattr(batch, 'images', None) is not None:
+            real_images = batch.images.as_in_context(gan.model_ctx)
+        elif device_table is not None:
+            real_images = device_table.take(batch.data[0].as_in_context(gan.model_ctx))
+        else:
+            real_images = nd.array(image_dict.get_batch(batch.data[0].asnumpy()), ctx=gan.model_ctx)
+        bsize = real_images.shape[0]
+        text_feats = batch.data[1].as_in_context(gan.model_ctx)
+        if getattr(batch, 'noise', None) is not None:
+            random_input = batch.noise.as_in_context(gan.model_ctx)
+        else:
+            random_input = nd.random_normal(0, 1, shape=(bsize, gan.random_input_size, 1, 1), ctx=gan.model_ctx)
+
+        return bsize, split_batch([real_images, text_feats, random_input], gan.ctx_list)
+
+    def fit(self, train_data, image_dict, train_step, epochs=2, start_epoch=0, print_every=10,
+            device_dataset=False):
+        """
+        :param image_dict: ImageStore (or FeatureCache) of the real images (or of their features) by image id
+        :param train_step: train_step(bsize, shards) runs the forward passes of one iteration, calls update() for netD
+        then netG and returns (outputs, errD, errG, fake_images), outputs a list of (label, netD output) and
+        fake_images the generated images of every context
+        """
+        gan = self.gan
+        checkpointer = self.checkpointer
+        timer = self.timer
+        metrics = self.metrics
+        nets = {'netG': gan.netG, 'netD': gan.netD}
+        trainers = self.trainers
+        state = self.state
+        self.state = None
+        if state is not None:
+            start_epoch = state['epoch'] if state['iter'] is not None else state['epoch'] + 1
+
+        # upload the whole table once, each batch is then gathered on the device
+        device_table = image_dict.to_device(gan.model_ctx) if device_dataset else None
+
+        logging.basicConfig(level=logging.DEBUG)
+
+        try:
+            for epoch in range(start_epoch, epochs):
+                fake_images = []
+                tic = time.time()
+                btic = time.time()
+                samples = 0
+                if state is not None:
+                    # a resumed epoch starts from the same numpy state, so that the batches come in the same order
+                    if state['iter'] is None:
+                        restore_rng_state(state['rng_state'])
+                    else:
+                        np.random.set_state(state['epoch_rng_state'])
+                self.epoch_rng_state = np.random.get_state()
+                train_data.reset()
+                iter = 0
+                if state is not None and state['iter'] is not None:
+                    # the batches up to the checkpoint were trained before the resume
+                    for _ in range(state['iter'] + 1):
+                        train_data.next()
+                    iter = state['iter'] + 1
+                    restore_rng_state(state['rng_state'])
+                state = None
+                for batch in train_data:
+                    with timer.phase('data'):
+                        bsize, shards = self.get_shards(batch, image_dict, device_table)
+
+                    outputs, errD, errG, fake_images = train_step(bsize, shards)
+
+                    # accumulated on the devices, read back by the logs only
+                    for label, output in outputs:
+                        metrics.update_accuracy(label, output)
+                    for err_d, err_g in zip(errD, errG):
+                        metrics.update_losses(err_d, err_g)
+
+                    checkpoint_every = self.checkpoint_every
+                    if checkpoint_every is not None and self.rank == 0 and (iter + 1) % checkpoint_every == 0:
+                        with timer.phase('checkpoint'):
+                            checkpointer.save(nets, epoch, iter, trainers=trainers, state=self.training_state())
+                    timer.end_iteration(epoch, iter, bsize)
+                    samples += bsize
+
+                    # Print log infomation every ten batches
+                    if iter % print_every == 0:
+                        acc, errD_mean, errG_mean = metrics.get()
+                        # get() waited for the batches since the previous log, the logging itself is not counted
+                        logging.info('speed: {} samples/s'.format(samples / (time.time() - btic)))
+                        logging.info(
+                            'discriminator loss = %f, generator loss = %f, binary training acc = %f at iter %d epoch %d'
+                            % (errD_mean, errG_mean, acc, iter, epoch))
+                        btic = time.time()
+                        samples = 0
+                    iter = iter + 1
+
+                acc, errD_mean, errG_mean = metrics.get()
+                metrics.reset()
+                logging.info('\nbinary training acc at epoch %d: %f, discriminator loss = %f, generator loss = %f'
+                             % (epoch, acc, errD_mean, errG_mean))
+                logging.info('time: %f' % (time.time() - tic))
+
+                for net in (gan.netG, gan.netD):
+                    if self.param_sync is not None:
+                        self.param_sync.average_data(net.collect_params('.*running_mean|.*running_var'))
+                    else:
+                        sync_running_stats(net)
+                if self.rank != 0:
+                    continue
+
+                with timer.phase('checkpoint'):
+                    checkpointer.save(nets, epoch, trainers=trainers, state=self.training_state())
+                timer.end_iteration(epoch, iter)
+
+                if not fake_images:
+                    # an epoch resumed from the checkpoint of its last iteration trains no batch
+                    continue
+                # Visualize one generated image for each epoch
+                fake_img = inverted_transform(fake_images[0][0]).asnumpy().astype(np.uint8)
+                # fake_img = ((fake_img.asnumpy().transpose(1, 2, 0) + 1.0) * 127.5).astype(np.uint8)
+
+                save_image(fake_img,
+                           os.path.join(self.model_dir_path, gan.model_name + '-training-') + str(epoch) + '.png')
+        finally:
+            # also when the training raises or is interrupted, so that the queued checkpoints are written
+            try:
+                checkpointer.close()
+            finally:
+                timer.close()
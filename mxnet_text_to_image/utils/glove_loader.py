@@ -5,8 +5,11 @@ import numpy as np
 import logging
 import pickle
 import time
+from scipy.sparse import csr_matrix
 
 from mxnet_text_to_image.utils.download_utils import reporthook
+from mxnet_text_to_image.utils.store_utils import FileStore, sorted_lookup, replace_on_success
+from mxnet_text_to_image.utils.text_utils import word_tokenize_docs
 
 
 def download_glove(data_dir_path, to_file_path):
@@ -27,25 +30,119 @@ def download_glove(data_dir_path, to_file_path):
         zip_ref.close()
 
 
-def load_glove(data_dir_path=None, embedding_dim=None):
+def get_glove_store_paths(data_dir_path, embedding_dim):
+    prefix = os.path.join(data_dir_path, 'glove.6B.' + str(embedding_dim) + 'd')
+    return prefix + '.vocab.npy', prefix + '.matrix.npy'
+
+
+class GloveEmbeddings(FileStore):
     """
-    Load the glove models (and download the glove model if they don't exist in the data_dir_path
-    :param data_dir_path: the directory path on which the glove model files will be downloaded and store
-    :param embedding_dim: the dimension of the word embedding, available dimensions are 50, 100, 200, 300, default is 100
-    :return: the glove word embeddings
+    Read-only word to embedding mapping backed by a sorted vocabulary array and a contiguous float32 matrix (one row
+    per vocabulary word). Both files are opened with np.memmap, so every process which opens the same store shares
+    the page cache instead of deserializing its own copy of the embeddings
     """
-    if embedding_dim is None:
-        embedding_dim = 100
+    path_names = ('vocab_path', 'matrix_path')
+
+    def __init__(self, vocab_path, matrix_path):
+        self.vocab_path = vocab_path
+        self.matrix_path = matrix_path
+        self.vocab = np.load(vocab_path, mmap_mode='r')
+        self.matrix = np.load(matrix_path, mmap_mode='r')
+        self.embedding_dim = self.matrix.shape[1]
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def __iter__(self):
+        return iter(self.vocab)
+
+    def __contains__(self, word):
+        return self.index(word) >= 0
+
+    def __getitem__(self, word):
+        i = self.index(word)
+        if i < 0:
+            raise KeyError(word)
+        return self.matrix[i]
+
+    def get(self, word, default=None):
+        i = self.index(word)
+        if i < 0:
+            return default
+        return self.matrix[i]
+
+    def keys(self):
+        return iter(self.vocab)
+
+    def index(self, word):
+        """
+        :param word: the word to look up
+        :return: the row of the word in the embedding matrix, or -1 if the word is not in the vocabulary
+        """
+        return int(sorted_lookup(self.vocab, [word])[0])
+
+    def lookup(self, words):
+        """
+        Vectorized version of index()
+        :param words: list or array of words
+        :return: int64 array of rows in the embedding matrix, -1 for the words not in the vocabulary
+        """
+        return sorted_lookup(self.vocab, np.asarray(words, dtype=np.str_))
+
+
+def sum_embeddings(matrix, word_ids, doc_ids, doc_count):
+    """
+    Segment-sum of embedding rows: result[doc_ids[k]] += matrix[word_ids[k]] for every word_ids[k] >= 0, computed as
+    a sparse (doc, word) count matrix times the embedding rows of the words that actually occur
+    :return: float64 array of shape (doc_count, embedding_dim)
+    """
+    found = word_ids >= 0
+    unique_word_ids, columns = np.unique(word_ids[found], return_inverse=True)
+    counts = csr_matrix((np.ones(len(columns)), (doc_ids[found], columns)), shape=(doc_count, len(unique_word_ids)))
+    E = np.asarray(matrix[unique_word_ids], dtype=np.float64)
+    return np.asarray(counts.dot(E)).reshape((doc_count, matrix.shape[1]))
+
+
+def save_glove_store(word2em, data_dir_path, embedding_dim):
+    """
+    Write a word to embedding mapping as a sorted vocabulary plus a contiguous float32 matrix
+    """
+    vocab_path, matrix_path = get_glove_store_paths(data_dir_path, embedding_dim)
+    words = np.array(list(word2em.keys()), dtype=np.str_)
+    vocab, first_index = np.unique(words, return_index=True)
+
+    with replace_on_success(matrix_path, vocab_path) as (matrix_tmp_path, vocab_tmp_path):
+        matrix = np.lib.format.open_memmap(matrix_tmp_path, mode='w+', dtype=np.float32,
+                                           shape=(len(vocab), embedding_dim))
+        values = list(word2em.values())
+        for row, i in enumerate(first_index):
+            matrix[row] = values[i]
+        matrix.flush()
+        del matrix
+        np.save(vocab_tmp_path, vocab)
+
 
+def load_glove_store(data_dir_path, embedding_dim):
+    vocab_path, matrix_path = get_glove_store_paths(data_dir_path, embedding_dim)
+    if not os.path.exists(vocab_path) or not os.path.exists(matrix_path):
+        return None
+    return GloveEmbeddings(vocab_path, matrix_path)
+
+
+def load_glove_pickle(data_dir_path, embedding_dim):
     glove_pickle_path = data_dir_path + "/glove.6B." + str(embedding_dim) + "d.pickle"
-    if os.path.exists(glove_pickle_path):
-        logging.info('loading glove embedding from %s', glove_pickle_path)
-        start_time = time.time()
-        with open(glove_pickle_path, 'rb') as handle:
-            result = pickle.load(handle)
-            duration = time.time() - start_time
-            logging.debug('loading glove from pickle tooks %.1f seconds', (duration ))
-            return result
+    if not os.path.exists(glove_pickle_path):
+        return None
+    logging.info('loading glove embedding from %s', glove_pickle_path)
+    start_time = time.time()
+    with open(glove_pickle_path, 'rb') as handle:
+        result = pickle.load(handle)
+        duration = time.time() - start_time
+        logging.debug('loading glove from pickle tooks %.1f seconds', (duration ))
+        return result
+
+
+def load_glove_text(data_dir_path, embedding_dim):
     glove_file_path = data_dir_path + "/glove.6B." + str(embedding_dim) + "d.txt"
     download_glove(data_dir_path, glove_file_path)
     _word2em = {}
@@ -59,12 +156,34 @@ def load_glove(data_dir_path=None, embedding_dim=None):
         if i % 1000 == 0:
             logging.debug('loaded %d %d-dim glove words', i, embedding_dim)
     file.close()
-    with open(glove_pickle_path, 'wb') as handle:
-        logging.debug('saving glove embedding as %s', glove_pickle_path)
-        pickle.dump(_word2em, handle, protocol=pickle.HIGHEST_PROTOCOL)
     return _word2em
 
 
+def load_glove(data_dir_path=None, embedding_dim=None):
+    """
+    Load the glove models (and download the glove model if they don't exist in the data_dir_path
+    :param data_dir_path: the directory path on which the glove model files will be downloaded and store
+    :param embedding_dim: the dimension of the word embedding, available dimensions are 50, 100, 200, 300, default is 100
+    :return: the glove word embeddings as a memory-mapped GloveEmbeddings
+    """
+    if embedding_dim is None:
+        embedding_dim = 100
+
+    start_time = time.time()
+    result = load_glove_store(data_dir_path, embedding_dim)
+    if result is not None:
+        logging.debug('loading glove store tooks %.3f seconds', time.time() - start_time)
+        return result
+
+    # build the store once from the legacy pickle (if any) or from the original glove text file
+    word2em = load_glove_pickle(data_dir_path, embedding_dim)
+    if word2em is None:
+        word2em = load_glove_text(data_dir_path, embedding_dim)
+    logging.debug('saving glove embedding store to %s', data_dir_path)
+    save_glove_store(word2em, data_dir_path, embedding_dim)
+    return load_glove_store(data_dir_path, embedding_dim)
+
+
 class GloveModel(object):
     """
     Class the provides the glove embedding and document encoding functions
@@ -88,41 +207,32 @@ class GloveModel(object):
         else:
             return np.zeros(shape=(self.embedding_dim, ))
 
+    def docs_to_word_ids(self, docs, max_allowed_doc_length=None):
+        """
+        Map the words of every document to rows of the embedding matrix in one vectorized lookup
+        :param docs: list of documents
+        :param max_allowed_doc_length: if set, only the first max_allowed_doc_length words of each document are used
+        :return: (word_ids, doc_ids) flat int64 arrays, word_ids is -1 for the words not in the vocabulary
+        """
+        words = list()
+        doc_ids = list()
+        # the same tokenizer as the caption features of get_text_features
+        for i, doc_words in enumerate(word_tokenize_docs([doc.lower() for doc in docs])):
+            if max_allowed_doc_length is not None:
+                doc_words = doc_words[:max_allowed_doc_length]
+            words.extend(doc_words)
+            doc_ids.append(np.full(len(doc_words), i, dtype=np.int64))
+        doc_ids = np.concatenate(doc_ids) if len(doc_ids) > 0 else np.zeros(0, dtype=np.int64)
+        return self.word2em.lookup(words), doc_ids
+
     def encode_docs(self, docs, max_allowed_doc_length=None):
-        doc_count = len(docs)
-        X = np.zeros(shape=(doc_count, self.embedding_dim))
-        max_len = 0
-        for doc in docs:
-            max_len = max(max_len, len(doc.split(' ')))
-        if max_allowed_doc_length is not None:
-            max_len = min(max_len, max_allowed_doc_length)
-        for i in range(0, doc_count):
-            doc = docs[i]
-            words = [w.lower() for w in doc.split(' ')]
-            length = min(max_len, len(words))
-            E = np.zeros(shape=(self.embedding_dim, max_len))
-            for j in range(length):
-                word = words[j]
-                try:
-                    E[:, j] = self.word2em[word]
-                except KeyError:
-                    pass
-            X[i, :] = np.sum(E, axis=1)
-
-        return X
+        """
+        Encode each document as the sum of the embeddings of its words. All the documents are encoded at once as a
+        sparse (doc, word) count matrix times the embedding rows of the words that occur in the batch
+        :return: float64 array of shape (len(docs), embedding_dim)
+        """
+        word_ids, doc_ids = self.docs_to_word_ids(docs, max_allowed_doc_length)
+        return sum_embeddings(self.word2em.matrix, word_ids, doc_ids, len(docs))
 
     def encode_doc(self, doc, max_allowed_doc_length=None):
-        words = [w.lower() for w in doc.split(' ')]
-        max_len = len(words)
-        if max_allowed_doc_length is not None:
-            max_len = min(len(words), max_allowed_doc_length)
-        E = np.zeros(shape=(self.embedding_dim, max_len))
-        X = np.zeros(shape=(self.embedding_dim, ))
-        for j in range(max_len):
-            word = words[j]
-            try:
-                E[:, j] = self.word2em[word]
-            except KeyError:
-                pass
-        X[:] = np.sum(E, axis=1)
-        return X
+        return self.encode_docs([doc], max_allowed_doc_length=max_allowed_doc_length)[0]
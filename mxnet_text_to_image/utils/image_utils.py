@@ -1,4 +1,5 @@
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from mxnet import nd, image
 from mxnet.gluon.model_zoo import vision as models
 import mxnet as mx
@@ -13,6 +14,39 @@ def transform(data):
     return (data.astype(np.float32) / 255 - rgb_mean) / rgb_std
 
 
+def normalize_images(data):
+    """
+    numpy version of transform for a batch of uint8 (N, C, H, W) images
+    """
+    mean = rgb_mean.asnumpy().reshape((1, 3, 1, 1))
+    std = rgb_std.asnumpy().reshape((1, 3, 1, 1))
+    return (data.astype(np.float32) / 255 - mean) / std
+
+
+def load_resized_image(img_path, image_width, image_height, read_image=image.imread):
+    """
+    :param read_image: decodes img_path (e.g. the image id of an ImageRecords) into a (H, W, C) NDArray
+    :return: the resized uint8 pixels of the image as a (C, H, W) numpy array
+    """
+    x = read_image(img_path)
+    x = image.imresize(x, image_width, image_height)
+    return x.transpose((2, 0, 1)).asnumpy()
+
+
+def iter_resized_images(image_paths, image_width, image_height, batch_size=256, num_threads=4,
+                        read_image=image.imread):
+    """
+    Decode and resize the images with a thread pool
+    :param read_image: see load_resized_image
+    :return: generator of (offset, uint8 (N, C, H, W) pixels of image_paths[offset:offset + batch_size])
+    """
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        for offset in range(0, len(image_paths), batch_size):
+            batch = image_paths[offset:offset + batch_size]
+            yield offset, np.stack(list(executor.map(
+                lambda path: load_resized_image(path, image_width, image_height, read_image), batch)))
+
+
 def transform_image(img_path, image_width, image_height):
     x = image.imread(img_path)
     x = image.imresize(x, image_width, image_height)
@@ -24,26 +58,82 @@ def inverted_transform(img):
     return ((img.as_in_context(mx.cpu()) * rgb_std + rgb_mean) * 255).transpose((1, 2, 0))
 
 
-def load_vgg16_image(img_path, image_width=224, image_height=224):
-    x = image.imread(img_path)
+def inverted_transform_batch(imgs):
+    """
+    Batched version of inverted_transform, computed on the context of imgs
+    :return: uint8 numpy array of shape (N, H, W, C)
+    """
+    mean = rgb_mean.reshape((1, 3, 1, 1)).as_in_context(imgs.context)
+    std = rgb_std.reshape((1, 3, 1, 1)).as_in_context(imgs.context)
+    return ((imgs * std + mean) * 255).transpose((0, 2, 3, 1)).asnumpy().astype(np.uint8)
+
+
+def load_vgg16_image(img_path, image_width=224, image_height=224, read_image=image.imread):
+    x = read_image(img_path)
     x = image.resize_short(x, 256)
     x, _ = image.center_crop(x, (image_width, image_height))
     return x
 
 
+def load_vgg16_input(img_path, image_width=224, image_height=224, read_image=image.imread):
+    return transform(load_vgg16_image(img_path, image_width=image_width, image_height=image_height,
+                                      read_image=read_image))
+
+
 def save_image(img_data, save_to_file):
     Image.fromarray(img_data).save(save_to_file)
 
 
+def save_images(imgs_data, save_to_files, num_threads=4):
+    """
+    Encode and save the images with a thread pool
+    :param imgs_data: uint8 array of shape (N, H, W, C)
+    :param save_to_files: the N file paths
+    """
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        list(executor.map(save_image, imgs_data, save_to_files))
+
+
 class Vgg16FeatureExtractor(object):
 
     def __init__(self, model_ctx=mx.cpu()):
-        self.model_ctx = model_ctx
+        # with a list of contexts image_net is copied to all of them, the images are extracted on the first one
+        self.model_ctx = model_ctx[0] if isinstance(model_ctx, (list, tuple)) else model_ctx
         self.image_net = models.vgg16(pretrained=True)
         self.image_net.collect_params().reset_ctx(ctx=model_ctx)
+        # the pretrained weights are never trained, gradients only flow through the network to its input images
+        self.image_net.collect_params().setattr('grad_req', 'null')
 
     def extract_image_features(self, image_path, image_width=224, image_height=224):
         img = load_vgg16_image(image_path, image_width=image_width, image_height=image_height)
         img = transform(img).expand_dims(axis=0)
         img = img.as_in_context(self.model_ctx)
         return self.image_net(img)
+
+    def iter_images_features(self, image_paths, image_width=224, image_height=224, batch_size=32, num_threads=4,
+                             read_image=image.imread):
+        """
+        Batched version of extract_image_features. A thread pool decodes and resizes the images of the next batch
+        while the current batch runs through image_net
+        :param image_paths: list of image file paths
+        :param batch_size: number of images per forward pass
+        :param num_threads: number of threads which decode the images
+        :param read_image: see load_resized_image
+        :return: generator of (offset, float32 features of image_paths[offset:offset + batch_size])
+        """
+        batches = [image_paths[i:i + batch_size] for i in range(0, len(image_paths), batch_size)]
+        if len(batches) == 0:
+            return
+
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            def submit(batch):
+                return [executor.submit(load_vgg16_input, image_path, image_width, image_height, read_image)
+                        for image_path in batch]
+
+            pending = submit(batches[0])
+            for k in range(len(batches)):
+                imgs = nd.stack(*[future.result() for future in pending])
+                if k + 1 < len(batches):
+                    pending = submit(batches[k + 1])
+                feats = self.image_net(imgs.as_in_context(self.model_ctx))
+                yield k * batch_size, feats.asnumpy().astype(np.float32)
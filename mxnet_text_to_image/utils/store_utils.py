@@ -0,0 +1,63 @@
+import os
+from contextlib import contextmanager
+import numpy as np
+
+
+class FileStore(object):
+    """
+    Base of the read-only stores backed by files (np.memmap arrays, RecordIO shards). A store is pickled as the
+    constructor arguments named by path_names, so worker processes re-open the files instead of receiving a copy of
+    their content, and memory-mapped files share the page cache
+    """
+    path_names = ()
+
+    def __getstate__(self):
+        return dict((name, getattr(self, name)) for name in self.path_names)
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+
+def sorted_lookup(sorted_keys, keys):
+    """
+    Vectorized lookup of keys in a sorted array
+    :param keys: list or array of keys
+    :return: int64 array of the positions of the keys in sorted_keys, -1 for the keys which are not in it
+    """
+    keys = np.asarray(keys)
+    if keys.size == 0:
+        return np.zeros(shape=keys.shape, dtype=np.int64)
+    positions = np.searchsorted(sorted_keys, keys).astype(np.int64)
+    found = positions < len(sorted_keys)
+    found[found] = sorted_keys[positions[found]] == keys[found]
+    positions[~found] = -1
+    return positions
+
+
+def get_temp_path(file_path, extension=''):
+    """
+    :return: the temporary path to write file_path to before renaming it, unique per process so that processes
+    building the same file concurrently do not write to the same temporary file
+    """
+    return '%s.tmp.%d%s' % (file_path, os.getpid(), extension)
+
+
+@contextmanager
+def replace_on_success(*file_paths):
+    """
+    Yield one temporary .npy path per file path. Once the block completes, the temporary files are renamed onto the
+    file paths in order, so readers never see a partially written file. Nothing is renamed if the block raises (the
+    temporary files are then deleted), or completes without writing any of the temporary files
+    """
+    temp_paths = [get_temp_path(file_path, '.npy') for file_path in file_paths]
+    try:
+        yield temp_paths
+    except BaseException:
+        for temp_path in temp_paths:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        raise
+    if not any(os.path.exists(temp_path) for temp_path in temp_paths):
+        return
+    for temp_path, file_path in zip(temp_paths, file_paths):
+        os.replace(temp_path, file_path)
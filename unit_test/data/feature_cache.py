@@ -0,0 +1,121 @@
+import unittest
+import os
+import pickle
+import shutil
+import tempfile
+import numpy as np
+import mxnet as mx
+from mxnet import nd
+from mxnet_text_to_image.data.feature_cache import FeatureCache
+from mxnet_text_to_image.data.flowers_images import get_transformed_images, open_feature_cache
+from mxnet_text_to_image.data.image_store import save_image_store
+from mxnet_text_to_image.data.synthetic_flowers import create_synthetic_jpegs, create_synthetic_flowers
+from mxnet_text_to_image.utils.image_utils import normalize_images
+
+
+class FeatureCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir_path = tempfile.mkdtemp()
+        self.cache_dir_path = os.path.join(self.work_dir_path, 'cache')
+        self.computed = []
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir_path)
+
+    def iter_pixels(self, image_ids, version=0):
+        self.computed.extend(image_ids)
+        # batches of 3 rows, the cache regroups them into chunks
+        for offset in range(0, len(image_ids), 3):
+            yield offset, np.stack([np.full(shape=(3, 4, 4), fill_value=image_id + version, dtype=np.uint8)
+                                    for image_id in image_ids[offset:offset + 3]])
+
+    def test_update(self):
+        cache = FeatureCache(self.cache_dir_path, chunk_size=4)
+        cache.update(dict((image_id, 'a') for image_id in range(10)), self.iter_pixels)
+        self.assertListEqual(list(range(10)), self.computed)
+        self.assertListEqual(['chunk-000000.npy', 'chunk-000001.npy', 'chunk-000002.npy', 'manifest.jsonl'],
+                             sorted(os.listdir(self.cache_dir_path)))
+        np.testing.assert_array_equal(normalize_images(np.full(shape=(2, 3, 4, 4), fill_value=7, dtype=np.uint8)),
+                                      cache.get_batch([7, 7]))
+        self.assertRaises(KeyError, cache.get_batch, [10])
+
+        # only the new image ids and the changed ones are computed and appended
+        self.computed = []
+        cache = FeatureCache(self.cache_dir_path, chunk_size=4)
+        signatures = dict((image_id, 'a') for image_id in range(2, 12))
+        signatures[5] = 'b'
+        cache.update(signatures, lambda image_ids: self.iter_pixels(image_ids, version=100))
+        self.assertListEqual([5, 10, 11], self.computed)
+        self.assertListEqual(list(range(2, 12)), list(cache.keys()))
+        np.testing.assert_array_equal(np.array([2, 3, 4, 105, 6, 7, 8, 9, 110, 111]), cache.data[:, 0, 0, 0])
+
+        self.computed = []
+        reopened = FeatureCache(self.cache_dir_path, chunk_size=4)
+        self.assertListEqual(list(range(12)), list(reopened.keys()))
+        reopened.update(signatures, self.iter_pixels)
+        self.assertListEqual([], self.computed)
+
+    def test_crash(self):
+        cache = FeatureCache(self.cache_dir_path, chunk_size=4)
+        cache.update(dict((image_id, 'a') for image_id in range(8)), self.iter_pixels)
+        # a crash while writing the third chunk: its manifest line is incomplete
+        with open(cache.manifest_path, 'a') as f:
+            f.write('{"chunk": 2, "image_ids": [8, ')
+        with open(cache.get_chunk_path(2), 'wb') as f:
+            f.write(b'partial')
+
+        self.computed = []
+        cache = FeatureCache(self.cache_dir_path, chunk_size=4)
+        self.assertListEqual(list(range(8)), list(cache.keys()))
+        cache.update(dict((image_id, 'a') for image_id in range(10)), self.iter_pixels)
+        self.assertListEqual([8, 9], self.computed)
+        np.testing.assert_array_equal(np.arange(10), FeatureCache(self.cache_dir_path).data[:, 0, 0, 0])
+
+    def test_pickle_and_device_table(self):
+        cache = FeatureCache(self.cache_dir_path, chunk_size=4)
+        cache.update(dict((image_id, 'a') for image_id in range(10)), self.iter_pixels)
+        cache.select([9, 2, 4])
+        unpickled = pickle.loads(pickle.dumps(cache))
+        self.assertListEqual([2, 4, 9], list(unpickled.keys()))
+
+        table = unpickled.to_device(mx.cpu())
+        self.assertEqual(3, len(table))
+        image_ids = np.array([4, 9, 4, 2])
+        np.testing.assert_allclose(cache.get_batch(image_ids), table.take(nd.array(image_ids)).asnumpy(), rtol=1e-6)
+
+    def test_get_transformed_images(self):
+        data_dir_path = os.path.join(self.work_dir_path, 'flowers')
+        create_synthetic_flowers(data_dir_path, 100, class_count=2, vocab_size=100)
+        jpg_dir_path = os.path.join(data_dir_path, 'jpg')
+        images = get_transformed_images(jpg_dir_path)
+        self.assertEqual(10, len(images))
+
+        # the cache of an older version is converted
+        save_image_store(os.path.join(data_dir_path, 'flower_transformed_images_32x32'), images.keys(),
+                         lambda image_ids: [(0, np.zeros(shape=(len(image_ids), 3, 32, 32), dtype=np.uint8))])
+        self.assertEqual(0, get_transformed_images(jpg_dir_path, 32, 32).data.max())
+
+        # a rewritten image is resized again, the others are not
+        with open(os.path.join(jpg_dir_path, 'image_00004.jpg'), 'wb') as f:
+            f.write(create_synthetic_jpegs(1, 64, 64, np.random.RandomState(1))[0])
+        updated = get_transformed_images(jpg_dir_path)
+        self.assertFalse(np.array_equal(images.get_rows([4]), updated.get_rows([4])))
+        np.testing.assert_array_equal(images.get_rows([1, 2, 3, 5]), updated.get_rows([1, 2, 3, 5]))
+        with open(updated.manifest_path) as f:
+            self.assertEqual(2, len(f.readlines()))
+
+    def test_open_feature_cache_legacy_features(self):
+        store_prefix = os.path.join(self.work_dir_path, 'flower_image_feats')
+        legacy = dict((image_id, np.full(shape=(5, ), fill_value=image_id, dtype=np.float32)) for image_id in [1, 2, 3])
+        np.save(store_prefix + '.npy', legacy)
+        signatures = {1: 'a', 2: 'b', 3: 'c', 4: 'd'}
+
+        self.assertEqual(0, len(open_feature_cache(store_prefix, signatures).entries))
+        cache = open_feature_cache(store_prefix, signatures, legacy_features_path=store_prefix + '.npy')
+        np.testing.assert_array_equal(np.stack([legacy[1], legacy[3]]), cache.get_rows([1, 3]))
+        np.testing.assert_array_equal(np.array([4]), cache.get_stale(signatures))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,7 @@ import os
 import sys
 import logging
 import mxnet as mx
+import numpy as np
 
 
 def patch_path(path):
@@ -36,6 +37,18 @@ class FlowersImagesUnitTest(unittest.TestCase):
         self.assertFalse(0 in features)
         self.assertEqual(8189, len(features))
 
+    def test_iter_images_features(self):
+        data_dir_path = patch_path('../../demo/data/flowers/jpg')
+
+        from mxnet_text_to_image.data.flowers_images import get_image_paths
+        from mxnet_text_to_image.utils.image_utils import Vgg16FeatureExtractor
+        image_paths = list(get_image_paths(data_dir_path).values())[:5]
+        fe = Vgg16FeatureExtractor()
+        for offset, feats in fe.iter_images_features(image_paths, batch_size=2, num_threads=2):
+            for k, image_feats in enumerate(feats):
+                expected = fe.extract_image_features(image_paths[offset + k]).asnumpy()[0]
+                np.testing.assert_allclose(expected, image_feats, rtol=1e-4, atol=1e-4)
+
     def test_get_transformed_images(self):
         data_dir_path = patch_path('../../demo/data/flowers/jpg')
 
@@ -1,7 +1,10 @@
 import unittest
 import os
 import sys
+import shutil
 import logging
+import tempfile
+import numpy as np
 
 
 def patch_path(path):
@@ -44,6 +47,76 @@ class FlowersTextTest(unittest.TestCase):
         self.assertTupleEqual((81890, 30, 300), feats.shape)
 
 
+class TextFeaturesCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir_path = tempfile.mkdtemp()
+        self.data_dir_path = os.path.join(self.work_dir_path, 'flowers', 'text_c10')
+        self.glove_dir_path = os.path.join(self.work_dir_path, 'glove')
+        os.makedirs(self.glove_dir_path)
+        rng = np.random.RandomState(0)
+        with open(os.path.join(self.glove_dir_path, 'glove.6B.300d.txt'), 'wt', encoding='utf8') as f:
+            for word in ['this', 'flower', 'has', 'white', 'yellow', 'petals', 'stamen', 'a', ',', '.']:
+                f.write(word + ' ' + ' '.join('%.5f' % v for v in rng.normal(0, 1, size=(300, ))) + '\n')
+        self.write_captions(1, 1, ['this flower has white petals.', 'a yellow stamen , white petals.'])
+        self.write_captions(1, 2, ['this flower has yellow petals.'])
+        self.write_captions(2, 3, ['white petals and a yellow stamen.', 'this flower has a stamen.'])
+        self.write_captions(3, 4, ['yellow , yellow petals.'])
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir_path)
+
+    def write_captions(self, class_id, image_id, lines):
+        class_dir_path = os.path.join(self.data_dir_path, 'class_%05d' % class_id)
+        if not os.path.exists(class_dir_path):
+            os.makedirs(class_dir_path)
+        with open(os.path.join(class_dir_path, 'image_%05d.txt' % image_id), 'w') as f:
+            f.write(''.join(line + '\n' for line in lines))
+
+    def get_shard_mtimes(self):
+        shards_dir_path = os.path.join(self.work_dir_path, 'flowers', 'flower_text_feats_shards')
+        return dict((name, os.stat(os.path.join(shards_dir_path, name)).st_mtime_ns)
+                    for name in os.listdir(shards_dir_path))
+
+    def test_only_stale_shards_are_tokenized(self):
+        from mxnet_text_to_image.data.flowers_texts import get_text_features, _text_shard_signature
+        for mode, max_seq_length in [('add', -1), ('concat', 6)]:
+            feats, image_ids = get_text_features(self.data_dir_path, self.glove_dir_path, max_seq_length, mode,
+                                                 num_workers=1)
+            self.assertEqual(6, len(feats))
+            np.testing.assert_array_equal(np.array([1, 1, 2, 3, 3, 4]), image_ids)
+        mtimes = self.get_shard_mtimes()
+        self.assertListEqual(['class_00001.npz', 'class_00002.npz', 'class_00003.npz'], sorted(mtimes))
+
+        # rewrite one caption file of class_00002, with an mtime that surely differs
+        self.write_captions(2, 3, ['white petals and a yellow stamen.', 'this flower has a stamen.',
+                                   'yellow petals , white stamen.'])
+        stat = os.stat(os.path.join(self.data_dir_path, 'class_00002', 'image_00003.txt'))
+        os.utime(os.path.join(self.data_dir_path, 'class_00002', 'image_00003.txt'),
+                 ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        fresh_data_dir_path = os.path.join(self.work_dir_path, 'fresh', 'text_c10')
+        shutil.copytree(self.data_dir_path, fresh_data_dir_path)
+        for mode, max_seq_length in [('add', -1), ('concat', 6)]:
+            feats, image_ids = get_text_features(self.data_dir_path, self.glove_dir_path, max_seq_length, mode,
+                                                 num_workers=1)
+            expected_feats, expected_image_ids = get_text_features(fresh_data_dir_path, self.glove_dir_path,
+                                                                   max_seq_length, mode, num_workers=1)
+            self.assertEqual(7, len(feats))
+            np.testing.assert_array_equal(expected_image_ids, image_ids)
+            np.testing.assert_array_equal(expected_feats, feats)
+
+        updated_mtimes = self.get_shard_mtimes()
+        # the caches of the other tokenizer mode (with or without the nltk punkt data) are not used
+        class_dir_path = os.path.join(self.data_dir_path, 'class_00001')
+        self.assertNotEqual(_text_shard_signature(class_dir_path, (10, ), 'punkt'),
+                            _text_shard_signature(class_dir_path, (10, ), 'preserve_line'))
+
+        self.assertEqual(mtimes['class_00001.npz'], updated_mtimes['class_00001.npz'])
+        self.assertNotEqual(mtimes['class_00002.npz'], updated_mtimes['class_00002.npz'])
+        self.assertEqual(mtimes['class_00003.npz'], updated_mtimes['class_00003.npz'])
+
+
 if __name__ == '__main__':
     sys.path.append(patch_path('../..'))
     unittest.main()
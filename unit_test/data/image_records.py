@@ -0,0 +1,107 @@
+import unittest
+import os
+import pickle
+import hashlib
+import shutil
+import tempfile
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from mxnet import image
+from mxnet_text_to_image.data import image_records
+from mxnet_text_to_image.data.flowers_images import get_image_paths, get_transformed_images, pack_images
+from mxnet_text_to_image.data.image_records import pack_image_records, list_image_record_shards, load_image_records, \
+    get_image_record_paths
+from mxnet_text_to_image.data.synthetic_flowers import create_synthetic_flowers
+
+
+class ImageRecordsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir_path = tempfile.mkdtemp()
+        create_synthetic_flowers(os.path.join(self.work_dir_path, 'flowers'), 250, class_count=3, vocab_size=100)
+        self.jpg_dir_path = os.path.join(self.work_dir_path, 'flowers', 'jpg')
+        self.image_paths = get_image_paths(self.jpg_dir_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir_path)
+
+    def test_pack_image_records(self):
+        records_prefix = os.path.join(self.work_dir_path, 'records', 'images')
+        records = pack_image_records(self.image_paths, records_prefix, images_per_shard=10)
+        self.assertListEqual([0, 1, 2], records.shards)
+        self.assertListEqual(list(range(1, 26)), list(records.keys()))
+        self.assertTrue(25 in records)
+        self.assertFalse(26 in records)
+        self.assertRaises(KeyError, records.read, 26)
+
+        def read_file(image_id):
+            with open(self.image_paths[image_id], 'rb') as f:
+                return f.read()
+
+        # random access from several threads
+        image_ids = list(np.random.permutation(list(records.keys())))
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            payloads = list(executor.map(records.read, image_ids))
+        for image_id, payload in zip(image_ids, payloads):
+            self.assertEqual(read_file(image_id), payload)
+        self.assertListEqual([(image_id, read_file(image_id)) for image_id in range(1, 26)],
+                             list(records.iter_records()))
+        decoded = records.read_image(7)
+        self.assertTupleEqual((64, 64, 3), decoded.shape)
+        np.testing.assert_array_equal(image.imdecode(read_file(7)).asnumpy(), decoded.asnumpy())
+        # without the private decoding operator
+        cvimdecode = image_records._cvimdecode
+        image_records._cvimdecode = None
+        try:
+            np.testing.assert_array_equal(decoded.asnumpy(), records.read_image(7).asnumpy())
+        finally:
+            image_records._cvimdecode = cvimdecode
+
+        # the signatures come from the digests recorded when packing, not from the records
+        read = records.read
+        records.read = None
+        self.assertEqual(hashlib.md5(read_file(9)).hexdigest(), records.get_signature(9))
+        records.read = read
+        self.assertRaises(KeyError, records.get_signature, 26)
+
+        unpickled = pickle.loads(pickle.dumps(records))
+        self.assertEqual(read_file(13), unpickled.read(13))
+        records.close()
+        unpickled.close()
+
+        # the shards of the earlier packing which are not overwritten are deleted
+        pack_image_records(self.image_paths, records_prefix, images_per_shard=20).close()
+        self.assertListEqual([0, 1], list_image_record_shards(records_prefix))
+        self.assertListEqual(['images-00000.idx', 'images-00000.md5.json', 'images-00000.rec', 'images-00001.idx',
+                              'images-00001.md5.json', 'images-00001.rec'],
+                             sorted(os.listdir(os.path.dirname(records_prefix))))
+
+        # the digests of a shard rewritten since are not used
+        rec_path = get_image_record_paths(records_prefix, 0)[0]
+        stat = os.stat(rec_path)
+        os.utime(rec_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        records = load_image_records(records_prefix)
+        self.assertDictEqual({}, records.load_digests(0))
+        self.assertEqual(hashlib.md5(read_file(9)).hexdigest(), records.get_signature(9))
+        self.assertEqual(5, len(records.load_digests(1)))
+        records.close()
+
+    def test_get_transformed_images(self):
+        images = get_transformed_images(self.jpg_dir_path)
+        records = pack_images(self.jpg_dir_path, images_per_shard=8)
+        self.assertEqual(4, len(records.shards))
+        data_dir_path = os.path.dirname(self.jpg_dir_path)
+        for name in os.listdir(data_dir_path):
+            if name.startswith('flower_transformed_images'):
+                shutil.rmtree(os.path.join(data_dir_path, name))
+        # the jpg files are no longer read
+        shutil.rmtree(self.jpg_dir_path)
+        os.mkdir(self.jpg_dir_path)
+
+        packed_images = get_transformed_images(self.jpg_dir_path)
+        self.assertListEqual(list(images.keys()), list(packed_images.keys()))
+        np.testing.assert_array_equal(images.data, packed_images.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
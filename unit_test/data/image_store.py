@@ -0,0 +1,66 @@
+import unittest
+import os
+import pickle
+import shutil
+import tempfile
+import numpy as np
+import mxnet as mx
+from mxnet import nd
+from mxnet_text_to_image.data.image_store import load_image_store, save_image_store
+from mxnet_text_to_image.utils.image_utils import normalize_images
+
+
+def iter_pixels(image_ids):
+    yield 0, np.stack([np.full(shape=(3, 4, 4), fill_value=image_id, dtype=np.uint8) for image_id in image_ids])
+
+
+class ImageStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir_path = tempfile.mkdtemp()
+        self.store_prefix = os.path.join(self.data_dir_path, 'images')
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir_path)
+
+    def test_save_image_store(self):
+        self.assertIsNone(load_image_store(self.store_prefix))
+        store = save_image_store(self.store_prefix, [7, 3, 5], iter_pixels)
+        self.assertEqual(3, len(store))
+        self.assertEqual(np.uint8, store.data.dtype)
+        self.assertListEqual([3, 5, 7], list(store.keys()))
+        self.assertTrue(5 in store)
+        self.assertFalse(4 in store)
+        np.testing.assert_array_equal(normalize_images(np.full(shape=(2, 3, 4, 4), fill_value=7, dtype=np.uint8)),
+                                      store.get_batch([7, 7]))
+        self.assertRaises(KeyError, store.get_batch, [4])
+
+        # only the missing image ids are computed, the others are copied from the previous store
+        def iter_missing_pixels(image_ids):
+            self.assertListEqual([9], list(image_ids))
+            return iter_pixels(image_ids)
+
+        store = save_image_store(self.store_prefix, [3, 5, 7, 9], iter_missing_pixels, base=store)
+        self.assertListEqual([3, 5, 7, 9], list(store.keys()))
+        np.testing.assert_array_equal(store.data[:, 0, 0, 0], np.array([3, 5, 7, 9]))
+
+        # a store which is up to date is returned as is
+        reloaded = load_image_store(self.store_prefix)
+        self.assertIs(reloaded, save_image_store(self.store_prefix, [9, 3, 5, 7], iter_missing_pixels, base=reloaded))
+
+    def test_device_image_table(self):
+        store = save_image_store(self.store_prefix, [9, 2, 4], iter_pixels)
+        table = store.to_device(mx.cpu())
+        self.assertEqual(3, len(table))
+        image_ids = np.array([4, 9, 4, 2])
+        np.testing.assert_allclose(store.get_batch(image_ids), table.take(nd.array(image_ids)).asnumpy(), rtol=1e-6)
+
+    def test_pickle_image_store(self):
+        save_image_store(self.store_prefix, [1, 2], iter_pixels)
+        store = pickle.loads(pickle.dumps(load_image_store(self.store_prefix)))
+        self.assertIsInstance(store.data, np.memmap)
+        np.testing.assert_array_equal(store[2], normalize_images(store.data[1:2])[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+from mxnet_text_to_image.data.flowers_texts import load_text_files
+from mxnet_text_to_image.data.manifest import get_file_index, get_manifest_path
+from mxnet_text_to_image.data.synthetic_flowers import create_synthetic_flowers
+
+
+class ManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir_path = tempfile.mkdtemp()
+        create_synthetic_flowers(os.path.join(self.work_dir_path, 'flowers'), 100, class_count=3, vocab_size=100)
+        self.text_dir_path = os.path.join(self.work_dir_path, 'flowers', 'text_c10')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir_path)
+
+    def test_get_file_index(self):
+        index = get_file_index(self.text_dir_path, '.txt')
+        self.assertListEqual(list(range(1, 11)), list(index.keys()))
+        self.assertEqual(os.path.join(self.text_dir_path, 'class_00002', 'image_00005.txt'), index[5])
+        manifest_path = get_manifest_path(self.text_dir_path)
+        self.assertEqual(os.path.join(self.work_dir_path, 'flowers', 'text_c10_manifest.json'), manifest_path)
+
+        # the manifest is reused while the directories are unchanged
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        self.assertEqual([1, 2, 3, 4], manifest['dirs'][1][2])
+        manifest['dirs'][1][3][0] = 'moved.txt'
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f)
+        self.assertEqual(os.path.join(self.text_dir_path, 'class_00001', 'moved.txt'),
+                         get_file_index(self.text_dir_path, '.txt')[1])
+
+        # adding a file changes the mtime of its directory
+        shutil.copy(index[10], os.path.join(self.text_dir_path, 'class_00003', 'image_00011.txt'))
+        index = get_file_index(self.text_dir_path, '.txt')
+        self.assertListEqual(list(range(1, 12)), list(index.keys()))
+        self.assertEqual(os.path.join(self.text_dir_path, 'class_00001', 'image_00001.txt'), index[1])
+
+    def test_missing_dir(self):
+        missing_dir_path = os.path.join(self.work_dir_path, 'flowers', 'missing')
+        self.assertDictEqual({}, get_file_index(missing_dir_path, '.jpg'))
+        self.assertFalse(os.path.exists(get_manifest_path(missing_dir_path)))
+
+    def test_files_to_load(self):
+        # without a manifest, the scan stops after the first files in path order and writes no manifest
+        self.assertListEqual([1, 2, 3, 4], list(load_text_files(self.text_dir_path, files_to_load=4).keys()))
+        self.assertFalse(os.path.exists(get_manifest_path(self.text_dir_path)))
+
+        load_text_files(self.text_dir_path)
+        self.assertTrue(os.path.exists(get_manifest_path(self.text_dir_path)))
+        self.assertListEqual([1, 2, 3, 4], list(load_text_files(self.text_dir_path, files_to_load=4).keys()))
+
+
+if __name__ == '__main__':
+    unittest.main()
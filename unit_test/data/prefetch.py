@@ -0,0 +1,72 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from mxnet_text_to_image.data.image_store import save_image_store
+from mxnet_text_to_image.data.prefetch import PrefetchingIter
+
+
+class PrefetchingIterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir_path = tempfile.mkdtemp()
+        self.image_store = save_image_store(os.path.join(self.data_dir_path, 'feats'), range(10),
+                                            lambda image_ids: [(0, np.array(image_ids, dtype=np.float32)
+                                                                .reshape((-1, 1)).repeat(4, axis=1))])
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir_path)
+
+    def test_iter(self):
+        image_ids = np.arange(10)[::-1]
+        text_feats = np.arange(10, dtype=np.float32).reshape((10, 1)) * 10
+        train_data = PrefetchingIter(image_ids, text_feats, batch_size=4, image_store=self.image_store,
+                                     random_input_size=3, num_workers=3, prefetch=2)
+        for _ in range(2):
+            train_data.reset()
+            seen = list()
+            pads = list()
+            for batch in train_data:
+                batch_image_ids = batch.data[0].asnumpy()
+                np.testing.assert_array_equal(batch_image_ids * 10, 90 - batch.data[1].asnumpy()[:, 0])
+                np.testing.assert_array_equal(batch_image_ids, batch.images.asnumpy()[:, 2])
+                self.assertTupleEqual((4, 3, 1, 1), batch.noise.shape)
+                seen.extend(batch_image_ids[:4 - batch.pad])
+                pads.append(batch.pad)
+            self.assertListEqual(list(range(10)), sorted(seen))
+            self.assertListEqual([0, 0, 2], pads)
+            self.assertEqual(3, train_data.batch_count)
+
+    def test_fewer_samples_than_pad(self):
+        train_data = PrefetchingIter(np.arange(3), np.zeros((3, 2)), batch_size=8)
+        batches = list(train_data)
+        self.assertEqual(1, len(batches))
+        self.assertEqual(5, batches[0].pad)
+        self.assertTupleEqual((8, ), batches[0].data[0].shape)
+        self.assertTupleEqual((8, 2), batches[0].data[1].shape)
+        self.assertListEqual([0, 1, 2], sorted(batches[0].data[0].asnumpy()[:3].astype(np.int64).tolist()))
+        train_data.close()
+        self.assertRaises(StopIteration, train_data.next)
+
+    def test_reset_during_epoch(self):
+        train_data = PrefetchingIter(np.arange(100), np.zeros((100, 2)), batch_size=2, prefetch=1)
+        next(iter(train_data))
+        train_data.reset()
+        self.assertEqual(50, len(list(train_data)))
+
+    def test_replay(self):
+        train_data = PrefetchingIter(np.arange(10), np.zeros((10, 2)), batch_size=4, random_input_size=3,
+                                     num_workers=3)
+        epochs = []
+        for _ in range(2):
+            np.random.seed(3)
+            train_data.reset()
+            epochs.append([(batch.data[0].asnumpy(), batch.noise.asnumpy()) for batch in train_data])
+        for (image_ids, noise), (replayed_image_ids, replayed_noise) in zip(*epochs):
+            np.testing.assert_array_equal(image_ids, replayed_image_ids)
+            np.testing.assert_array_equal(noise, replayed_noise)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from mxnet_text_to_image.data.flowers_images import get_image_paths, get_transformed_images
+from mxnet_text_to_image.data.flowers_texts import load_text_files, load_texts
+from mxnet_text_to_image.data.synthetic_flowers import create_synthetic_flowers
+from mxnet_text_to_image.utils.glove_loader import GloveModel
+
+
+class SyntheticFlowersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir_path = tempfile.mkdtemp()
+        self.data_dir_path = os.path.join(self.work_dir_path, 'flowers')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir_path)
+
+    def test_create_synthetic_flowers(self):
+        image_count = create_synthetic_flowers(self.data_dir_path, 95, class_count=4, vocab_size=300, oov_words=10)
+        self.assertEqual(10, image_count)
+
+        text_dir_path = os.path.join(self.data_dir_path, 'text_c10')
+        self.assertListEqual(['class_00001', 'class_00002', 'class_00003', 'class_00004'],
+                             sorted(os.listdir(text_dir_path)))
+        self.assertListEqual(['image_00001.txt', 'image_00002.txt', 'image_00003.txt'],
+                             sorted(os.listdir(os.path.join(text_dir_path, 'class_00001'))))
+        self.assertListEqual(list(range(1, 11)), sorted(load_text_files(text_dir_path)))
+        self.assertListEqual(list(range(1, 11)), sorted(get_image_paths(os.path.join(self.data_dir_path, 'jpg'))))
+
+        texts = load_texts(text_dir_path)
+        self.assertEqual(95, sum(len(lines) for lines in texts.values()))
+        self.assertEqual(5, len(texts[10]))
+
+        glove = GloveModel()
+        glove.load(os.path.join(self.work_dir_path, 'glove'), embedding_dim=300)
+        self.assertEqual(300, len(glove.word2em))
+        word_ids, _ = glove.docs_to_word_ids([line.strip() for lines in texts.values() for line in lines])
+        # most of the words are in the vocabulary, a few are not
+        self.assertGreater(np.mean(word_ids >= 0), 0.8)
+        self.assertLess(np.mean(word_ids >= 0), 1.0)
+
+        images = get_transformed_images(os.path.join(self.data_dir_path, 'jpg'))
+        self.assertEqual(10, len(images))
+        self.assertTupleEqual((3, 64, 64), images.data.shape[1:])
+
+    def test_seed(self):
+        create_synthetic_flowers(self.data_dir_path, 20, class_count=2)
+        other_dir_path = os.path.join(self.work_dir_path, 'other', 'flowers')
+        create_synthetic_flowers(other_dir_path, 20, class_count=2)
+        self.assertDictEqual(load_texts(os.path.join(self.data_dir_path, 'text_c10')),
+                             load_texts(os.path.join(other_dir_path, 'text_c10')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from mxnet_text_to_image.data.image_store import save_image_store
+
+
+def save_random_images(store_prefix, image_count=8):
+    """
+    :return: an ImageStore of image_count random (3, 64, 64) uint8 images with the image ids 0 .. image_count - 1
+    """
+    return save_image_store(store_prefix, range(image_count), lambda image_ids: [
+        (0, np.random.randint(0, 256, size=(len(image_ids), 3, 64, 64)).astype(np.uint8))])
+
+
+class ModelDirTestCase(unittest.TestCase):
+    """
+    Test case with a temporary self.model_dir_path, deleted after every test
+    """
+
+    def setUp(self):
+        self.model_dir_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.model_dir_path)
+
+    def save_random_images(self, image_count=8):
+        return save_random_images(os.path.join(self.model_dir_path, 'images'), image_count)
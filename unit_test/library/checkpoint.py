@@ -0,0 +1,138 @@
+import unittest
+import os
+import shutil
+import numpy as np
+import mxnet as mx
+from mxnet import nd
+from mxnet.gluon import nn
+from mxnet_text_to_image.data.prefetch import PrefetchingIter
+from mxnet_text_to_image.library.checkpoint import AsyncCheckpointer
+from mxnet_text_to_image.library.dcgan2 import DCGan
+from mxnet_text_to_image.library.profiling import load_timings
+from unit_test.library import ModelDirTestCase
+
+
+def create_net():
+    net = nn.HybridSequential()
+    with net.name_scope():
+        net.add(nn.Dense(4, in_units=3))
+    return net
+
+
+class AsyncCheckpointerTest(ModelDirTestCase):
+
+    def test_retention(self):
+        net = create_net()
+        net.initialize(mx.init.Normal(0.02))
+        checkpointer = AsyncCheckpointer(self.model_dir_path, 'test', keep_last=2, keep_every=3)
+        for epoch in range(6):
+            checkpointer.save({'net': net}, epoch, 9)
+            checkpointer.save({'net': net}, epoch)
+            weight = net.collect_params()[net.prefix + 'dense0_weight']
+            # the checkpoints hold the values at the time of save()
+            weight.set_data(weight.data() + 1)
+        checkpointer.close()
+
+        self.assertListEqual(['test-net-epoch-0002.params', 'test-net-epoch-0005-iter-000009.params',
+                              'test-net-epoch-0005.params', 'test-net.params'], sorted(os.listdir(self.model_dir_path)))
+
+        loaded = create_net()
+        loaded.load_params(checkpointer.get_file_path('net'))
+        np.testing.assert_allclose(weight.data().asnumpy() - 1,
+                                   loaded.collect_params()[loaded.prefix + 'dense0_weight'].data().asnumpy(),
+                                   rtol=1e-6)
+
+    def test_fit(self):
+        image_store = self.save_random_images()
+        train_data = mx.io.NDArrayIter(data=[nd.array(np.arange(8)), np.random.normal(0, 1, size=(8, 300))],
+                                       batch_size=4)
+        gan = DCGan()
+        gan.random_input_size = 20
+        gan.fit(train_data=train_data, image_dict=image_store, model_dir_path=self.model_dir_path, epochs=2,
+                batch_size=4, checkpoint_every=1, keep_last=None)
+
+        names = [name for name in os.listdir(self.model_dir_path) if name.endswith('-netG.params') or '-netG-' in name]
+        self.assertListEqual(['dcgan-v2-netG-epoch-0000-iter-000000.params',
+                              'dcgan-v2-netG-epoch-0000-iter-000001.params', 'dcgan-v2-netG-epoch-0000.params',
+                              'dcgan-v2-netG-epoch-0001-iter-000000.params',
+                              'dcgan-v2-netG-epoch-0001-iter-000001.params', 'dcgan-v2-netG-epoch-0001.params',
+                              'dcgan-v2-netG.params'], sorted(names))
+        self.assertFalse([name for name in os.listdir(self.model_dir_path) if name.endswith('.tmp')])
+
+        loaded = DCGan()
+        loaded.load_model(self.model_dir_path)
+        for param, loaded_param in zip(gan.netG.collect_params().values(), loaded.netG.collect_params().values()):
+            np.testing.assert_allclose(param.data().asnumpy(), loaded_param.data().asnumpy(), rtol=1e-6,
+                                       err_msg=param.name)
+
+    def test_fit_interrupted(self):
+        image_store = self.save_random_images()
+
+        class InterruptedIter(mx.io.NDArrayIter):
+            def next(self):
+                if self.cursor + self.batch_size >= 4:
+                    raise KeyboardInterrupt()
+                return super(InterruptedIter, self).next()
+
+        train_data = InterruptedIter(data=[nd.array(np.arange(8)), np.random.normal(0, 1, size=(8, 300))],
+                                     batch_size=4)
+        profile_path = os.path.join(self.model_dir_path, 'timings.jsonl')
+        gan = DCGan()
+        gan.random_input_size = 20
+        with self.assertRaises(KeyboardInterrupt):
+            gan.fit(train_data=train_data, image_dict=image_store, model_dir_path=self.model_dir_path, epochs=2,
+                    batch_size=4, checkpoint_every=1, keep_last=None, profile_path=profile_path)
+        # the checkpoint of the first iteration was written before fit raised, and so was its timing record
+        self.assertIn('dcgan-v2-netG-epoch-0000-iter-000000.params', os.listdir(self.model_dir_path))
+        self.assertEqual(1, len(load_timings(profile_path)))
+
+    def check_resume(self, sample_count, state_file_name):
+        """
+        Train for 2 epochs on sample_count samples, then resume a copy of the training from the checkpoint saved in
+        state_file_name: the nets should end up the same
+        """
+        image_store = self.save_random_images()
+        text_feats = np.random.normal(0, 1, size=(sample_count, 300))
+
+        def fit(model_dir_path, resume):
+            # the order of its batches only depends on the numpy state at reset (unlike NDArrayIter's)
+            train_data = PrefetchingIter(np.arange(sample_count) % 8, text_feats, batch_size=4,
+                                         image_store=image_store, random_input_size=20)
+            gan = DCGan()
+            gan.random_input_size = 20
+            gan.fit(train_data=train_data, image_dict=image_store, model_dir_path=model_dir_path, epochs=2,
+                    batch_size=4, image_pool_size=6, checkpoint_every=1, keep_last=None, resume=resume)
+            return gan
+
+        np.random.seed(0)
+        mx.random.seed(0)
+        gan = fit(self.model_dir_path, resume=False)
+
+        resume_dir_path = os.path.join(self.model_dir_path, 'resume')
+        os.mkdir(resume_dir_path)
+        for name in os.listdir(self.model_dir_path):
+            if name.endswith('.params') or name.endswith('.states') or name.endswith('.pkl'):
+                shutil.copy(os.path.join(self.model_dir_path, name), resume_dir_path)
+        shutil.copy(os.path.join(resume_dir_path, state_file_name), os.path.join(resume_dir_path, 'dcgan-v2-state.pkl'))
+        np.random.seed(1)
+        mx.random.seed(1)
+        resumed = fit(resume_dir_path, resume=True)
+
+        for net, resumed_net in ((gan.netG, resumed.netG), (gan.netD, resumed.netD)):
+            for param, resumed_param in zip(net.collect_params().values(), resumed_net.collect_params().values()):
+                np.testing.assert_allclose(param.data().asnumpy(), resumed_param.data().asnumpy(), rtol=1e-5,
+                                           atol=1e-6, err_msg=param.name)
+        return resume_dir_path
+
+    def test_resume(self):
+        # from the checkpoint after the first iteration of the second epoch
+        self.check_resume(12, 'dcgan-v2-state-epoch-0001-iter-000000.pkl')
+
+    def test_resume_after_last_iteration(self):
+        # from the checkpoint after the last iteration of the first epoch, which then has no batch left to train
+        resume_dir_path = self.check_resume(8, 'dcgan-v2-state-epoch-0000-iter-000001.pkl')
+        self.assertNotIn('dcgan-v2-training-0.png', os.listdir(resume_dir_path))
+        self.assertIn('dcgan-v2-training-1.png', os.listdir(resume_dir_path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import numpy as np
+import mxnet as mx
+from mxnet import nd
+from mxnet_text_to_image.library.dcgan2 import DCGan
+from mxnet_text_to_image.utils.glove_loader import save_glove_store
+from mxnet_text_to_image.utils.image_utils import inverted_transform, inverted_transform_batch
+from unit_test.library import ModelDirTestCase
+
+
+class DCGanHybridizeTest(ModelDirTestCase):
+
+    def test_param_names(self):
+        netG, netD = DCGan.create_model()
+        # parameter names of the checkpoints saved when netG and netD were imperative blocks
+        self.assertIn('conv0_weight', [name[len(netG.prefix):] for name in netG.collect_params()])
+        self.assertIn('sequential0_conv0_weight', [name[len(netD.prefix):] for name in netD.collect_params()])
+
+    def test_hybridize(self):
+        netG, netD = DCGan.create_model()
+        netG.initialize(mx.init.Normal(0.02))
+        netD.initialize(mx.init.Normal(0.02))
+        z = nd.random_normal(0, 1, shape=(2, 320, 1, 1))
+        text_feats = nd.random_normal(0, 1, shape=(2, 300))
+        fake = netG(z)
+        output = netD(fake, text_feats)
+        netG.save_params(DCGan.get_params_file_path(self.model_dir_path, 'netG'))
+        netD.save_params(DCGan.get_params_file_path(self.model_dir_path, 'netD'))
+        np.save(DCGan.get_config_file_path(self.model_dir_path), {'random_input_size': 20})
+
+        gan = DCGan()
+        gan.hybridize = True
+        gan.load_model(self.model_dir_path)
+        np.testing.assert_allclose(fake.asnumpy(), gan.netG(z).asnumpy(), rtol=1e-4, atol=1e-5)
+        np.testing.assert_allclose(output.asnumpy(), gan.netD(fake, text_feats).asnumpy(), rtol=1e-4, atol=1e-5)
+
+    def test_generate_batch(self):
+        words = ['this', 'flower', 'has', 'red', 'petals']
+        save_glove_store(dict((word, np.random.normal(0, 1, size=(300, ))) for word in words), self.model_dir_path,
+                         300)
+        gan = DCGan()
+        gan.random_input_size = 20
+        gan.load_glove(self.model_dir_path)
+        gan.netG, gan.netD = DCGan.create_model()
+        gan.netG.initialize(mx.init.Normal(0.02))
+
+        imgs = gan.generate_batch(['this flower has red petals', 'red flower', 'petals'], samples_per_prompt=3,
+                                  batch_size=4)
+        self.assertTupleEqual((9, 64, 64, 3), imgs.shape)
+        self.assertEqual(np.uint8, imgs.dtype)
+
+        fake = gan.netG(nd.random_normal(0, 1, shape=(2, 320, 1, 1)))
+        np.testing.assert_array_equal(inverted_transform(fake[1]).asnumpy().astype(np.uint8),
+                                      inverted_transform_batch(fake)[1])
+
+
+class DCGanDataParallelTest(ModelDirTestCase):
+
+    def test_fit(self):
+        image_store = self.save_random_images()
+        train_data = mx.io.NDArrayIter(data=[nd.array(np.arange(8) % 8), np.random.normal(0, 1, size=(8, 300))],
+                                       batch_size=5, last_batch_handle='pad')
+        ctx_list = [mx.cpu(0), mx.cpu(1)]
+        gan = DCGan(model_ctx=ctx_list)
+        gan.random_input_size = 20
+        gan.fit(train_data=train_data, image_dict=image_store, model_dir_path=self.model_dir_path, epochs=1,
+                batch_size=5, image_pool_size=3, single_generator_forward=True)
+
+        # the aggregated gradients keep the weights and the synced running statistics identical on every context
+        for net in (gan.netG, gan.netD):
+            for name, param in net.collect_params().items():
+                data = param.list_data()
+                self.assertListEqual(ctx_list, [d.context for d in data])
+                np.testing.assert_array_equal(data[0].asnumpy(), data[1].asnumpy(), err_msg=name)
+
+        gan = DCGan(model_ctx=ctx_list)
+        gan.load_model(self.model_dir_path)
+        self.assertListEqual(ctx_list, list(gan.netG.collect_params().values())[0].list_ctx())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import os
+import sys
+import numpy as np
+import mxnet as mx
+from mxnet_text_to_image.library.distributed import launch_local
+from unit_test.library import ModelDirTestCase
+
+WORKER_SCRIPT = """
+import os
+import sys
+import numpy as np
+import mxnet as mx
+from mxnet import nd
+
+sys.path.insert(0, {package_dir_path!r})
+from mxnet_text_to_image.library.dcgan2 import DCGan
+from unit_test.library import save_random_images
+
+model_dir_path = {model_dir_path!r}
+kvstore = mx.kv.create('dist_sync')
+image_store = save_random_images(os.path.join(model_dir_path, 'images-%d' % kvstore.rank))
+train_data = mx.io.NDArrayIter(data=[nd.array(np.arange(8)), np.random.normal(0, 1, size=(8, 300))], batch_size=4)
+gan = DCGan(model_ctx=[mx.cpu(0), mx.cpu(1)])
+gan.random_input_size = 20
+gan.fit(train_data=train_data, image_dict=image_store, model_dir_path=model_dir_path, epochs=1, batch_size=4,
+        kvstore=kvstore)
+gan.netG.save_params(os.path.join(model_dir_path, 'netG-%d.params' % kvstore.rank))
+"""
+
+
+class LaunchLocalTest(ModelDirTestCase):
+
+    def test_dist_sync_fit(self):
+        script_path = os.path.join(self.model_dir_path, 'worker.py')
+        package_dir_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        with open(script_path, 'w') as f:
+            f.write(WORKER_SCRIPT.format(package_dir_path=package_dir_path, model_dir_path=self.model_dir_path))
+
+        self.assertEqual(0, launch_local([sys.executable, script_path], num_workers=2, num_servers=1))
+
+        # the workers start from the weights of worker 0 and apply the same summed gradients
+        params = [mx.nd.load(os.path.join(self.model_dir_path, 'netG-%d.params' % rank)) for rank in range(2)]
+        for name in params[0]:
+            np.testing.assert_allclose(params[0][name].asnumpy(), params[1][name].asnumpy(), rtol=1e-5, atol=1e-6,
+                                       err_msg=name)
+        # only worker 0 writes the training images
+        self.assertEqual(1, len([name for name in os.listdir(self.model_dir_path) if '-training-' in name]))
+
+
+if __name__ == '__main__':
+    unittest.main()
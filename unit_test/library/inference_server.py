@@ -0,0 +1,87 @@
+import unittest
+import asyncio
+import io
+import json
+import time
+import numpy as np
+from PIL import Image
+from mxnet_text_to_image.library.inference_server import InferenceServer
+
+
+class FakeGan(object):
+
+    def __init__(self):
+        self.batch_sizes = list()
+
+    def generate_batch(self, prompts, samples_per_prompt=1, batch_size=64):
+        if 'fail' in prompts:
+            raise ValueError('fail')
+        self.batch_sizes.append(len(prompts))
+        time.sleep(0.05)
+        # the red channel of every image holds the length of its prompt
+        imgs = np.zeros(shape=(len(prompts), 8, 8, 3), dtype=np.uint8)
+        imgs[:, :, :, 0] = np.array([len(prompt) for prompt in prompts]).reshape((-1, 1, 1))
+        return imgs
+
+
+async def request(port, method, path, body=b''):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(('%s %s HTTP/1.1\r\nContent-Length: %d\r\nConnection: close\r\n\r\n' % (method, path, len(body)))
+                 .encode('latin-1') + body)
+    response = await reader.read()
+    writer.close()
+    head, content = response.split(b'\r\n\r\n', 1)
+    return int(head.split(b' ')[1]), content
+
+
+class InferenceServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.gan = FakeGan()
+        self.server = InferenceServer(self.gan, port=0, max_batch_size=4, max_wait_ms=50)
+        self.loop.run_until_complete(self.server.start())
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.server.stop())
+        self.loop.close()
+
+    def test_micro_batching(self):
+        prompts = ['flower' * (i + 1) for i in range(10)]
+        responses = self.loop.run_until_complete(asyncio.gather(
+            *[request(self.server.port, 'POST', '/generate', prompt.encode('utf8')) for prompt in prompts]))
+        for prompt, (status, content) in zip(prompts, responses):
+            self.assertEqual(200, status)
+            img = np.array(Image.open(io.BytesIO(content)))
+            self.assertTupleEqual((8, 8, 3), img.shape)
+            self.assertEqual(len(prompt), img[0, 0, 0])
+        self.assertEqual(10, sum(self.gan.batch_sizes))
+        self.assertLessEqual(max(self.gan.batch_sizes), 4)
+        self.assertLess(len(self.gan.batch_sizes), 10)
+
+        status, content = self.loop.run_until_complete(request(self.server.port, 'GET', '/generate?prompt=red'))
+        self.assertEqual(200, status)
+        self.assertEqual(3, np.array(Image.open(io.BytesIO(content)))[0, 0, 0])
+
+        status, content = self.loop.run_until_complete(request(self.server.port, 'GET', '/stats'))
+        stats = json.loads(content.decode('utf8'))
+        self.assertEqual(11, stats['requests'])
+        self.assertEqual(0, stats['errors'])
+        self.assertEqual(len(self.gan.batch_sizes), stats['batches'])
+        self.assertGreater(stats['latency_ms']['p99'], 0)
+
+    def test_errors(self):
+        self.assertEqual(404, self.loop.run_until_complete(request(self.server.port, 'GET', '/'))[0])
+        self.assertEqual(400, self.loop.run_until_complete(request(self.server.port, 'POST', '/generate'))[0])
+        self.assertEqual(400, self.loop.run_until_complete(
+            request(self.server.port, 'POST', '/generate', b'red \xff flower'))[0])
+        self.assertEqual(500, self.loop.run_until_complete(
+            request(self.server.port, 'POST', '/generate', b'fail'))[0])
+        # the server keeps serving after a failed batch
+        self.assertEqual(200, self.loop.run_until_complete(
+            request(self.server.port, 'POST', '/generate', b'red'))[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+import numpy as np
+import mxnet as mx
+from mxnet import nd
+from mxnet_text_to_image.library.metrics import GanMetrics
+
+
+class GanMetricsTest(unittest.TestCase):
+
+    def test_get(self):
+        ctx_list = [mx.cpu(0), mx.cpu(1)]
+        metrics = GanMetrics(ctx_list)
+        labels = np.random.randint(0, 2, size=(3, 2, 5)).astype(np.float32)
+        outputs = np.random.uniform(0, 1, size=(3, 2, 5, 1)).astype(np.float32)
+        losses = np.random.uniform(0, 2, size=(3, 2, 2, 5)).astype(np.float32)
+        for step in range(3):
+            for i, ctx in enumerate(ctx_list):
+                metrics.update_accuracy(nd.array(labels[step, i], ctx=ctx), nd.array(outputs[step, i], ctx=ctx))
+                metrics.update_losses(nd.array(losses[step, i, 0], ctx=ctx), nd.array(losses[step, i, 1], ctx=ctx))
+
+        acc, errD, errG = metrics.get()
+        self.assertAlmostEqual(((outputs.ravel() > 0.5) == labels.ravel()).mean(), acc, places=5)
+        self.assertAlmostEqual(losses[:, :, 0].mean(), errD, places=5)
+        self.assertAlmostEqual(losses[:, :, 1].mean(), errG, places=5)
+
+        metrics.reset()
+        self.assertTupleEqual((0.0, 0.0, 0.0), metrics.get())
+
+
+if __name__ == '__main__':
+    unittest.main()
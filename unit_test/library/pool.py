@@ -0,0 +1,72 @@
+import unittest
+import numpy as np
+import mxnet as mx
+from mxnet import nd
+from mxnet_text_to_image.library.pool import ImagePool
+
+
+class ImagePoolTest(unittest.TestCase):
+
+    def test_query(self):
+        pool = ImagePool(6)
+        images = nd.arange(8).reshape((4, 2))
+        text_feats = nd.arange(4).reshape((4, 1)) + 100
+
+        # the pool is filled with the first 6 pairs, which are returned as is
+        ret_images, ret_text_feats = pool.query([images, text_feats])
+        np.testing.assert_array_equal(images.asnumpy(), ret_images.asnumpy())
+        ret_images, ret_text_feats = pool.query([images + 8, text_feats + 4])
+        self.assertEqual(6, pool.num_imgs)
+        np.testing.assert_array_equal(images.asnumpy()[:2] + 8, ret_images.asnumpy()[:2])
+
+        # every pair returned afterwards is either the queried pair or a pair from the pool
+        mx.random.seed(0)
+        seen = set()
+        for k in range(20):
+            queried = nd.arange(8).reshape((4, 2)) + 100 * (k + 1)
+            ret_images, ret_text_feats = pool.query([queried, queried[:, :1] / 2])
+            self.assertTupleEqual((4, 2), ret_images.shape)
+            self.assertTupleEqual((4, 1), ret_text_feats.shape)
+            for image, text_feat in zip(ret_images.asnumpy(), ret_text_feats.asnumpy()):
+                # the pairs are never mixed up
+                self.assertEqual(image[1], image[0] + 1)
+                if image[0] >= 100:
+                    self.assertEqual(image[0] / 2, text_feat[0])
+                seen.add(image[0] < 100 * (k + 1))
+        self.assertSetEqual({True, False}, seen)
+
+    def test_query_matches_sequential_swaps(self):
+        # a pool smaller than the batches, so that several pairs of a batch are swapped with the same entry
+        pool = ImagePool(3)
+        pool.query([nd.arange(6).reshape((3, 2)), nd.arange(3).reshape((3, 1))])
+        for k in range(20):
+            images = nd.arange(16).reshape((8, 2)) + 100 * (k + 1)
+            text_feats = images[:, :1] * 2
+            state = pool.get_state()
+            expected_pool = [(state['images'][i].asnumpy(), state['text_feats'][i].asnumpy()) for i in range(3)]
+
+            mx.random.seed(k)
+            swap, random_index = pool._draw(8, images.context)
+            mx.random.seed(k)
+            ret_images, ret_text_feats = pool.query([images, text_feats])
+
+            # the per-sample version with the same random draws
+            for i, (do_swap, index) in enumerate(zip(swap.asnumpy(), random_index.asnumpy().astype(np.int64))):
+                pair = (images[i].asnumpy(), text_feats[i].asnumpy())
+                if do_swap:
+                    pair, expected_pool[index] = expected_pool[index], pair
+                np.testing.assert_array_equal(pair[0], ret_images[i].asnumpy())
+                np.testing.assert_array_equal(pair[1], ret_text_feats[i].asnumpy())
+            for index, (image, text_feat) in enumerate(expected_pool):
+                np.testing.assert_array_equal(image, pool.images[index].asnumpy())
+                np.testing.assert_array_equal(text_feat, pool.text_feats[index].asnumpy())
+
+    def test_empty_pool(self):
+        images = nd.ones((3, 2))
+        text_feats = nd.zeros((3, 1))
+        ret = ImagePool(0).query([images, text_feats])
+        self.assertIs(images, ret[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import os
+import numpy as np
+import mxnet as mx
+from mxnet import nd
+from mxnet_text_to_image.library.dcgan2 import DCGan
+from mxnet_text_to_image.library.profiling import PHASES, PhaseTimer, load_timings, summarize_timings
+from unit_test.library import ModelDirTestCase
+
+
+class PhaseTimerTest(ModelDirTestCase):
+
+    def test_disabled(self):
+        timer = PhaseTimer()
+        with timer.phase('data'):
+            pass
+        timer.end_iteration(0, 0, 4)
+        timer.close()
+        self.assertDictEqual({}, timer.timings)
+
+    def test_csv_and_json_lines(self):
+        for file_name in ('timings.csv', 'timings.jsonl'):
+            file_path = os.path.join(self.model_dir_path, file_name)
+            # a second run appends to the same file
+            for run in range(2):
+                timer = PhaseTimer(file_path)
+                for iter in range(3):
+                    with timer.phase('data'):
+                        nd.ones((4, 4)) * 2
+                    with timer.phase('netD_step'):
+                        pass
+                    timer.end_iteration(0, iter, 4)
+                with timer.phase('checkpoint'):
+                    pass
+                timer.end_iteration(0, 3)
+                timer.close()
+
+            records = load_timings(file_path)
+            self.assertEqual(8, len(records))
+            self.assertEqual(4, records[1]['batch_size'])
+            self.assertAlmostEqual(records[1]['data'] + records[1]['netD_step'], records[1]['total'])
+
+            summary = summarize_timings([file_path])
+            self.assertEqual(4, summary['iterations'])
+            self.assertIn('checkpoint', summary)
+            self.assertNotIn('netG_step', summary)
+
+    def test_fit(self):
+        image_store = self.save_random_images()
+        train_data = mx.io.NDArrayIter(data=[nd.array(np.arange(8)), np.random.normal(0, 1, size=(8, 300))],
+                                       batch_size=4)
+        profile_path = os.path.join(self.model_dir_path, 'timings.jsonl')
+        gan = DCGan()
+        gan.random_input_size = 20
+        gan.fit(train_data=train_data, image_dict=image_store, model_dir_path=self.model_dir_path, epochs=2,
+                batch_size=4, profile_path=profile_path)
+
+        records = load_timings(profile_path)
+        # 2 iterations and a checkpoint per epoch
+        self.assertEqual(6, len(records))
+        self.assertSetEqual(set(PHASES[:-1]), set(records[0]) & set(PHASES))
+        self.assertListEqual(['checkpoint'], [name for name in records[2] if name in PHASES])
+        self.assertEqual(2, summarize_timings([profile_path])['iterations'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import os
+import pickle
+import shutil
+import tempfile
+import numpy as np
+import nltk
+from mxnet_text_to_image.utils.glove_loader import load_glove, GloveModel
+from mxnet_text_to_image.utils import text_utils
+from mxnet_text_to_image.utils.text_utils import word_tokenize
+
+
+class GloveStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir_path = tempfile.mkdtemp()
+        self.word2em = {
+            'the': np.array([0.1, 0.2, 0.3], dtype=np.float32),
+            'flower': np.array([1.0, -1.0, 0.5], dtype=np.float32),
+            'petals': np.array([-0.25, 0.75, 2.0], dtype=np.float32),
+            ',': np.array([0.0, 0.0, 1.0], dtype=np.float32),
+        }
+        with open(os.path.join(self.data_dir_path, 'glove.6B.3d.txt'), 'wt', encoding='utf8') as f:
+            for word, emb in self.word2em.items():
+                f.write(word + ' ' + ' '.join(str(v) for v in emb) + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir_path)
+
+    def test_load_glove(self):
+        emb = load_glove(self.data_dir_path, embedding_dim=3)
+        self.assertEqual(len(self.word2em), len(emb))
+        for word, expected in self.word2em.items():
+            self.assertTrue(word in emb)
+            np.testing.assert_array_equal(expected, emb[word])
+        self.assertFalse('stamen' in emb)
+        self.assertIsNone(emb.get('stamen'))
+        np.testing.assert_array_equal(np.array([emb.index('petals'), -1, emb.index('the'), -1]),
+                                      emb.lookup(['petals', 'stamen', 'the', 'zzz']))
+
+        # the store is re-opened rather than rebuilt
+        self.assertTrue(os.path.exists(os.path.join(self.data_dir_path, 'glove.6B.3d.matrix.npy')))
+        np.testing.assert_array_equal(emb.matrix, load_glove(self.data_dir_path, embedding_dim=3).matrix)
+
+    def test_pickle_reopens_store(self):
+        emb = load_glove(self.data_dir_path, embedding_dim=3)
+        copied = pickle.loads(pickle.dumps(emb))
+        self.assertEqual(emb.matrix_path, copied.matrix_path)
+        np.testing.assert_array_equal(emb['flower'], copied['flower'])
+
+    def test_glove_model(self):
+        model = GloveModel()
+        model.load(self.data_dir_path, embedding_dim=3)
+        np.testing.assert_array_almost_equal(self.word2em['the'] + self.word2em['flower'],
+                                             model.encode_doc('The flower stamen'))
+        np.testing.assert_array_equal(np.zeros(shape=(3, )), model.encode_word('stamen'))
+
+    def test_encode_docs(self):
+        model = GloveModel()
+        model.load(self.data_dir_path, embedding_dim=3)
+        docs = ['the flower', 'petals petals , the', '', 'stamen', 'Flower the petals', 'Petals,stamen.']
+        expected = np.zeros(shape=(len(docs), 3))
+        for i, doc in enumerate(docs):
+            for word in word_tokenize(doc.lower())[:3]:
+                if word in self.word2em:
+                    expected[i] += self.word2em[word]
+        X = model.encode_docs(docs, max_allowed_doc_length=3)
+        self.assertTupleEqual((len(docs), 3), X.shape)
+        np.testing.assert_array_equal(expected, X)
+        for i, doc in enumerate(docs):
+            np.testing.assert_array_equal(expected[i], model.encode_doc(doc, max_allowed_doc_length=3))
+
+    def test_encode_docs_without_punkt(self):
+        model = GloveModel()
+        model.load(self.data_dir_path, embedding_dim=3)
+        data_path = list(nltk.data.path)
+        punkt_missing = text_utils.punkt_missing
+        # no directory to find the punkt data in
+        nltk.data.path[:] = [self.data_dir_path]
+        text_utils.punkt_missing = False
+        try:
+            X = model.encode_docs(["The flower's petals are red!", 'petals (the flower)?'])
+        finally:
+            nltk.data.path[:] = data_path
+            text_utils.punkt_missing = punkt_missing
+        np.testing.assert_array_almost_equal(self.word2em['the'] + self.word2em['flower'] + self.word2em['petals'],
+                                             X[0])
+        np.testing.assert_array_almost_equal(X[0], X[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
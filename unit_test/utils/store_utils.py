@@ -0,0 +1,54 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from mxnet_text_to_image.utils.store_utils import sorted_lookup, replace_on_success, get_temp_path
+
+
+class StoreUtilsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir_path)
+
+    def test_sorted_lookup(self):
+        keys = np.array([2, 3, 5, 8], dtype=np.int64)
+        np.testing.assert_array_equal(np.array([2, -1, 0, -1, 3]), sorted_lookup(keys, [5, 4, 2, 9, 8]))
+        self.assertEqual((0, ), sorted_lookup(keys, []).shape)
+        np.testing.assert_array_equal(np.array([1, -1]), sorted_lookup(np.array(['a', 'b']), ['b', 'c']))
+
+    def test_replace_on_success(self):
+        a_path = os.path.join(self.data_dir_path, 'a.npy')
+        b_path = os.path.join(self.data_dir_path, 'b.npy')
+        with replace_on_success(a_path, b_path) as (a_tmp_path, b_tmp_path):
+            np.save(a_tmp_path, np.arange(3))
+            np.save(b_tmp_path, np.arange(4))
+            self.assertFalse(os.path.exists(a_path))
+        np.testing.assert_array_equal(np.arange(3), np.load(a_path))
+        np.testing.assert_array_equal(np.arange(4), np.load(b_path))
+
+        with self.assertRaises(ValueError):
+            with replace_on_success(a_path) as (a_tmp_path, ):
+                np.save(a_tmp_path, np.arange(5))
+                raise ValueError()
+        np.testing.assert_array_equal(np.arange(3), np.load(a_path))
+        self.assertListEqual(['a.npy', 'b.npy'], sorted(os.listdir(self.data_dir_path)))
+
+        # nothing written, nothing replaced
+        with replace_on_success(os.path.join(self.data_dir_path, 'c.npy')):
+            pass
+        self.assertFalse(os.path.exists(os.path.join(self.data_dir_path, 'c.npy')))
+
+    def test_temp_path(self):
+        # processes building the same file do not share its temporary file, np.save keeps the .npy extension
+        temp_path = get_temp_path(os.path.join(self.data_dir_path, 'a.npy'), '.npy')
+        self.assertEqual(os.path.join(self.data_dir_path, 'a.npy.tmp.%d.npy' % os.getpid()), temp_path)
+        with replace_on_success(os.path.join(self.data_dir_path, 'a.npy')) as (a_tmp_path, ):
+            self.assertEqual(temp_path, a_tmp_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,25 @@
 import unittest
+import os
+import nltk
 import numpy as np
-from mxnet_text_to_image.utils.text_utils import pad_sequence, pad_sequences
+from nltk.tokenize import NLTKWordTokenizer
+from mxnet_text_to_image.utils.text_utils import pad_sequence, pad_sequences, word_tokenize, word_tokenize_docs, \
+    get_tokenizer_mode, FAST_PATH, NOT_FAST_PATH
+
+
+def patch_path(path):
+    return os.path.join(os.path.dirname(__file__), path)
+
+
+def load_captions():
+    captions = []
+    for dir_path, dir_names, fnames in os.walk(patch_path('../../demo/data/flowers/text_c10')):
+        dir_names.sort()
+        for fname in sorted(fnames):
+            if fname.endswith('.txt'):
+                with open(os.path.join(dir_path, fname), 'r') as f:
+                    captions.extend(line.lower() for line in f)
+    return captions
 
 
 class TestPadSequence(unittest.TestCase):
@@ -39,5 +58,47 @@ class TestPadSequences(unittest.TestCase):
                                       np.array([[1, 1, 1, 1, 0], [1, 2, 1, 0, 0]]))
 
 
+class TestWordTokenize(unittest.TestCase):
+
+    def test_fast_path(self):
+        self.assertListEqual(['this', 'flower', 'has', 'white', 'petals', ',', 'and', 'a', 'yellow-green', 'center', '.'],
+                             word_tokenize('this flower has white petals, and a yellow-green center.\n'))
+        self.assertListEqual(['3,36', 'petals', ',5', ',', 'a', '.'], word_tokenize('3,36 petals ,5 , a .'))
+        self.assertListEqual([], word_tokenize(' \n'))
+        self.assertListEqual(['.'], word_tokenize('.'))
+        # left to nltk
+        for doc in ['petals. stamen', 'petals!', "petal's", 'petals -- stamen', 'a,,b', 'Gonna', 'pétals']:
+            self.assertTrue(FAST_PATH.match(doc) is None or NOT_FAST_PATH.search(doc) is not None, doc)
+
+    def test_fast_path_parity(self):
+        # the captions of the fast path against the nltk word tokenizer, which (unlike nltk.word_tokenize) does not need
+        # the punkt data
+        tokenizer = NLTKWordTokenizer()
+        docs = [caption for caption in load_captions()
+                if FAST_PATH.match(caption) and not NOT_FAST_PATH.search(caption)]
+        docs += ['petals ,5', 'a,b', 'a , , b', 'A - b', ' .', 'a.  ', '-x- y-', '1,2,3.', 'a\tb\n']
+        self.assertGreater(len(docs), 80000)
+        for doc, words in zip(docs, word_tokenize_docs(docs)):
+            self.assertListEqual(tokenizer.tokenize(doc), words, doc)
+
+    def test_tokenizer_mode(self):
+        try:
+            nltk.word_tokenize('.')
+            expected = 'punkt'
+        except LookupError:
+            expected = 'preserve_line'
+        self.assertEqual(expected, get_tokenizer_mode())
+
+    def test_nltk_parity(self):
+        captions = load_captions()
+        try:
+            nltk.word_tokenize(captions[0])
+        except LookupError:
+            self.skipTest('the nltk punkt data is not installed')
+        captions += ['it has 3 petals. they are red!', "the flower's petals (pink) are wavy?", 'a.b c. d.']
+        for caption, words in zip(captions, word_tokenize_docs(captions)):
+            self.assertListEqual(nltk.word_tokenize(caption), words, caption)
+
+
 if __name__ == '__main__':
     unittest.main()